@@ -0,0 +1,59 @@
+"""Analysis settings and their validation, kept free of pandas and numpy
+
+auth_app imports these at startup; the analysis modules that need the heavy
+libraries are only imported once a user uploads or analyses.
+"""
+
+DEFAULT_WEIGHTINGS = {
+    'pupil_premium': 2,
+    'looked_after': 3,
+    'sen_needs_multiplier': 3,
+    'eal': 1,
+    'reading_threshold': 85,
+    'reading_score': 2,
+    'spelling_threshold': 85,
+    'spelling_score': 2,
+    'boxall': 2,
+    'medical_info': 1,
+    'stage_support': 1
+}
+
+# Which classes are ranked and how class size scales the priority. Schools
+# can override these; changing them only re-runs the cheap class_scores stage.
+CLASS_FILTER_DEFAULTS = {
+    'max_class_size': 33,
+    'high_need_threshold': 5,
+    'size_factor_divisor': 30,
+    'tutor_time_slot': '08:40 - 09:00'
+}
+
+INPUT_FRAMES = ('students_classes', 'students_sen', 'timetable')
+
+# Files that accept delta uploads: one row per added/changed/removed student, keyed by Name
+DELTA_FILE_TYPES = ('students_sen', 'students_classes')
+
+
+def validate_class_filters(class_filters):
+    """Check class filter overrides, returning them with numbers coerced
+
+    Raises ValueError for unknown keys or out of range values. An empty
+    tutor_time_slot turns the tutor time exclusion off.
+    """
+    unknown = [key for key in class_filters if key not in CLASS_FILTER_DEFAULTS]
+    if unknown:
+        raise ValueError(f"Unknown class filter settings: {unknown}")
+    
+    cleaned = {}
+    for key, value in class_filters.items():
+        if key == 'tutor_time_slot':
+            cleaned[key] = str(value or '').strip()
+        elif key == 'max_class_size':
+            cleaned[key] = int(value)
+            if cleaned[key] < 1:
+                raise ValueError("max_class_size must be at least 1")
+        else:
+            number = float(value)
+            cleaned[key] = int(number) if number.is_integer() else number
+            if key == 'size_factor_divisor' and cleaned[key] <= 0:
+                raise ValueError("size_factor_divisor must be greater than 0")
+    return cleaned
@@ -0,0 +1,33 @@
+from types import MappingProxyType
+
+from need_breakdown import render_breakdown
+
+
+class AnalysisSnapshot:
+    """One published analysis: student scores, ranked classes and the grid, never modified
+
+    TANeedAnalyzer builds the next analysis in its own objects and swaps a
+    new snapshot into analyzer.snapshot when it is complete, so a request
+    holding a snapshot sees one consistent analysis however long it takes,
+    without locking. timetable_grid is None until the grid has been built
+    for these scores.
+    """
+    __slots__ = ('student_scores', 'class_scores', 'timetable_grid', 'scored_weightings')
+
+    def __init__(self, student_scores, class_scores, timetable_grid=None, scored_weightings=None):
+        object.__setattr__(self, 'student_scores', student_scores)
+        object.__setattr__(self, 'class_scores', MappingProxyType(class_scores))
+        object.__setattr__(self, 'timetable_grid',
+                           MappingProxyType(timetable_grid) if timetable_grid is not None else None)
+        object.__setattr__(self, 'scored_weightings', MappingProxyType(dict(scored_weightings or {})))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("AnalysisSnapshot is immutable; publish a new one instead")
+
+    def __delattr__(self, name):
+        raise AttributeError("AnalysisSnapshot is immutable; publish a new one instead")
+
+    def get_breakdown(self, student_name):
+        """Breakdown text for a student, with the weightings these scores were computed with"""
+        return render_breakdown(self.student_scores[student_name], self.scored_weightings)
+
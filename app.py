@@ -5,6 +5,8 @@ import pandas as pd
 import os
 from datetime import datetime
 from web_ta_analyzer import TANeedAnalyzer
+from compute_backends import DEFAULT_COMPUTE_BACKEND
+from ranking import parse_top_k
 from werkzeug.utils import secure_filename
 import json
 
@@ -16,6 +18,7 @@ app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///ta_analyzer.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['ANALYSIS_BACKEND'] = os.environ.get('ANALYSIS_BACKEND', DEFAULT_COMPUTE_BACKEND)
 
 # Create uploads directory
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -79,7 +82,7 @@ with app.app_context():
         db.session.commit()
 
 # Global analyzer instance
-analyzer = TANeedAnalyzer()
+analyzer = TANeedAnalyzer(backend=app.config['ANALYSIS_BACKEND'])
 
 # Track upload session to clear data on new session
 upload_session_files = set()
@@ -92,7 +95,8 @@ def health_check():
 def clear_data():
     """Clear all analysis data and start fresh"""
     global upload_session_files
-    analyzer.clear_analysis_data()
+    with analyzer.write_lock:
+        analyzer.clear_analysis_data()
     upload_session_files = set()
     return jsonify({'message': 'All analysis data cleared successfully'})
 
@@ -105,7 +109,8 @@ def upload_file(file_type):
     
     # If this is the first file in a new session, clear previous data
     if len(upload_session_files) == 0:
-        analyzer.clear_analysis_data()
+        with analyzer.write_lock:
+            analyzer.clear_analysis_data()
         print("Starting new upload session - cleared previous data")
     
     if 'file' not in request.files:
@@ -137,7 +142,8 @@ def upload_file(file_type):
                 return jsonify({'error': f'Missing required columns: {missing_cols}'}), 400
             
             # Store file info in session/memory for now
-            setattr(analyzer, f'{file_type}_file', filepath)
+            with analyzer.write_lock:
+                setattr(analyzer, f'{file_type}_file', filepath)
             
             # Track this file type in the current upload session
             upload_session_files.add(file_type)
@@ -204,21 +210,30 @@ def run_analysis():
         if not hasattr(analyzer, file_attr) or not getattr(analyzer, file_attr):
             return jsonify({'error': f'Missing required file: {file_attr.replace("_file", "")}'}), 400
     
+    # How many students and classes to rank; a number or "all"
     try:
-        # Load weighting configuration
-        if weighting_config_id:
-            config = WeightingConfig.query.get(weighting_config_id)
-            if config:
-                weights = json.loads(config.config_json)
-                analyzer.set_weightings(weights)
-        
-        # Run analysis
-        analyzer.load_data_from_files()
-        analyzer.calculate_all_student_scores()
-        analyzer.calculate_class_need_levels()
-        
-        # Generate results
-        results = analyzer.get_analysis_results()
+        top_students = parse_top_k(data.get('top_students'))
+        top_classes = parse_top_k(data.get('top_classes'))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        # Runs take turns; reading routes keep using the last published snapshot meanwhile
+        with analyzer.write_lock:
+            # Load weighting configuration
+            if weighting_config_id:
+                config = WeightingConfig.query.get(weighting_config_id)
+                if config:
+                    weights = json.loads(config.config_json)
+                    analyzer.set_weightings(weights)
+            
+            # Run analysis
+            analyzer.load_data_from_files()
+            analyzer.calculate_all_student_scores()
+            analyzer.calculate_class_need_levels()
+            
+            # Generate results
+            results = analyzer.get_analysis_results(top_students, top_classes)
         
         # Save results to database
         if weighting_config_id:
@@ -250,15 +265,17 @@ def get_analysis_results(result_id):
 
 @app.route('/api/students', methods=['GET'])
 def get_students():
-    if not hasattr(analyzer, 'student_scores') or not analyzer.student_scores:
+    # One consistent analysis for the whole request, even if a run finishes meanwhile
+    snapshot = analyzer.snapshot
+    if not snapshot.student_scores:
         return jsonify({'error': 'No analysis results available'}), 400
     
     students = []
-    for name, data in analyzer.student_scores.items():
+    for name, data in snapshot.student_scores.items():
         students.append({
             'name': name,
             'score': data['score'],
-            'breakdown': data['breakdown']
+            'breakdown': snapshot.get_breakdown(name)
         })
     
     # Sort by score descending
@@ -268,11 +285,12 @@ def get_students():
 
 @app.route('/api/classes', methods=['GET'])
 def get_classes():
-    if not hasattr(analyzer, 'class_scores') or not analyzer.class_scores:
+    snapshot = analyzer.snapshot
+    if not snapshot.class_scores:
         return jsonify({'error': 'No analysis results available'}), 400
     
     classes = []
-    for class_code, data in analyzer.class_scores.items():
+    for class_code, data in snapshot.class_scores.items():
         classes.append({
             'class_code': class_code,
             'student_count': data['student_count'],
@@ -291,12 +309,14 @@ def get_classes():
 
 @app.route('/api/timetable/grid', methods=['GET'])
 def get_timetable_grid():
-    if not hasattr(analyzer, 'timetable') or analyzer.timetable is None:
-        return jsonify({'error': 'No timetable data available'}), 400
-    
     try:
-        grid_data = analyzer.generate_timetable_grid_data()
-        return jsonify(grid_data)
+        grid_data = analyzer.snapshot.timetable_grid
+        if grid_data is None:
+            if analyzer.timetable is None:
+                return jsonify({'error': 'No timetable data available'}), 400
+            with analyzer.write_lock:
+                grid_data = analyzer.generate_timetable_grid_data()
+        return jsonify(dict(grid_data))
     except Exception as e:
         return jsonify({'error': f'Failed to generate timetable grid: {str(e)}'}), 500
 
@@ -1,14 +1,36 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, g, Response, send_file
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user, UserMixin
 from flask_bcrypt import Bcrypt
-import pandas as pd
 import os
+import atexit
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from web_ta_analyzer import TANeedAnalyzer
+# pandas, numpy and the analysis modules built on them are imported inside the
+# routes that use them, so a worker starts (and answers /api/health) without them
+from analysis_settings import (
+    INPUT_FRAMES, DELTA_FILE_TYPES, DEFAULT_WEIGHTINGS, CLASS_FILTER_DEFAULTS, validate_class_filters
+)
+from stage_timing import StageTimer, NULL_TIMER
+from metrics import MetricsRegistry
+from profiling import PROFILE_MODES, RequestProfile, list_profiles, prune_profiles, profile_path
 from werkzeug.utils import secure_filename
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import deferred, undefer
+from db_config import engine_options_for, apply_sqlite_pragmas, schema_is_current
+from result_store import (
+    RESULT_SECTIONS, section_column, pack_results, unpack_section,
+    parse_sections, ensure_table_columns
+)
+from result_diff import diff_results
+from write_behind import WriteBehindQueue
+from result_compaction import compact_analysis_history, get_last_report, start_compaction_scheduler
 import json
+import time
 
 app = Flask(__name__)
 
@@ -24,10 +46,49 @@ CORS(app,
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///ta_analyser.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options_for(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)
 
+# Saved analysis retention: newest N per user/config plus one snapshot per month
+app.config['RESULT_RETENTION_KEEP_LAST'] = int(os.environ.get('RESULT_RETENTION_KEEP_LAST', 10))
+app.config['RESULT_RETENTION_MONTHLY'] = int(os.environ.get('RESULT_RETENTION_MONTHLY', 12))
+app.config['RESULT_COMPACTION_INTERVAL_HOURS'] = float(os.environ.get('RESULT_COMPACTION_INTERVAL_HOURS', 24))
+# Shared by every worker on the host: elects one compaction runner and records when it last ran
+app.config['RESULT_COMPACTION_LOCK_FILE'] = os.environ.get('RESULT_COMPACTION_LOCK_FILE', 'result_compaction.lock')
+
+# Analysis results are written behind the response and journaled on disk until written
+app.config['RESULT_WRITE_QUEUE_SIZE'] = int(os.environ.get('RESULT_WRITE_QUEUE_SIZE', 32))
+app.config['RESULT_SPOOL_FOLDER'] = os.environ.get('RESULT_SPOOL_FOLDER', 'result_spool')
+
+# Process pool size for Monte Carlo robustness runs (1 scores in the request thread)
+app.config['ROBUSTNESS_WORKERS'] = int(os.environ.get('ROBUSTNESS_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Compute backend for scoring and class totals (pandas, numpy or polars; see compute_backends).
+# Unset uses the default; `flask --app auth_app init-db` checks the setting at deploy time
+app.config['ANALYSIS_BACKEND'] = os.environ.get('ANALYSIS_BACKEND')
+
+# Analyzer sessions are snapshotted when a worker exits and restored on the
+# user's next request, so recycled workers (max_requests) do not lose uploads
+app.config['SESSION_SNAPSHOTS'] = os.environ.get('SESSION_SNAPSHOTS', '1') == '1'
+app.config['SESSION_SNAPSHOT_FOLDER'] = os.environ.get('SESSION_SNAPSHOT_FOLDER', 'session_snapshots')
+app.config['SESSION_SNAPSHOT_MAX_AGE_HOURS'] = float(os.environ.get('SESSION_SNAPSHOT_MAX_AGE_HOURS', 24 * 7))
+
+# Per-stage timings in Server-Timing headers and one log line per request
+app.config['STAGE_TIMING'] = os.environ.get('STAGE_TIMING', '0') == '1'
+
+# Prometheus metrics at /api/metrics, shared between workers through METRICS_DIR
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR', 'metrics')
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+# Profiles of admin requests made with ?profile=deterministic|sampling, or
+# of an admin's next analysis run once armed (kept in their session)
+PROFILE_NEXT_RUN_KEY = 'profile_next_run'
+app.config['PROFILE_FOLDER'] = os.environ.get('PROFILE_FOLDER', 'profiles')
+app.config['PROFILE_KEEP'] = int(os.environ.get('PROFILE_KEEP', 20))
+
 # Create uploads directory
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
@@ -69,21 +130,96 @@ class WeightingConfig(db.Model):
     is_default = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # get_weightings filters on school/user, save_weightings adds is_default
+        db.Index('ix_weighting_config_school_user_default', 'school_id', 'user_id', 'is_default'),
+    )
+
+class ClassFilterSettings(db.Model):
+    """Per-school overrides of CLASS_FILTER_DEFAULTS"""
+    id = db.Column(db.Integer, primary_key=True)
+    school_id = db.Column(db.Integer, db.ForeignKey('school.id'), nullable=False, unique=True)
+    config_json = db.Column(db.Text, nullable=False)
+    updated_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ScoringRuleSet(db.Model):
+    """Per-school custom need factors, scored after the built-in ones"""
+    id = db.Column(db.Integer, primary_key=True)
+    school_id = db.Column(db.Integer, db.ForeignKey('school.id'), nullable=False, unique=True)
+    rules_json = db.Column(db.Text, nullable=False)
+    updated_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class AnalysisResult(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     school_id = db.Column(db.Integer, db.ForeignKey('school.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     weighting_config_id = db.Column(db.Integer, db.ForeignKey('weighting_config.id'), nullable=False)
-    result_json = db.Column(db.Text, nullable=False)
+    # Legacy single-blob storage, left empty for rows written with compressed sections
+    result_json = deferred(db.Column(db.Text, nullable=False, default=''))
+    statistics_blob = deferred(db.Column(db.LargeBinary, nullable=True))
+    students_blob = deferred(db.Column(db.LargeBinary, nullable=True))
+    classes_blob = deferred(db.Column(db.LargeBinary, nullable=True))
+    grid_blob = deferred(db.Column(db.LargeBinary, nullable=True))
+    content_hash = db.Column(db.String(64), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Duplicate check in persist_analysis_result
+        db.Index('ix_analysis_result_user_config_hash', 'user_id', 'weighting_config_id', 'content_hash'),
+        # result_id (content hash) lookups in load_user_results
+        db.Index('ix_analysis_result_user_hash', 'user_id', 'content_hash'),
+        # Per user/config history scan used by compaction
+        db.Index('ix_analysis_result_user_config_created', 'user_id', 'weighting_config_id', 'created_at'),
+    )
+
+    def set_results(self, results):
+        """Store results as independently compressed sections"""
+        self.set_packed_results(*pack_results(results))
+
+    def set_packed_results(self, sections, content_hash):
+        """Store sections already produced by pack_results"""
+        for section, blob in sections.items():
+            setattr(self, section_column(section), blob)
+        self.content_hash = content_hash
+        self.result_json = ''
+
+    @property
+    def awaiting_sections(self):
+        """Reserved by run_analysis, with the sections still queued in result_writer"""
+        return self.statistics_blob is None and not self.result_json
+
+    def get_results(self, sections=None):
+        """Decode only the requested sections, migrating legacy rows in place"""
+        sections = sections or list(RESULT_SECTIONS)
+        blobs = {section: getattr(self, section_column(section)) for section in sections}
+
+        if any(blob is None for blob in blobs.values()):
+            # Written before sectioned storage: decode once and rewrite compressed
+            legacy = json.loads(self.result_json)
+            self.set_results(legacy)
+            return {RESULT_SECTIONS[section]: legacy.get(RESULT_SECTIONS[section]) for section in sections}
+
+        return {RESULT_SECTIONS[section]: unpack_section(blob) for section, blob in blobs.items()}
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-# Initialize database
 with app.app_context():
+    apply_sqlite_pragmas(db.engine)
+
+def bootstrap_database():
+    """Create or upgrade the tables and the default school, admin and weightings
+
+    Safe to run repeatedly. Run once per deployment with `flask --app auth_app
+    init-db`; workers only run it themselves when database_is_bootstrapped()
+    says it is missing.
+    """
     db.create_all()
+    ensure_table_columns(db.engine, WeightingConfig.__table__)
+    ensure_table_columns(db.engine, AnalysisResult.__table__)
     
     # Create default school
     default_school = School.query.filter_by(name='Default School').first()
@@ -136,18 +272,328 @@ with app.app_context():
         db.session.add(default_weights)
         db.session.commit()
 
+def database_is_bootstrapped():
+    """Cheap check that bootstrap_database() has nothing to do
+
+    Inspects the schema and looks for the default admin, without creating
+    anything or hashing a password.
+    """
+    if not schema_is_current(db.engine, db.metadata.sorted_tables):
+        return False
+    return db.session.query(User.query.filter_by(username='admin').exists()).scalar()
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the database and its defaults, and check the analysis backend setting"""
+    from compute_backends import get_compute_backend
+    get_compute_backend(app.config['ANALYSIS_BACKEND'])
+    if database_is_bootstrapped():
+        print("Database already initialised")
+        return
+    bootstrap_database()
+    print("Database initialised")
+
+_bootstrap_checked = False
+_bootstrap_lock = threading.Lock()
+
+@app.before_request
+def ensure_database_bootstrapped():
+    """Once per worker, on its first request, bootstrap a database nobody initialised
+
+    Background jobs that query the database start here too, so importing the
+    app (including for CLI commands) never touches it.
+    """
+    global _bootstrap_checked
+    if _bootstrap_checked:
+        return
+    with _bootstrap_lock:
+        if not _bootstrap_checked:
+            if not database_is_bootstrapped():
+                try:
+                    bootstrap_database()
+                except IntegrityError:
+                    # Another worker inserted the defaults first
+                    db.session.rollback()
+            start_result_compaction()
+            _bootstrap_checked = True
+
+def run_result_compaction():
+    """Apply the configured retention policy to saved analysis results"""
+    return compact_analysis_history(
+        db, AnalysisResult,
+        keep_last=app.config['RESULT_RETENTION_KEEP_LAST'],
+        keep_monthly=app.config['RESULT_RETENTION_MONTHLY']
+    )
+
+@app.cli.command('compact-results')
+def compact_results_command():
+    """Prune saved analysis results outside the retention policy"""
+    print(json.dumps(run_result_compaction(), indent=2))
+
+def start_result_compaction():
+    """Start this worker's compaction schedule, once its first request has checked the schema"""
+    if app.config['RESULT_COMPACTION_INTERVAL_HOURS'] > 0:
+        start_compaction_scheduler(
+            app, db, AnalysisResult,
+            interval_seconds=app.config['RESULT_COMPACTION_INTERVAL_HOURS'] * 3600,
+            lock_path=app.config['RESULT_COMPACTION_LOCK_FILE'],
+            keep_last=app.config['RESULT_RETENTION_KEEP_LAST'],
+            keep_monthly=app.config['RESULT_RETENTION_MONTHLY']
+        )
+
+def reserve_analysis_result(user_id, weighting_config_id, content_hash, created_at):
+    """Row id for a result whose sections are written behind the response; (id, is_new)
+
+    An identical earlier result is reused, and counts as new for retention
+    so compaction keeps it. Otherwise a row without sections is inserted
+    now, so run_analysis can return a result_id that resolves right away.
+    """
+    existing = AnalysisResult.query.with_entities(AnalysisResult.id).filter_by(
+        user_id=user_id,
+        weighting_config_id=weighting_config_id,
+        content_hash=content_hash
+    ).first()
+    if existing:
+        AnalysisResult.query.filter_by(id=existing.id).update(
+            {'created_at': created_at}, synchronize_session=False
+        )
+        db.session.commit()
+        return existing.id, False
+    
+    analysis_result = AnalysisResult(
+        school_id=1,  # Default school for now
+        user_id=user_id,
+        weighting_config_id=weighting_config_id,
+        content_hash=content_hash,
+        created_at=created_at
+    )
+    db.session.add(analysis_result)
+    db.session.commit()
+    return analysis_result.id, True
+
+def persist_analysis_result(item):
+    """Write a queued result's sections into the row reserve_analysis_result created"""
+    with app.app_context():
+        values = {section_column(section): blob for section, blob in item['sections'].items()}
+        # Nothing to update if compaction or the user removed the row meanwhile
+        AnalysisResult.query.filter_by(id=item['id']).update(values, synchronize_session=False)
+        db.session.commit()
+
+result_writer = WriteBehindQueue(
+    persist_analysis_result,
+    spool_dir=app.config['RESULT_SPOOL_FOLDER'],
+    maxsize=app.config['RESULT_WRITE_QUEUE_SIZE'],
+    name='result-writer'
+)
+result_writer.start()
+atexit.register(result_writer.stop)
+
 # Global analyzer instance per user (in production, use Redis or similar)
 user_analyzers = {}
+user_analyzers_lock = threading.Lock()
+# session_token of each user's analyzer when it was last restored or snapshotted
+saved_session_tokens = {}
 
 def get_user_analyzer():
     """Get or create analyzer for current user"""
     if current_user.is_authenticated:
         user_id = current_user.id
         if user_id not in user_analyzers:
-            user_analyzers[user_id] = TANeedAnalyzer()
+            with user_analyzers_lock:
+                if user_id not in user_analyzers:
+                    from web_ta_analyzer import TANeedAnalyzer
+                    analyzer = TANeedAnalyzer(backend=app.config['ANALYSIS_BACKEND'])
+                    if app.config['SESSION_SNAPSHOTS']:
+                        restore_user_session(user_id, analyzer)
+                    user_analyzers[user_id] = analyzer
         return user_analyzers[user_id]
     return None
 
+@contextmanager
+def analyzer_writes(analyzer):
+    """Hold the analyzer's write lock for a change, charging its stage timings to this request
+
+    Writers take turns; reading routes use analyzer.snapshot and never wait.
+    """
+    with analyzer.write_lock:
+        analyzer.timer = request_timer()
+        try:
+            yield analyzer
+        finally:
+            analyzer.timer = NULL_TIMER
+
+def user_session_path(user_id):
+    from session_snapshots import snapshot_path
+    return snapshot_path(app.config['SESSION_SNAPSHOT_FOLDER'], f'user_{user_id}')
+
+def restore_user_session(user_id, analyzer):
+    """Pick up the session a previous worker snapshotted for this user, if any"""
+    from session_snapshots import restore_session, session_token
+    extra = restore_session(
+        user_session_path(user_id), analyzer,
+        max_age=app.config['SESSION_SNAPSHOT_MAX_AGE_HOURS'] * 3600
+    )
+    if extra is None:
+        return
+    user_upload_sessions[user_id] = set(extra['upload_session'])
+    saved_session_tokens[user_id] = session_token(analyzer)
+    print(f"Restored analysis session for user {user_id}")
+
+def discard_user_session(user_id):
+    saved_session_tokens.pop(user_id, None)
+    if app.config['SESSION_SNAPSHOTS']:
+        from session_snapshots import discard_session
+        discard_session(user_session_path(user_id))
+
+def snapshot_user_sessions():
+    """Snapshot every in-memory session that changed since it was last saved"""
+    if not app.config['SESSION_SNAPSHOTS'] or not user_analyzers:
+        return
+    from session_snapshots import save_session, session_token, prune_sessions
+    saved = 0
+    for user_id, analyzer in list(user_analyzers.items()):
+        token = session_token(analyzer)
+        if saved_session_tokens.get(user_id) == token:
+            continue
+        try:
+            if not any(getattr(analyzer, f'{name}_file') for name in INPUT_FRAMES):
+                discard_user_session(user_id)
+                continue
+            with analyzer.write_lock:
+                save_session(analyzer, user_session_path(user_id),
+                             extra={'upload_session': sorted(user_upload_sessions.get(user_id, ()))})
+            saved_session_tokens[user_id] = token
+            saved += 1
+        except Exception as e:
+            print(f"Could not snapshot the session of user {user_id}: {e}")
+    prune_sessions(app.config['SESSION_SNAPSHOT_FOLDER'], app.config['SESSION_SNAPSHOT_MAX_AGE_HOURS'] * 3600)
+    print(f"Snapshotted {saved} analysis sessions")
+
+# Runs as a worker exits, including when max_requests recycles it
+atexit.register(snapshot_user_sessions)
+
+def request_timer():
+    """The current request's StageTimer, or the no-op timer when timing is off"""
+    return g.get('stage_timer', NULL_TIMER)
+
+def analyzer_gauges():
+    """(name, labels, value) gauges for the analyzers this worker holds"""
+    analyzers = list(user_analyzers.values())
+    return [
+        ('ta_active_analyzers', {}, len(analyzers)),
+        ('ta_analyzer_bytes', {}, sum(analyzer.estimated_bytes() for analyzer in analyzers))
+    ]
+
+metrics_registry = None
+if app.config['METRICS_ENABLED']:
+    metrics_registry = MetricsRegistry(app.config['METRICS_DIR'])
+    metrics_registry.gauge_callback = analyzer_gauges
+    
+    # A connection runs one statement at a time, so it holds at most one start time
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+    
+    @event.listens_for(Engine, 'handle_error')
+    def discard_query_timer(exception_context):
+        # A failed statement never reaches after_cursor_execute
+        if exception_context.connection is not None:
+            exception_context.connection.info.pop('query_started', None)
+    
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def record_query_time(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('query_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        statement_type = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+        metrics_registry.observe('ta_db_query_duration_seconds', elapsed, statement=statement_type)
+
+@app.before_request
+def start_stage_timer():
+    if app.config['STAGE_TIMING'] or metrics_registry:
+        g.stage_timer = StageTimer()
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def report_stage_timings(response):
+    timer = request_timer()
+    if not timer.enabled:
+        return response
+    
+    total = time.perf_counter() - g.request_started
+    if app.config['STAGE_TIMING']:
+        response.headers['Server-Timing'] = timer.server_timing(total)
+        print("stage_timing " + timer.log_line(
+            method=request.method,
+            path=request.path,
+            status=response.status_code,
+            user_id=current_user.id if current_user.is_authenticated else None,
+            total_ms=round(total * 1000, 1)
+        ))
+    if metrics_registry:
+        record_request_metrics(timer, total, response)
+    return response
+
+@app.before_request
+def start_request_profile():
+    """Profile this request when an admin adds ?profile=deterministic or ?profile=sampling
+
+    An admin can also arm their next analysis run (POST /api/admin/profiles/arm).
+    Other users' requests ignore the argument and run unprofiled.
+    """
+    if not (current_user.is_authenticated and current_user.is_admin):
+        return None
+    mode = request.args.get('profile')
+    if not mode and request.endpoint == 'run_analysis':
+        mode = session.pop(PROFILE_NEXT_RUN_KEY, None)
+    if not mode:
+        return None
+    if mode not in PROFILE_MODES:
+        return jsonify({'error': f'profile must be one of {list(PROFILE_MODES)}'}), 400
+    g.profile = RequestProfile(mode)
+    g.profile.start()
+    return None
+
+@app.after_request
+def save_request_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    profile.stop()
+    info = profile.save(
+        app.config['PROFILE_FOLDER'],
+        method=request.method,
+        path=request.path,
+        status=response.status_code,
+        user_id=current_user.id
+    )
+    prune_profiles(app.config['PROFILE_FOLDER'], app.config['PROFILE_KEEP'])
+    app.logger.info("Saved %s profile %s for %s %s", info['mode'], info['id'], request.method, request.path)
+    response.headers['X-Profile-Id'] = info['id']
+    return response
+
+@app.teardown_request
+def stop_request_profile(exc):
+    # Requests that raised never reach after_request; stop the profiler without saving
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.stop()
+
+def record_request_metrics(timer, total, response):
+    # Route templates, not paths, keep the label set small
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics_registry.inc('ta_http_requests_total', route=route, method=request.method, status=str(response.status_code))
+    metrics_registry.observe('ta_http_request_duration_seconds', total, route=route, method=request.method)
+    for stage, seconds in timer.durations.items():
+        metrics_registry.observe('ta_analysis_stage_duration_seconds', seconds, stage=stage)
+    for (stage, result), count in timer.cache_events.items():
+        metrics_registry.inc('ta_stage_cache_total', count, stage=stage, result=result)
+    file_type = (request.view_args or {}).get('file_type')
+    if file_type in INPUT_FRAMES and response.status_code == 200 and request.content_length:
+        metrics_registry.observe('ta_upload_bytes', request.content_length, file_type=file_type)
+    metrics_registry.write()
+
 # Track upload session to clear data on new session
 user_upload_sessions = {}
 
@@ -191,6 +637,7 @@ def logout():
         del user_analyzers[user_id]
     if user_id in user_upload_sessions:
         del user_upload_sessions[user_id]
+    discard_user_session(user_id)
     return jsonify({'message': 'Logout successful'})
 
 @app.route('/api/auth/user', methods=['GET'])
@@ -244,17 +691,29 @@ def health_check():
         'authenticated': current_user.is_authenticated
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition, merged across every worker"""
+    if not metrics_registry:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'error': 'Invalid metrics token'}), 401
+    return Response(metrics_registry.collect(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/clear-data', methods=['POST'])
 @login_required
 def clear_data():
     """Clear all analysis data and start fresh"""
     analyzer = get_user_analyzer()
     if analyzer:
-        analyzer.clear_analysis_data()
+        with analyzer_writes(analyzer):
+            analyzer.clear_analysis_data()
     
     user_id = current_user.id
     if user_id in user_upload_sessions:
         user_upload_sessions[user_id] = set()
+    discard_user_session(user_id)
     
     return jsonify({'message': 'All analysis data cleared successfully'})
 
@@ -274,7 +733,8 @@ def upload_file(file_type):
     
     # If this is the first file in a new session, clear previous data
     if len(user_upload_sessions[user_id]) == 0:
-        analyzer.clear_analysis_data()
+        with analyzer_writes(analyzer):
+            analyzer.clear_analysis_data()
         print(f"Starting new upload session for user {user_id} - cleared previous data")
     
     if 'file' not in request.files:
@@ -285,12 +745,13 @@ def upload_file(file_type):
         return jsonify({'error': 'No file selected'}), 400
     
     if file and file.filename.endswith('.csv'):
-        filename = secure_filename(f"{user_id}_{file_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+        filename = secure_filename(f"{user_id}_{file_type}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.csv")
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
         
         # Validate file structure
         try:
+            import pandas as pd
             df = pd.read_csv(filepath)
             expected_columns = {
                 'students_classes': ['Name', 'Courses/classes'],
@@ -305,8 +766,17 @@ def upload_file(file_type):
                 os.remove(filepath)
                 return jsonify({'error': f'Missing required columns: {missing_cols}'}), 400
             
+            # Custom scoring rules read their own SEN columns
+            if file_type == 'students_sen':
+                from scoring_rules import missing_rule_columns
+                missing_cols = missing_rule_columns(get_school_scoring_rules(), df.columns)
+                if missing_cols:
+                    os.remove(filepath)
+                    return jsonify({'error': f'Missing columns used by the scoring rules: {missing_cols}'}), 400
+            
             # Store file info for current user
-            setattr(analyzer, f'{file_type}_file', filepath)
+            with analyzer_writes(analyzer):
+                setattr(analyzer, f'{file_type}_file', filepath)
             
             # Track this file type in the current upload session
             user_upload_sessions[user_id].add(file_type)
@@ -326,6 +796,50 @@ def upload_file(file_type):
     
     return jsonify({'error': 'Invalid file format. Please upload CSV files only.'}), 400
 
+@app.route('/api/upload/<file_type>/delta', methods=['POST'])
+@login_required
+def upload_delta(file_type):
+    """Apply added/changed/removed rows, keyed by Name, to a previously uploaded file"""
+    analyzer = get_user_analyzer()
+    if not analyzer:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    if file_type not in DELTA_FILE_TYPES:
+        return jsonify({'error': f'Delta uploads are only supported for {list(DELTA_FILE_TYPES)}'}), 400
+    
+    if not getattr(analyzer, f'{file_type}_file', None):
+        return jsonify({'error': f'Upload a full {file_type} file before applying changes'}), 400
+    
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    if not file.filename.endswith('.csv'):
+        return jsonify({'error': 'Invalid file format. Please upload CSV files only.'}), 400
+    
+    user_id = current_user.id
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    delta_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(f"{user_id}_{file_type}_delta_{timestamp}.csv"))
+    patched_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(f"{user_id}_{file_type}_{timestamp}_patched.csv"))
+    file.save(delta_path)
+    
+    try:
+        import pandas as pd
+        delta = pd.read_csv(delta_path)
+        with analyzer_writes(analyzer):
+            summary = analyzer.apply_delta(file_type, delta, save_to=patched_path)
+    except (ValueError, KeyError) as e:
+        return jsonify({'error': f'Delta could not be applied: {str(e)}'}), 400
+    finally:
+        if os.path.exists(delta_path):
+            os.remove(delta_path)
+    
+    return jsonify({
+        'message': 'Changes applied successfully',
+        'summary': summary,
+        'rows': len(getattr(analyzer, file_type))
+    })
+
 @app.route('/api/weightings', methods=['GET'])
 @login_required
 def get_weightings():
@@ -372,9 +886,98 @@ def save_weightings():
     
     return jsonify({'message': 'Weighting configuration saved successfully', 'id': new_config.id})
 
+@app.route('/api/class-filters', methods=['GET'])
+@login_required
+def get_class_filters():
+    school_id = request.args.get('school_id', 1, type=int)
+    settings = ClassFilterSettings.query.filter_by(school_id=school_id).first()
+    return jsonify({
+        'school_id': school_id,
+        'config': get_school_class_filters(school_id),
+        'defaults': CLASS_FILTER_DEFAULTS,
+        'updated_at': settings.updated_at.isoformat() if settings else None
+    })
+
+@app.route('/api/class-filters', methods=['POST'])
+@login_required
+def save_class_filters():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    data = request.get_json() or {}
+    school_id = data.get('school_id', 1)
+    try:
+        overrides = validate_class_filters(data.get('config', {}))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    settings = ClassFilterSettings.query.filter_by(school_id=school_id).first()
+    if settings:
+        overrides = {**json.loads(settings.config_json), **overrides}
+    else:
+        settings = ClassFilterSettings(school_id=school_id)
+        db.session.add(settings)
+    settings.config_json = json.dumps(overrides)
+    settings.updated_by = current_user.id
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Class filter settings saved successfully',
+        'config': get_school_class_filters(school_id)
+    })
+
+@app.route('/api/scoring-rules', methods=['GET'])
+@login_required
+def get_scoring_rules():
+    from scoring_rules import RULE_PREDICATES
+    school_id = request.args.get('school_id', 1, type=int)
+    rule_set = ScoringRuleSet.query.filter_by(school_id=school_id).first()
+    return jsonify({
+        'school_id': school_id,
+        'rules': get_school_scoring_rules(school_id),
+        'predicates': list(RULE_PREDICATES),
+        'updated_at': rule_set.updated_at.isoformat() if rule_set else None
+    })
+
+@app.route('/api/scoring-rules', methods=['POST'])
+@login_required
+def save_scoring_rules():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    from scoring_rules import validate_rules, missing_rule_columns
+    data = request.get_json() or {}
+    school_id = data.get('school_id', 1)
+    try:
+        rules = validate_rules(data.get('rules', []))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Checked against the SEN file this admin has uploaded, if any
+    analyzer = get_user_analyzer()
+    sen_file = getattr(analyzer, 'students_sen_file', None)
+    if sen_file and os.path.exists(sen_file):
+        import pandas as pd
+        missing = missing_rule_columns(rules, pd.read_csv(sen_file, nrows=0).columns)
+        if missing:
+            return jsonify({'error': f'Scoring rules use columns not in the SEN file: {missing}'}), 400
+    
+    rule_set = ScoringRuleSet.query.filter_by(school_id=school_id).first()
+    if not rule_set:
+        rule_set = ScoringRuleSet(school_id=school_id)
+        db.session.add(rule_set)
+    rule_set.rules_json = json.dumps(rules)
+    rule_set.updated_by = current_user.id
+    db.session.commit()
+    
+    return jsonify({'message': 'Scoring rules saved successfully', 'rules': rules})
+
 @app.route('/api/analysis/run', methods=['POST'])
 @login_required
 def run_analysis():
+    from ranking import parse_top_k
+    from scoring_rules import missing_rule_columns
+    from class_aggregation import CLASS_AGGREGATION_STRATEGIES, validate_class_aggregation
     analyzer = get_user_analyzer()
     if not analyzer:
         return jsonify({'error': 'Authentication required'}), 401
@@ -388,91 +991,412 @@ def run_analysis():
         if not hasattr(analyzer, file_attr) or not getattr(analyzer, file_attr):
             return jsonify({'error': f'Missing required file: {file_attr.replace("_file", "")}'}), 400
     
+    # How many students and classes to rank; a number or "all"
+    try:
+        top_students = parse_top_k(data.get('top_students'))
+        top_classes = parse_top_k(data.get('top_classes'))
+        # Strategy ranking the classes, plus any extra per-class metrics to report
+        class_aggregation = data.get('class_aggregation') or {}
+        validate_class_aggregation(class_aggregation)
+        class_metrics = data.get('class_metrics') or []
+        unknown = [name for name in class_metrics if name not in CLASS_AGGREGATION_STRATEGIES]
+        if unknown:
+            raise ValueError(f'Unknown class metrics: {unknown}')
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
     try:
-        # Load weighting configuration
+        with analyzer_writes(analyzer):
+            analyzer.set_class_aggregation(class_aggregation)
+            # Load weighting configuration
+            if weighting_config_id:
+                config = WeightingConfig.query.filter_by(
+                    id=weighting_config_id,
+                    user_id=current_user.id
+                ).first()
+                if config:
+                    weights = json.loads(config.config_json)
+                    analyzer.set_weightings(weights)
+            
+            # Changed filters only re-derive class_scores from cached aggregates
+            apply_school_settings(analyzer)
+            
+            # Run analysis
+            analyzer.load_data_from_files()
+            # Rules saved since the SEN file was uploaded may name columns it lacks
+            missing = missing_rule_columns(analyzer.scoring_rules, analyzer.students_sen.columns)
+            if missing:
+                return jsonify({'error': f'Scoring rules use columns not in the SEN file: {missing}'}), 400
+            analyzer.calculate_all_student_scores()
+            analyzer.calculate_class_need_levels()
+            
+            # Generate results
+            with analyzer.timer.stage('serialise'):
+                results = analyzer.get_analysis_results(top_students, top_classes)
+                if class_metrics:
+                    metrics = analyzer.get_class_metrics(class_metrics)
+                    for class_data in results['top_classes']:
+                        class_data['metrics'] = metrics[class_data['class_code']]
+            class_aggregation = analyzer.class_aggregation
+        
+        # The row is reserved now, so result_id resolves at once; its
+        # compressed sections are written in the background
+        result_id = None
         if weighting_config_id:
+            with request_timer().stage('persist'):
+                sections, content_hash = pack_results(results)
+                result_id, is_new = reserve_analysis_result(
+                    current_user.id, weighting_config_id, content_hash, datetime.utcnow()
+                )
+                if is_new:
+                    result_writer.submit(result_id, {'id': result_id, 'sections': sections})
+        
+        with request_timer().stage('serialise'):
+            response = jsonify({
+                'status': 'success',
+                'result_id': result_id,
+                'class_aggregation': class_aggregation,
+                'results': results,
+                'timestamp': datetime.utcnow().isoformat()
+            })
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
+
+def load_user_results(result_ref, sections):
+    """Fetch only the requested sections of one of the user's results
+
+    result_ref is the numeric result_id returned by run_analysis, or a
+    result's content hash. Sections still queued for writing are read from
+    result_writer, whose journal every worker on the host can see. Returns
+    (None, None) for an unknown result, and (info, None) when its sections
+    cannot be found yet.
+    """
+    filters = {'id': int(result_ref)} if result_ref.isdigit() else {'content_hash': result_ref}
+    result = AnalysisResult.query.options(
+        *[undefer(getattr(AnalysisResult, section_column(section))) for section in sections]
+    ).filter_by(
+        user_id=current_user.id,
+        **filters
+    ).first()
+    
+    if not result:
+        return None, None
+    
+    info = {'id': result.id, 'created_at': result.created_at.isoformat(), 'pending': result.awaiting_sections}
+    if result.awaiting_sections:
+        item = result_writer.get_pending(result.id)
+        if item is None:
+            return info, None
+        return info, {RESULT_SECTIONS[section]: unpack_section(item['sections'][section]) for section in sections}
+    
+    results = result.get_results(sections)
+    if db.session.is_modified(result):
+        db.session.commit()
+    return info, results
+
+def get_school_class_filters(school_id=1):
+    """The school's class filter settings merged over the defaults"""
+    settings = ClassFilterSettings.query.filter_by(school_id=school_id).first()
+    overrides = json.loads(settings.config_json) if settings else {}
+    return {**CLASS_FILTER_DEFAULTS, **overrides}
+
+def get_school_scoring_rules(school_id=1):
+    """The school's custom scoring rules, or an empty list"""
+    rule_set = ScoringRuleSet.query.filter_by(school_id=school_id).first()
+    return json.loads(rule_set.rules_json) if rule_set else []
+
+def apply_school_settings(analyzer, school_id=1):
+    """Give the analyzer the school's class filters and scoring rules
+
+    Unchanged settings leave every cached stage in place.
+    """
+    analyzer.set_class_filters(get_school_class_filters(school_id))
+    analyzer.set_scoring_rules(get_school_scoring_rules(school_id))
+
+def ensure_analysis_loaded(analyzer):
+    """Run (or reuse) the pipeline so scores and class memberships are current"""
+    apply_school_settings(analyzer)
+    analyzer.load_data_from_files()
+    analyzer.calculate_all_student_scores()
+    analyzer.calculate_class_need_levels()
+
+def resolve_weighting_candidates(candidates):
+    """Turn inline configs and saved config ids into (label, full weightings) pairs"""
+    resolved = []
+    for i, candidate in enumerate(candidates, 1):
+        if not isinstance(candidate, dict):
+            raise ValueError(f'Weighting {i} must be an object with a config or weighting_config_id')
+        if candidate.get('weighting_config_id'):
             config = WeightingConfig.query.filter_by(
-                id=weighting_config_id,
+                id=candidate['weighting_config_id'],
                 user_id=current_user.id
             ).first()
-            if config:
-                weights = json.loads(config.config_json)
-                analyzer.set_weightings(weights)
-        
-        # Run analysis
-        analyzer.load_data_from_files()
-        analyzer.calculate_all_student_scores()
-        analyzer.calculate_class_need_levels()
+            if not config:
+                raise ValueError(f"Weighting configuration {candidate['weighting_config_id']} not found")
+            label = candidate.get('name') or config.name
+            overrides = json.loads(config.config_json)
+        else:
+            label = candidate.get('name') or f'Config {i}'
+            overrides = candidate.get('config', {})
+            if not isinstance(overrides, dict):
+                raise ValueError(f'The config of {label} must be an object')
         
-        # Generate results
-        results = analyzer.get_analysis_results()
-        
-        # Save results to database
-        if weighting_config_id:
-            analysis_result = AnalysisResult(
-                school_id=1,  # Default school for now
-                user_id=current_user.id,
-                weighting_config_id=weighting_config_id,
-                result_json=json.dumps(results)
-            )
-            db.session.add(analysis_result)
-            db.session.commit()
+        unknown = [key for key in overrides if key not in DEFAULT_WEIGHTINGS]
+        if unknown:
+            raise ValueError(f'Unknown weighting keys in {label}: {unknown}')
+        resolved.append((label, {**DEFAULT_WEIGHTINGS, **overrides}))
+    return resolved
+
+@app.route('/api/analysis/sweep', methods=['POST'])
+@login_required
+def run_weighting_sweep_analysis():
+    """Compare many weighting configs in one batched computation"""
+    from weighting_sweep import run_weighting_sweep, MAX_SWEEP_CONFIGS
+    analyzer = get_user_analyzer()
+    if not analyzer:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    data = request.get_json() or {}
+    candidates = data.get('weightings', [])
+    if not candidates or not isinstance(candidates, list):
+        return jsonify({'error': 'Provide a list of weightings to compare'}), 400
+    if len(candidates) > MAX_SWEEP_CONFIGS:
+        return jsonify({'error': f'At most {MAX_SWEEP_CONFIGS} weightings can be compared at once'}), 400
+    
+    required_files = ['students_classes_file', 'students_sen_file', 'timetable_file']
+    for file_attr in required_files:
+        if not getattr(analyzer, file_attr, None):
+            return jsonify({'error': f'Missing required file: {file_attr.replace("_file", "")}'}), 400
+    
+    try:
+        resolved = resolve_weighting_candidates(candidates)
+        top_k = int(data.get('top_k', 10))
+        top_band = int(data['top_band']) if data.get('top_band') is not None else None
         
-        return jsonify({
-            'status': 'success',
-            'results': results,
-            'timestamp': datetime.utcnow().isoformat()
-        })
+        # Features and incidence are rebuilt rather than modified, so the sweep can run unlocked
+        with analyzer_writes(analyzer):
+            ensure_analysis_loaded(analyzer)
+            features, incidence = analyzer.get_student_features(), analyzer.get_class_incidence()
+        sweep = run_weighting_sweep(
+            features,
+            incidence,
+            [weights for _, weights in resolved],
+            [label for label, _ in resolved],
+            top_k=top_k,
+            top_band=top_band
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Weighting sweep failed: {str(e)}'}), 500
+    
+    return jsonify(sweep)
+
+@app.route('/api/analysis/robustness', methods=['POST'])
+@login_required
+def run_robustness():
+    """Probability of each class reaching the top N under randomly perturbed weights"""
+    from weight_robustness import run_robustness_analysis, DEFAULT_SAMPLES
+    analyzer = get_user_analyzer()
+    if not analyzer:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    required_files = ['students_classes_file', 'students_sen_file', 'timetable_file']
+    for file_attr in required_files:
+        if not getattr(analyzer, file_attr, None):
+            return jsonify({'error': f'Missing required file: {file_attr.replace("_file", "")}'}), 400
+    
+    data = request.get_json() or {}
+    try:
+        candidate = {key: data[key] for key in ('weighting_config_id', 'config') if key in data}
+        _, weightings = resolve_weighting_candidates([candidate])[0]
+        samples = int(data.get('samples', DEFAULT_SAMPLES))
+        spread = float(data.get('spread', 0.25))
+        top_n = int(data.get('top_n', 10))
+        seed = int(data['seed']) if data.get('seed') is not None else None
         
+        with analyzer_writes(analyzer):
+            ensure_analysis_loaded(analyzer)
+            features, incidence = analyzer.get_student_features(), analyzer.get_class_incidence()
+        report = run_robustness_analysis(
+            features,
+            incidence,
+            weightings,
+            samples=samples,
+            spread=spread,
+            top_n=top_n,
+            seed=seed,
+            workers=app.config['ROBUSTNESS_WORKERS']
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
+        return jsonify({'error': f'Robustness analysis failed: {str(e)}'}), 500
+    
+    report['weightings'] = weightings
+    return jsonify(report)
+
+def result_not_ready():
+    """Response for a result whose sections are still being written by another host's worker"""
+    response = jsonify({'error': 'Analysis result is still being saved, try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
-@app.route('/api/analysis/results/<int:result_id>', methods=['GET'])
+@app.route('/api/analysis/results/<result_ref>', methods=['GET'])
 @login_required
-def get_analysis_results(result_id):
-    result = AnalysisResult.query.filter_by(
-        id=result_id,
-        user_id=current_user.id
-    ).first()
+def get_analysis_results(result_ref):
+    try:
+        sections = parse_sections(request.args.get('sections'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
+    result, results = load_user_results(result_ref, sections)
     if not result:
         return jsonify({'error': 'Analysis result not found'}), 404
+    if results is None:
+        return result_not_ready()
+    
+    return jsonify({
+        'id': result['id'],
+        'sections': sections,
+        'results': results,
+        'created_at': result['created_at'],
+        'pending': result['pending']
+    })
+
+@app.route('/api/analysis/diff', methods=['GET'])
+@login_required
+def diff_analysis_results():
+    """Rows that changed between two saved analysis results"""
+    from_ref = request.args.get('from')
+    to_ref = request.args.get('to')
+    if not from_ref or not to_ref:
+        return jsonify({'error': 'Both from and to result ids are required'}), 400
+    
+    try:
+        sections = parse_sections(request.args.get('sections'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    from_result, from_results = load_user_results(from_ref, sections)
+    to_result, to_results = load_user_results(to_ref, sections)
+    if not from_result or not to_result:
+        return jsonify({'error': 'Analysis result not found'}), 404
+    if from_results is None or to_results is None:
+        return result_not_ready()
     
     return jsonify({
-        'id': result.id,
-        'results': json.loads(result.result_json),
-        'created_at': result.created_at.isoformat()
+        'from': from_result,
+        'to': to_result,
+        'sections': sections,
+        'diff': diff_results(from_results, to_results)
     })
 
+@app.route('/api/admin/results/compact', methods=['GET', 'POST'])
+@login_required
+def compact_results():
+    """Run (POST) or report on (GET) saved result compaction"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    if request.method == 'GET':
+        return jsonify({'last_report': get_last_report()})
+    
+    try:
+        return jsonify(run_result_compaction())
+    except Exception as e:
+        return jsonify({'error': f'Compaction failed: {str(e)}'}), 500
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@login_required
+def get_profiles():
+    """Stored request profiles, newest first"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    return jsonify(list_profiles(app.config['PROFILE_FOLDER']))
+
+@app.route('/api/admin/profiles/arm', methods=['GET', 'POST'])
+@login_required
+def arm_profile():
+    """Profile this admin's next analysis run with the given mode; mode null disarms"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    if request.method == 'POST':
+        mode = (request.get_json() or {}).get('mode')
+        if mode is None:
+            session.pop(PROFILE_NEXT_RUN_KEY, None)
+        elif mode in PROFILE_MODES:
+            session[PROFILE_NEXT_RUN_KEY] = mode
+        else:
+            return jsonify({'error': f'mode must be one of {list(PROFILE_MODES)} or null'}), 400
+    return jsonify({'armed': session.get(PROFILE_NEXT_RUN_KEY)})
+
+@app.route('/api/admin/profiles/<profile_id>/<kind>', methods=['GET'])
+@login_required
+def download_profile(profile_id, kind):
+    """Download a profile's call tree (tree), pstats dump (pstats) or collapsed stacks (collapsed)"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    path = profile_path(app.config['PROFILE_FOLDER'], profile_id, kind)
+    if not path:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=f'{profile_id}.{kind}')
+
 @app.route('/api/students', methods=['GET'])
 @login_required
 def get_students():
+    from ranking import top_k_students
+    from need_breakdown import factor_summary
     analyzer = get_user_analyzer()
-    if not analyzer or not hasattr(analyzer, 'student_scores') or not analyzer.student_scores:
+    # One consistent analysis for the whole request, even if a run finishes meanwhile
+    snapshot = analyzer.snapshot if analyzer else None
+    if not snapshot or not snapshot.student_scores:
         return jsonify({'error': 'No analysis results available'}), 400
     
-    students = []
-    for name, data in analyzer.student_scores.items():
-        students.append({
-            'name': name,
-            'score': data['score'],
-            'breakdown': data['breakdown']
-        })
+    # breakdown=text (default) renders the text per student, factors sends the
+    # bitmask and quoted values instead, none sends name and score only
+    breakdown = request.args.get('breakdown', 'text')
+    if breakdown not in ('text', 'factors', 'none'):
+        return jsonify({'error': 'breakdown must be text, factors or none'}), 400
+    page = request.args.get('page', type=int)
+    per_page = request.args.get('per_page', 100, type=int)
+    if (page is not None and page < 1) or per_page < 1:
+        return jsonify({'error': 'page and per_page must be positive'}), 400
     
-    # Sort by score descending
-    students.sort(key=lambda x: x['score'], reverse=True)
+    # Sort by score descending, only as far as the requested page
+    limit = page * per_page if page else None
+    ranked = top_k_students(snapshot.student_scores, limit)
+    if page:
+        ranked = ranked[(page - 1) * per_page:]
     
-    return jsonify(students)
+    students = []
+    for name, data in ranked:
+        student = {'name': name, 'score': data['score']}
+        if breakdown == 'text':
+            student['breakdown'] = snapshot.get_breakdown(name)
+        elif breakdown == 'factors':
+            student.update(factor_summary(data))
+        students.append(student)
+    
+    with request_timer().stage('serialise'):
+        response = jsonify(students)
+    response.headers['X-Total-Count'] = str(len(snapshot.student_scores))
+    return response
 
 @app.route('/api/classes', methods=['GET'])
 @login_required
 def get_classes():
     analyzer = get_user_analyzer()
-    if not analyzer or not hasattr(analyzer, 'class_scores') or not analyzer.class_scores:
+    snapshot = analyzer.snapshot if analyzer else None
+    if not snapshot or not snapshot.class_scores:
         return jsonify({'error': 'No analysis results available'}), 400
     
     classes = []
-    for class_code, data in analyzer.class_scores.items():
+    for class_code, data in snapshot.class_scores.items():
         classes.append({
             'class_code': class_code,
             'student_count': data['student_count'],
@@ -487,18 +1411,28 @@ def get_classes():
     # Sort by weighted score descending
     classes.sort(key=lambda x: x['weighted_score'], reverse=True)
     
-    return jsonify(classes)
+    with request_timer().stage('serialise'):
+        response = jsonify(classes)
+    return response
 
 @app.route('/api/timetable/grid', methods=['GET'])
 @login_required
 def get_timetable_grid():
     analyzer = get_user_analyzer()
-    if not analyzer or not hasattr(analyzer, 'timetable') or analyzer.timetable is None:
+    if not analyzer:
         return jsonify({'error': 'No timetable data available'}), 400
     
     try:
-        grid_data = analyzer.generate_timetable_grid_data()
-        return jsonify(grid_data)
+        grid_data = analyzer.snapshot.timetable_grid
+        if grid_data is None:
+            if analyzer.timetable is None:
+                return jsonify({'error': 'No timetable data available'}), 400
+            # Built once per analysis; later requests read it from the published snapshot
+            with analyzer_writes(analyzer):
+                grid_data = analyzer.generate_timetable_grid_data()
+        with request_timer().stage('serialise'):
+            response = jsonify(dict(grid_data))
+        return response
     except Exception as e:
         return jsonify({'error': f'Failed to generate timetable grid: {str(e)}'}), 500
 
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Query latency benchmark for the auth_app database access patterns
+
+Seeds a throwaway database with thousands of users, weighting configs and
+saved analysis results, then times the queries issued by auth_app routes
+with the composite indexes in place and again after dropping them.
+
+    python benchmarks/bench_db_queries.py --users 5000 --results-per-config 5
+    DATABASE_URL=postgresql://... python benchmarks/bench_db_queries.py
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def time_query(fn, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'p50': statistics.median(samples),
+        'p95': percentile(samples, 95),
+        'max': max(samples),
+    }
+
+
+def seed(auth_app, users, configs_per_user, results_per_config):
+    """Bulk insert users, weighting configs and compressed results"""
+    from sqlalchemy import insert
+    from result_store import pack_results
+
+    db = auth_app.db
+    now = datetime.utcnow()
+    sections, content_hash = pack_results({
+        'statistics': {'total_students': 1500, 'average_score': 3.2},
+        'top_students': [{'name': f'Student {i}', 'score': 20 - i % 20} for i in range(50)],
+        'top_classes': [{'class_code': f'7A/Ma{i}', 'weighted_score': 12.5} for i in range(50)],
+        'timetable_grid': {'09:00 - 10:00': []},
+    })
+
+    db.session.execute(insert(auth_app.User), [
+        {'username': f'bench_user_{i}', 'email': f'bench_{i}@school.edu',
+         'password_hash': 'not-a-real-hash', 'school_name': 'Default School'}
+        for i in range(users)
+    ])
+    user_ids = [row[0] for row in db.session.query(auth_app.User.id).filter(
+        auth_app.User.username.like('bench_user_%')).all()]
+
+    db.session.execute(insert(auth_app.WeightingConfig), [
+        {'school_id': 1, 'user_id': user_id, 'name': f'Config {c}',
+         'config_json': '{"pupil_premium": 2}', 'is_default': c == 0, 'created_at': now}
+        for user_id in user_ids for c in range(configs_per_user)
+    ])
+    configs = db.session.query(auth_app.WeightingConfig.id, auth_app.WeightingConfig.user_id).filter(
+        auth_app.WeightingConfig.user_id.in_(user_ids)).all()
+
+    rows = []
+    for config_id, user_id in configs:
+        for r in range(results_per_config):
+            row = {'school_id': 1, 'user_id': user_id, 'weighting_config_id': config_id,
+                   'result_json': '', 'content_hash': f'{content_hash[:56]}{r:08d}',
+                   'created_at': now - timedelta(days=7 * r)}
+            row.update({f'{section}_blob': blob for section, blob in sections.items()})
+            rows.append(row)
+    for i in range(0, len(rows), 5000):
+        db.session.execute(insert(auth_app.AnalysisResult), rows[i:i + 5000])
+    db.session.commit()
+    return user_ids, configs
+
+
+def run_queries(auth_app, user_ids, configs, repeat):
+    """Time the route query patterns against random users"""
+    WeightingConfig = auth_app.WeightingConfig
+    AnalysisResult = auth_app.AnalysisResult
+    db = auth_app.db
+    rng = random.Random(42)
+
+    sample_users = [rng.choice(user_ids) for _ in range(repeat)]
+    sample_configs = [rng.choice(configs) for _ in range(repeat)]
+    result_ids = [row[0] for row in db.session.query(AnalysisResult.id).filter(
+        AnalysisResult.user_id.in_(sample_users[:50])).all()]
+    owner = dict(db.session.query(AnalysisResult.id, AnalysisResult.user_id).filter(
+        AnalysisResult.id.in_(result_ids)).all())
+
+    timings = {}
+    timings['weightings list (school, user)'] = time_query(
+        lambda u: WeightingConfig.query.filter_by(school_id=1, user_id=u).all(),
+        [(u,) for u in sample_users])
+    timings['default config (school, user, is_default)'] = time_query(
+        lambda u: WeightingConfig.query.filter_by(school_id=1, user_id=u, is_default=True).first(),
+        [(u,) for u in sample_users])
+    timings['duplicate check (user, config, hash)'] = time_query(
+        lambda c, u: AnalysisResult.query.filter_by(
+            user_id=u, weighting_config_id=c, content_hash='0' * 64).first(),
+        sample_configs)
+    timings['result by id (statistics only)'] = time_query(
+        lambda rid: AnalysisResult.query.options(
+            auth_app.undefer(AnalysisResult.statistics_blob)
+        ).filter_by(id=rid, user_id=owner[rid]).first().get_results(['statistics']),
+        [(rng.choice(result_ids),) for _ in range(repeat)])
+    timings['history scan for one user/config'] = time_query(
+        lambda c, u: db.session.query(AnalysisResult.id, AnalysisResult.created_at).filter_by(
+            user_id=u, weighting_config_id=c).order_by(AnalysisResult.created_at.desc()).all(),
+        sample_configs)
+    db.session.rollback()
+    return timings
+
+
+def drop_composite_indexes(auth_app):
+    for model in (auth_app.WeightingConfig, auth_app.AnalysisResult):
+        for index in model.__table__.indexes:
+            index.drop(bind=auth_app.db.engine, checkfirst=True)
+
+
+def print_table(indexed, unindexed):
+    print(f"\n{'query':<45} {'indexed p50/p95 ms':>20} {'no index p50/p95 ms':>22}")
+    print('-' * 90)
+    for name, stats in indexed.items():
+        other = unindexed.get(name)
+        other_text = f"{other['p50']:.3f}/{other['p95']:.3f}" if other else '-'
+        print(f"{name:<45} {stats['p50']:>9.3f}/{stats['p95']:<9.3f} {other_text:>22}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--configs-per-user', type=int, default=3)
+    parser.add_argument('--results-per-config', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--skip-unindexed', action='store_true', help='Only time the indexed schema')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='ta_bench_db_')
+    os.chdir(workdir)
+    os.environ.setdefault('DATABASE_URL', f'sqlite:///{workdir}/bench.db')
+    os.environ['RESULT_COMPACTION_INTERVAL_HOURS'] = '0'
+    sys.path.insert(0, str(REPO_ROOT))
+    import auth_app
+
+    with auth_app.app.app_context():
+        start = time.perf_counter()
+        user_ids, configs = seed(auth_app, args.users, args.configs_per_user, args.results_per_config)
+        total_results = len(configs) * args.results_per_config
+        print(f"Seeded {len(user_ids)} users, {len(configs)} configs, {total_results} results "
+              f"in {time.perf_counter() - start:.1f}s ({auth_app.db.engine.url.drivername})")
+
+        indexed = run_queries(auth_app, user_ids, configs, args.repeat)
+        unindexed = {}
+        if not args.skip_unindexed:
+            drop_composite_indexes(auth_app)
+            unindexed = run_queries(auth_app, user_ids, configs, args.repeat)
+        print_table(indexed, unindexed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""Differential equivalence check between the analyzer implementations
+
+Runs the legacy row-by-row analyzer (the ta_web_app/backend copy) and the
+shared engine in web_ta_analyzer, once per compute backend and once through
+the ta_timetable_analyzer.py CLI, over the same synthetic or fuzzed school.
+Student scores (value and int/float type), breakdown text, class aggregates
+with their member lists and the timetable grid must match exactly; timings
+are reported side by side, so the backends are benchmarked as they are checked.
+
+    python benchmarks/equivalence.py --students 1500
+    python benchmarks/equivalence.py --students 300 --fuzz 25
+    python benchmarks/equivalence.py --students 10000 --backends numpy polars
+
+The CLI uses the default weightings only, so it sits out fuzzed weightings.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+for path in (REPO_ROOT, REPO_ROOT / 'ta_web_app' / 'backend', REPO_ROOT / 'benchmarks'):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+import ta_analyzer  # noqa: E402  (the backend copy)
+import ta_timetable_analyzer  # noqa: E402
+import web_ta_analyzer  # noqa: E402
+from compute_backends import available_backends  # noqa: E402
+from synthetic_school import SEN_COLUMNS, write_school  # noqa: E402
+
+# Row path the others are checked against
+REFERENCE = 'backend'
+# web:<backend> runs the engine with that compute backend; the CLI uses the default one
+IMPLEMENTATIONS = (REFERENCE, 'cli') + tuple(f'web:{name}' for name in available_backends())
+CLASS_FIELDS = (
+    'student_count', 'total_need_score', 'average_need_score',
+    'max_need_score', 'high_need_students', 'weighted_score'
+)
+# Differences listed per comparison before the rest are counted
+MAX_REPORTED = 10
+
+
+def _load(analyzer, paths):
+    if isinstance(analyzer, ta_timetable_analyzer.TANeedAnalyzer):
+        # The CLI only reads the three CSVs from the working directory
+        previous = os.getcwd()
+        os.chdir(os.path.dirname(paths['students_classes']))
+        try:
+            analyzer.load_data()
+        finally:
+            os.chdir(previous)
+        return
+    analyzer.students_classes_file = paths['students_classes']
+    analyzer.students_sen_file = paths['students_sen']
+    analyzer.timetable_file = paths['timetable']
+    analyzer.load_data_from_files()
+
+
+def run_implementation(name, paths, weightings=None):
+    """Run one analyzer end to end; returns its comparable output and stage timings"""
+    if name == 'cli':
+        analyzer = ta_timetable_analyzer.TANeedAnalyzer()
+    elif name == REFERENCE:
+        analyzer = ta_analyzer.TANeedAnalyzer()
+        analyzer.set_weightings(weightings or {})
+    else:
+        analyzer = web_ta_analyzer.TANeedAnalyzer(backend=name.split(':', 1)[1])
+        analyzer.set_weightings(weightings or {})
+
+    seconds = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        _load(analyzer, paths)
+        seconds['load'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        analyzer.calculate_all_student_scores()
+        seconds['score'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        analyzer.calculate_class_need_levels()
+        seconds['classes'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        grid = analyzer.generate_timetable_grid_data()
+        seconds['grid'] = time.perf_counter() - start
+
+    if name == REFERENCE:
+        breakdown = lambda student: analyzer.student_scores[student]['breakdown']  # noqa: E731
+    else:
+        breakdown = analyzer.get_breakdown
+    output = collect_output(analyzer, grid, breakdown)
+    seconds['total'] = sum(seconds.values())
+    return {**output, 'seconds': seconds}
+
+
+def collect_output(analyzer, grid, breakdown):
+    """Comparable students, classes and grid of an analyzer that has run"""
+    students = {}
+    for student in analyzer.student_scores:
+        score = analyzer.student_scores[student]['score']
+        students[student] = (score, type(score).__name__, breakdown(student))
+
+    classes = {
+        class_code: {
+            **{field: data[field] for field in CLASS_FIELDS},
+            'students': [(member['name'], member['score']) for member in data['students']]
+        }
+        for class_code, data in analyzer.class_scores.items()
+    }
+    return {'students': students, 'classes': classes, 'grid': grid}
+
+
+def _typed(value):
+    # 3 == 3.0 in Python; an int turning into a float is still a difference
+    return (type(value).__name__, value)
+
+
+def compare(expected, actual):
+    """Differences between two run_implementation outputs, as readable lines"""
+    differences = []
+
+    def check(section, key, want, got):
+        if want != got:
+            differences.append(f"{section} {key!r}: expected {want!r}, got {got!r}")
+
+    for section in ('students', 'classes'):
+        want, got = expected[section], actual[section]
+        for key in sorted(want.keys() - got.keys(), key=str):
+            differences.append(f"{section} {key!r}: missing")
+        for key in sorted(got.keys() - want.keys(), key=str):
+            differences.append(f"{section} {key!r}: unexpected")
+        for key in sorted(want.keys() & got.keys(), key=str):
+            if section == 'students':
+                check(section, key, want[key], got[key])
+            else:
+                check(section, key,
+                      {field: _typed(value) for field, value in want[key].items() if field != 'students'},
+                      {field: _typed(value) for field, value in got[key].items() if field != 'students'})
+                check(f'{section} members of', key,
+                      [(name, _typed(score)) for name, score in want[key]['students']],
+                      [(name, _typed(score)) for name, score in got[key]['students']])
+
+    want, got = expected['grid'], actual['grid']
+    check('grid', 'time slots', sorted(want), sorted(got))
+    for time_slot in sorted(want.keys() & got.keys()):
+        check('grid', time_slot,
+              [{key: _typed(value) for key, value in lesson.items()} for lesson in want[time_slot]],
+              [{key: _typed(value) for key, value in lesson.items()} for lesson in got[time_slot]])
+    return differences
+
+
+def run_case(paths, weightings=None, implementations=IMPLEMENTATIONS):
+    """Run the reference and the given implementations on one dataset
+
+    Returns ({name: output}, {name: differences against REFERENCE}).
+    """
+    implementations = [REFERENCE] + [
+        name for name in implementations if name != REFERENCE and not (weightings and name == 'cli')
+    ]
+    outputs = {name: run_implementation(name, paths, weightings) for name in implementations}
+    reference = outputs[REFERENCE]
+    differences = {name: compare(reference, output) for name, output in outputs.items() if name != REFERENCE}
+    return outputs, differences
+
+
+def fuzz_school(directory, students, seed):
+    """A synthetic school with edge cases mixed in
+
+    Blank, '.' and whitespace cells, float and non-numeric reading scores,
+    duplicate and SEN-only students, repeated and oversized classes, class
+    codes that are substrings of others or hold regex characters,
+    tutor-time and suspended lessons.
+    """
+    rnd = random.Random(seed)
+    paths = write_school(directory, students, seed=seed)
+
+    def read(path):
+        with open(path, newline='') as f:
+            rows = list(csv.reader(f))
+        return rows[0], rows[1:]
+
+    def write(path, header, rows):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    header, rows = read(paths['students_sen'])
+    odd_cells = ['', '.', ' ', ' . ', 'Yes', 'No', 'yes', 'N/A', 'x']
+    numeric_cells = ['', '84', '85', '84.5', '70', '.', 'n/a']
+    score_columns = {SEN_COLUMNS.index('Read. Comp. Standardised Score'), SEN_COLUMNS.index('Spelling Standardised Score')}
+    # Keep some score columns purely numeric so the int/float paths are both exercised
+    numeric_only = rnd.random() < 0.5
+    for row in rows:
+        for i in range(1, len(row)):
+            if rnd.random() < 0.08:
+                if i in score_columns:
+                    row[i] = rnd.choice(numeric_cells[:5] if numeric_only else numeric_cells)
+                else:
+                    row[i] = rnd.choice(odd_cells)
+        if rnd.random() < 0.05:
+            row[SEN_COLUMNS.index('SEN need(s)')] = rnd.choice([',', 'Autism,', ' , SEMH', 'SpLD,,MLD'])
+    # Later duplicates of a name are ignored by the row path
+    rows += [[row[0]] + [rnd.choice(odd_cells) for _ in row[1:]] for row in rnd.sample(rows, min(5, len(rows)))]
+    rows += [[f'SenOnly{i}, Pupil'] + row[1:] for i, row in enumerate(rnd.sample(rows, min(3, len(rows))))]
+    rnd.shuffle(rows)
+    write(paths['students_sen'], header, rows)
+
+    header, rows = read(paths['students_classes'])
+    for row in rows:
+        parts = row[1].split(', ')
+        roll = rnd.random()
+        if roll < 0.05:
+            parts.append(parts[-1])
+        elif roll < 0.08:
+            parts.append('Pe/Games')
+        elif roll < 0.1:
+            parts = []
+        if rnd.random() < 0.3:
+            # A shared class large enough to count as an assembly
+            parts.append('Subj: Year 7: 7Z/Big1ABC')
+        if rnd.random() < 0.1:
+            # Prefix of another class code, so str.contains matches both
+            parts.append('Subj: Year 8: 8Z/Ma1')
+        if rnd.random() < 0.1:
+            # str.contains reads '.' as any character, so this matches 8Z/Max1
+            parts.append('Subj: Year 8: 8Z/Ma.1')
+        row[1] = ', '.join(parts)
+    rows += [[f'ClassOnly{i}, Pupil', 'Subj: Year 9: 9Z/Sc1ABC'] for i in range(3)]
+    write(paths['students_classes'], header, rows)
+
+    header, rows = read(paths['timetable'])
+    rows += [
+        ['Tuesday', '08:40 - 09:00', 'Subj: Year 8: 8Z/Ma1', 'Mr 1', 'R1', ''],
+        ['Tuesday', '09:00 - 10:00', 'Subj: Year 8: 8Z/Ma10ABC', 'Mr 2', 'R2', ''],
+        ['Thursday', '08:40 - 09:00', 'Subj: Year 8: 8Z/Max1', 'Mr 2', 'R2', ''],
+        ['Friday', '10:00 - 11:00', 'Subj: Year 9: 9Z/Sc1ABC', 'Mr 3', 'R3', rnd.choice(['', 'Yes'])],
+        ['Friday', '11:15 - 12:15', '9Z/Sc1ABC', 'Mr 3', 'R3', '']
+    ]
+    for row in rnd.sample(rows, min(5, len(rows))):
+        row[1] = '08:40 - 09:00'
+    write(paths['timetable'], header, rows)
+    return paths
+
+
+def fuzz_weightings(seed):
+    """Random weightings; about a third include a float weight"""
+    rnd = random.Random(seed)
+    weightings = {key: rnd.randint(0, 5) for key in web_ta_analyzer.DEFAULT_WEIGHTINGS}
+    weightings['reading_threshold'] = rnd.choice([80, 85, 90])
+    weightings['spelling_threshold'] = rnd.choice([80, 85, 90])
+    if rnd.random() < 0.35:
+        weightings[rnd.choice(['pupil_premium', 'eal', 'boxall', 'medical_info'])] = rnd.choice([0.5, 1.5, 2.25])
+    return weightings
+
+
+def print_case(label, outputs, differences):
+    reference = outputs[REFERENCE]['seconds']
+    print(f"\n{label}")
+    print(f"  {'implementation':<16} {'load':>8} {'score':>8} {'classes':>8} {'grid':>8} {'total':>8} {'speedup':>8}  result")
+    for name, output in outputs.items():
+        seconds = output['seconds']
+        cells = ' '.join(f"{seconds[stage]:8.3f}" if stage in seconds else f"{'-':>8}"
+                         for stage in ('load', 'score', 'classes', 'grid', 'total'))
+        speedup = reference['total'] / seconds['total'] if seconds['total'] else float('inf')
+        if name == REFERENCE:
+            result = 'reference'
+        elif differences[name]:
+            result = f"{len(differences[name])} differences"
+        else:
+            result = 'identical'
+        print(f"  {name:<16} {cells} {speedup:7.1f}x  {result}")
+        for line in differences.get(name, [])[:MAX_REPORTED]:
+            print(f"      {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=1500, help='size of each generated school')
+    parser.add_argument('--fuzz', type=int, default=0, help='also check this many fuzzed schools')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--backends', nargs='+', choices=available_backends(),
+                        help='engine backends to run (default: every installed one)')
+    args = parser.parse_args()
+    implementations = IMPLEMENTATIONS
+    if args.backends:
+        implementations = ('cli',) + tuple(f'web:{name}' for name in args.backends)
+
+    failed = False
+    with tempfile.TemporaryDirectory(prefix='ta_equivalence_') as workdir:
+        cases = [('generated', write_school(os.path.join(workdir, 'generated'), args.students, args.seed), None)]
+        for i in range(args.fuzz):
+            seed = args.seed + i
+            paths = fuzz_school(os.path.join(workdir, f'fuzz_{seed}'), args.students, seed)
+            cases.append((f'fuzz seed {seed}', paths, None))
+            cases.append((f'fuzz seed {seed}, fuzzed weightings', paths, fuzz_weightings(seed)))
+
+        for label, paths, weightings in cases:
+            outputs, differences = run_case(paths, weightings, implementations)
+            print_case(f"{label}, {args.students} students" + (f" {weightings}" if weightings else ''), outputs, differences)
+            failed = failed or any(differences.values())
+
+    print('\nFAILED: implementations differ' if failed else '\nAll implementations identical')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
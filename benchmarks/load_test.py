@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""Concurrent-user load test against auth_app under a local gunicorn
+
+Starts `gunicorn -c gunicorn_config.py auth_app:app` in a scratch directory
+with its own SQLite database, then simulates teachers who register, log in,
+upload a synthetic school, run an analysis and browse the students, classes
+and timetable grid. Reports throughput and p50/p95/p99 latency per endpoint
+so worker and thread settings can be chosen from data.
+
+    python benchmarks/load_test.py --users 20 --iterations 10
+    python benchmarks/load_test.py --users 50 --workers 4 --threads 2 --json results.json
+
+Analyzers are held in each worker's memory, so with more than one worker a
+user's requests must land on the worker holding their uploads; requests that
+do not are reported as errors for their endpoint.
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'benchmarks'))
+
+from synthetic_school import write_school  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(workdir, port, workers, threads):
+    """Run auth_app under the repo's gunicorn_config.py; CLI flags override its worker settings"""
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'load_test.db')}",
+        METRICS_DIR=os.path.join(workdir, 'metrics'),
+        RESULT_SPOOL_FOLDER=os.path.join(workdir, 'result_spool'),
+        RESULT_COMPACTION_INTERVAL_HOURS='0',
+        FLASK_ENV='production'
+    )
+    # Initialise the database once, as a deployment would, so workers only run the cheap check
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'auth_app', 'init-db'], cwd=workdir,
+                   env=dict(env, PYTHONPATH=str(REPO_ROOT)), check=True, stdout=subprocess.DEVNULL)
+    command = [
+        sys.executable, '-m', 'gunicorn',
+        '-c', str(REPO_ROOT / 'gunicorn_config.py'),
+        '--pythonpath', str(REPO_ROOT),
+        '--workers', str(workers),
+        '--threads', str(threads),
+        '--worker-class', 'gthread' if threads > 1 else 'sync',
+        '--timeout', '120',
+        '--access-logfile', os.path.join(workdir, 'access.log'),
+        '--error-logfile', os.path.join(workdir, 'error.log'),
+        'auth_app:app'
+    ]
+    # The app prints progress for every analysis; keep it out of the report
+    server_log = open(os.path.join(workdir, 'server.log'), 'w')
+    return subprocess.Popen(command, cwd=workdir, env=env, stdout=server_log, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(base_url, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {server.returncode}")
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/health', timeout=2):
+                return
+        except OSError:
+            time.sleep(0.25)
+    raise RuntimeError(f"gunicorn did not answer {base_url}/api/health within {timeout}s")
+
+
+def multipart_body(field, filename, content):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: text/csv\r\n\r\n'
+    ).encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class Recorder:
+    """Latency samples and error counts per endpoint, shared by every simulated user"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, seconds, ok):
+        with self._lock:
+            self.samples[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def report(self, duration):
+        rows = []
+        for endpoint in sorted(self.samples):
+            samples = self.samples[endpoint]
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(samples),
+                'errors': self.errors[endpoint],
+                'throughput_rps': round(len(samples) / duration, 2),
+                'p50_ms': round(percentile(samples, 50) * 1000, 1),
+                'p95_ms': round(percentile(samples, 95) * 1000, 1),
+                'p99_ms': round(percentile(samples, 99) * 1000, 1)
+            })
+        return rows
+
+
+class SimulatedUser:
+    def __init__(self, base_url, recorder, index):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.username = f'load_user_{index}_{uuid.uuid4().hex[:6]}'
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, endpoint, method, path, payload=None, body=None, content_type=None):
+        """Send one request, recording its latency under endpoint; returns (status, parsed JSON)"""
+        if payload is not None:
+            body, content_type = json.dumps(payload).encode(), 'application/json'
+        req = urllib.request.Request(f'{self.base_url}{path}', data=body, method=method)
+        if content_type:
+            req.add_header('Content-Type', content_type)
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=300) as response:
+                status, raw = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, raw = e.code, e.read()
+        except OSError:
+            status, raw = 0, b''
+        self.recorder.add(endpoint, time.perf_counter() - start, 200 <= status < 300)
+        try:
+            return status, json.loads(raw) if raw else None
+        except ValueError:
+            return status, None
+
+    def run(self, school_paths, iterations, rerun_every):
+        password = 'load-test-password'
+        self.request('POST /api/auth/register', 'POST', '/api/auth/register', {
+            'username': self.username, 'email': f'{self.username}@school.test', 'password': password
+        })
+        status, _ = self.request('POST /api/auth/login', 'POST', '/api/auth/login', {
+            'username': self.username, 'password': password
+        })
+        if status != 200:
+            return
+
+        _, saved = self.request('POST /api/weightings', 'POST', '/api/weightings', {
+            'name': 'Load test', 'config': {}, 'is_default': True
+        })
+        weighting_config_id = (saved or {}).get('id')
+
+        for file_type, path in school_paths.items():
+            body, content_type = multipart_body('file', f'{file_type}.csv', Path(path).read_bytes())
+            self.request('POST /api/upload/<file_type>', 'POST', f'/api/upload/{file_type}',
+                         body=body, content_type=content_type)
+
+        for i in range(iterations):
+            if i % rerun_every == 0:
+                self.request('POST /api/analysis/run', 'POST', '/api/analysis/run',
+                             {'weighting_config_id': weighting_config_id})
+            self.request('GET /api/students', 'GET', f'/api/students?page={i % 5 + 1}&per_page=50')
+            self.request('GET /api/classes', 'GET', '/api/classes')
+            self.request('GET /api/timetable/grid', 'GET', '/api/timetable/grid')
+
+
+def print_report(rows, duration, users):
+    total = sum(row['requests'] for row in rows)
+    errors = sum(row['errors'] for row in rows)
+    print(f"\n{users} users, {total} requests in {duration:.1f}s "
+          f"({total / duration:.1f} req/s), {errors} errors\n")
+    header = f"{'endpoint':<32} {'reqs':>6} {'errors':>6} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['endpoint']:<32} {row['requests']:>6} {row['errors']:>6} {row['throughput_rps']:>7} "
+              f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10, help='concurrent simulated users')
+    parser.add_argument('--iterations', type=int, default=5, help='browse rounds per user')
+    parser.add_argument('--rerun-every', type=int, default=5, help='re-run the analysis every N rounds')
+    parser.add_argument('--students', type=int, default=1500, help='size of the synthetic school')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers (gunicorn_config.py uses 1)')
+    parser.add_argument('--threads', type=int, default=1, help='threads per worker (>1 uses gthread)')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='ta_load_test_') as workdir:
+        school_paths = write_school(os.path.join(workdir, 'school'), args.students)
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        server = start_gunicorn(workdir, port, args.workers, args.threads)
+        try:
+            wait_until_ready(base_url, server)
+            recorder = Recorder()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.users) as pool:
+                futures = [
+                    pool.submit(SimulatedUser(base_url, recorder, i).run, school_paths, args.iterations, args.rerun_every)
+                    for i in range(args.users)
+                ]
+                for future in futures:
+                    future.result()
+            duration = time.perf_counter() - start
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+
+    rows = recorder.report(duration)
+    print_report(rows, duration, args.users)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'users': args.users, 'iterations': args.iterations, 'students': args.students,
+                'workers': args.workers, 'threads': args.threads,
+                'duration_seconds': round(duration, 2), 'endpoints': rows
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
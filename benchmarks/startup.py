@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Cold start time of auth_app: import to first response
+
+Each run starts a fresh interpreter in a scratch directory, imports
+auth_app, sends GET /api/health through the test client and then the
+first analysis-side request (a login plus a students_sen upload), timing
+each step from interpreter start. Runs against a database initialised with
+`flask --app auth_app init-db` and against an empty one, where the first
+request has to bootstrap it.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 10 --json startup.json
+
+Also reports whether pandas and numpy were already imported when the
+health check answered; they should only load on the first upload.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'benchmarks'))
+
+from synthetic_school import write_school  # noqa: E402
+
+HEAVY_MODULES = ('pandas', 'numpy')
+STEPS = ('import', 'first_response', 'first_upload')
+
+# Runs in the child interpreter; prints one JSON line of timings
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import auth_app
+imported = time.perf_counter()
+client = auth_app.app.test_client()
+health = client.get('/api/health')
+responded = time.perf_counter()
+loaded_at_response = [name for name in {heavy!r} if name in sys.modules]
+client.post('/api/auth/login', json={{'username': 'admin', 'password': 'admin123'}})
+with open({upload!r}, 'rb') as f:
+    upload = client.post('/api/upload/students_sen', data={{'file': (f, 'students_sen.csv')}})
+uploaded = time.perf_counter()
+print(json.dumps({{
+    'status': [health.status_code, upload.status_code],
+    'import': imported - start,
+    'first_response': responded - start,
+    'first_upload': uploaded - start,
+    'heavy_loaded_at_response': loaded_at_response,
+}}))
+'''
+
+
+def run_once(workdir, env, upload_path):
+    probe = PROBE.format(heavy=HEAVY_MODULES, upload=upload_path)
+    completed = subprocess.run([sys.executable, '-c', probe], cwd=workdir, env=env,
+                               check=True, capture_output=True, text=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure(workdir, runs, initialised, upload_path):
+    """Timings of `runs` cold starts, each on a fresh database file"""
+    results = []
+    for i in range(runs):
+        env = dict(
+            os.environ,
+            PYTHONPATH=str(REPO_ROOT),
+            DATABASE_URL=f"sqlite:///{os.path.join(workdir, f'startup_{int(initialised)}_{i}.db')}",
+            METRICS_DIR=os.path.join(workdir, 'metrics'),
+            RESULT_SPOOL_FOLDER=os.path.join(workdir, 'result_spool'),
+            RESULT_COMPACTION_INTERVAL_HOURS='0',
+            FLASK_ENV='production'
+        )
+        if initialised:
+            subprocess.run([sys.executable, '-m', 'flask', '--app', 'auth_app', 'init-db'], cwd=workdir,
+                           env=env, check=True, stdout=subprocess.DEVNULL)
+        result = run_once(workdir, env, upload_path)
+        if result['status'] != [200, 200]:
+            raise RuntimeError(f"Unexpected responses {result['status']} (health, upload)")
+        results.append(result)
+    return results
+
+
+def summarise(label, results):
+    row = {'database': label, 'runs': len(results)}
+    for step in STEPS:
+        row[f'{step}_ms'] = round(statistics.median(result[step] for result in results) * 1000, 1)
+    row['heavy_loaded_at_response'] = sorted({name for result in results for name in result['heavy_loaded_at_response']})
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='cold starts per database state')
+    parser.add_argument('--students', type=int, default=300, help='size of the uploaded synthetic school')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='ta_startup_') as workdir:
+        upload_path = write_school(os.path.join(workdir, 'school'), args.students)['students_sen']
+        rows = [
+            summarise('initialised', measure(workdir, args.runs, True, upload_path)),
+            summarise('empty', measure(workdir, args.runs, False, upload_path)),
+        ]
+
+    header = f"{'database':<12} {'import ms':>10} {'response ms':>12} {'upload ms':>10}  heavy modules at response"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['database']:<12} {row['import_ms']:>10} {row['first_response_ms']:>12} "
+              f"{row['first_upload_ms']:>10}  {', '.join(row['heavy_loaded_at_response']) or 'none'}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'students': args.students, 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
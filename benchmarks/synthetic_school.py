@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Synthetic school data in the three upload formats
+
+Writes students_classes.csv, students_sen.csv and timetable.csv for a school
+of any size. The same seed always gives the same files, so memory budgets,
+load tests and equivalence checks compare like with like.
+
+    python benchmarks/synthetic_school.py 10000 /tmp/school_10k
+"""
+
+import argparse
+import csv
+import os
+import random
+
+YEARS = (7, 8, 9, 10, 11)
+SUBJECTS = ('Ma', 'En', 'Sc', 'Hi', 'Gg', 'Fr', 'Pe', 'Ar')
+TIME_SLOTS = ('08:40 - 09:00', '09:00 - 10:00', '10:00 - 11:00', '11:15 - 12:15', '13:00 - 14:00', '14:00 - 15:00')
+SEN_COLUMNS = [
+    'Name', 'Pupil Premium Recipient at any time this academic year?', 'Looked After (In Care) Status',
+    'SEN at any time this academic year?', 'SEN need(s)', 'EAL at any time this academic year?',
+    'Read. Comp. Standardised Score', 'Spelling Standardised Score', 'BOXALL',
+    'Neurodiversity and/or Sensory Impairment', 'Medical Information', 'Health Care Plan/Risk Assessment',
+    'Stage 1', 'Stage 2', 'Stage 3', 'Stage 4', 'Stage 5'
+]
+# Share of students with a SEN row; the rest score "No SEN data found"
+SEN_COVERAGE = 0.95
+
+
+def school_paths(directory):
+    return {name: os.path.join(directory, f'{name}.csv') for name in ('students_classes', 'students_sen', 'timetable')}
+
+
+def write_school(directory, students, seed=1):
+    """Write the three CSVs for a school of the given size; returns their paths"""
+    rnd = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = school_paths(directory)
+    names = [f'Student{i}, Pupil' for i in range(students)]
+    # About 150 students per form group letter, 16 classes per letter and year
+    forms = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'[:max(1, min(26, students // 150))]
+    sets = max(1, students // (150 * len(forms)))
+    classes_by_year = {
+        year: [f'{year}{form}/{subject}{k}ABC' for form in forms for subject in SUBJECTS for k in range(1, 2 * sets + 1)]
+        for year in YEARS
+    }
+
+    with open(paths['students_classes'], 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Name', 'Courses/classes'])
+        for i, name in enumerate(names):
+            year = YEARS[i % len(YEARS)]
+            classes = rnd.sample(classes_by_year[year], min(8, len(classes_by_year[year])))
+            parts = [f'Year {year}', 'Assembly'] + [f'Subj: Year {year}: {code}' for code in classes]
+            writer.writerow([name, ', '.join(parts)])
+
+    with open(paths['students_sen'], 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(SEN_COLUMNS)
+        for name in names[:int(students * SEN_COVERAGE)]:
+            sen = rnd.random() < 0.3
+            writer.writerow([
+                name,
+                rnd.choice(['Yes', 'No']),
+                rnd.choice(['', '', '', '', 'Yes', '.']),
+                'Yes' if sen else 'No',
+                rnd.choice(['', 'Autism', 'Autism, SEMH', 'SpLD, MLD, SEMH']) if sen else '',
+                rnd.choice(['Yes', 'No', 'No']),
+                rnd.choice(['', str(rnd.randint(60, 130))]),
+                rnd.choice(['', str(rnd.randint(60, 130))]),
+                rnd.choice(['', '.', 'Y']),
+                rnd.choice(['', '.', 'ASD']),
+                rnd.choice(['', '.', 'Asthma']),
+                rnd.choice(['', '.', 'Plan']),
+                *[rnd.choice(['', '.', 'x', '']) for _ in range(5)]
+            ])
+
+    with open(paths['timetable'], 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Day', 'Time Slot', 'Course/Class', 'Staff', 'Room', 'Suspended?'])
+        for year in YEARS:
+            for code in classes_by_year[year]:
+                for day in ('Monday', 'Wednesday'):
+                    slot = rnd.choice(TIME_SLOTS[1:]) if rnd.random() > 0.03 else TIME_SLOTS[0]
+                    writer.writerow([
+                        day, slot, f'Subj: Year {year}: {code}',
+                        f'Mr {rnd.randint(1, 60)}', f'R{rnd.randint(1, 40)}', rnd.choice(['', '', '', 'Yes'])
+                    ])
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('students', type=int)
+    parser.add_argument('directory')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    for name, path in write_school(args.directory, args.students, args.seed).items():
+        print(f'{name}: {path}')
+
+
+if __name__ == '__main__':
+    main()
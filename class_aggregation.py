@@ -0,0 +1,158 @@
+import numpy as np
+
+# strategy name -> fn(segments, params) returning one value per class
+CLASS_AGGREGATION_STRATEGIES = {}
+
+DEFAULT_CLASS_AGGREGATION = {
+    'strategy': 'size_weighted_average',
+    'top_n': 3,
+    'percentile': 90
+}
+
+
+def register_class_aggregation(name):
+    """Decorator adding a class aggregation strategy to the registry"""
+    def decorator(fn):
+        CLASS_AGGREGATION_STRATEGIES[name] = fn
+        return fn
+    return decorator
+
+
+class ClassSegments:
+    """Student scores laid out class by class for segment reductions
+
+    values keeps each class's members in enrolment order; sorted_values holds
+    the same scores sorted ascending within each class, built on first use
+    and shared by every order-based strategy in a pass. Scores may be one
+    vector or a student x config matrix (one column per weighting config),
+    giving one row of values per member and one result row per class.
+    """
+
+    def __init__(self, incidence, student_scores):
+        self.starts = incidence.offsets[:-1]
+        self.ends = incidence.offsets[1:]
+        self.sizes = np.diff(incidence.offsets)
+        self.values = student_scores[incidence.member_index]
+        self.counts = self.per_class(incidence.student_counts)
+        self._sorted_values = None
+        self._sorted_cumsum = None
+
+    def per_class(self, values):
+        """A per-class vector shaped to broadcast against per-class results"""
+        return values if self.values.ndim == 1 else values[:, None]
+
+    @property
+    def sorted_values(self):
+        if self._sorted_values is None:
+            segment_ids = np.repeat(np.arange(len(self.sizes)), self.sizes)
+            if self.values.ndim == 1:
+                self._sorted_values = self.values[np.lexsort((self.values, segment_ids))]
+            else:
+                # lexsort orders each config's row of the transposed matrix separately
+                by_config = self.values.T
+                order = np.lexsort((by_config, np.broadcast_to(segment_ids, by_config.shape)))
+                self._sorted_values = np.take_along_axis(by_config, order, axis=1).T
+        return self._sorted_values
+
+    @property
+    def sorted_cumsum(self):
+        if self._sorted_cumsum is None:
+            sorted_values = self.sorted_values
+            self._sorted_cumsum = np.concatenate(
+                [np.zeros((1,) + sorted_values.shape[1:]), np.cumsum(sorted_values, axis=0)]
+            )
+        return self._sorted_cumsum
+
+    def sums(self):
+        return np.add.reduceat(self.values, self.starts, axis=0)
+
+
+@register_class_aggregation('size_weighted_average')
+def size_weighted_average(segments, params):
+    """Average need scaled up for larger classes: avg * (1 + size / divisor)"""
+    return segments.sums() / segments.counts * (1 + segments.counts / params['size_factor_divisor'])
+
+
+@register_class_aggregation('average')
+def average(segments, params):
+    """Mean student need"""
+    return segments.sums() / segments.counts
+
+
+@register_class_aggregation('total')
+def total(segments, params):
+    """Sum of student needs"""
+    return segments.sums()
+
+
+@register_class_aggregation('top_n_sum')
+def top_n_sum(segments, params):
+    """Sum of the top_n highest student needs in the class"""
+    cumsum = segments.sorted_cumsum
+    first = np.maximum(segments.starts, segments.ends - params['top_n'])
+    return cumsum[segments.ends] - cumsum[first]
+
+
+@register_class_aggregation('percentile')
+def percentile(segments, params):
+    """The percentile-th student need, linearly interpolated like numpy.percentile"""
+    values = segments.sorted_values
+    position = params['percentile'] / 100 * (segments.sizes - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    low_values = values[segments.starts + lower]
+    return low_values + (values[segments.starts + upper] - low_values) * segments.per_class(position - lower)
+
+
+@register_class_aggregation('count_above_threshold')
+def count_above_threshold(segments, params):
+    """Number of students at or above the high_need_threshold class filter"""
+    return np.add.reduceat((segments.values >= params['high_need_threshold']).astype(float), segments.starts, axis=0)
+
+
+def validate_class_aggregation(settings):
+    """Check a class aggregation selection, returning it with numbers coerced
+
+    Accepts a strategy name or a dict of strategy, top_n and percentile.
+    """
+    if isinstance(settings, str):
+        settings = {'strategy': settings}
+    unknown = [key for key in settings if key not in DEFAULT_CLASS_AGGREGATION]
+    if unknown:
+        raise ValueError(f"Unknown class aggregation settings: {unknown}")
+
+    cleaned = dict(settings)
+    if 'strategy' in cleaned and cleaned['strategy'] not in CLASS_AGGREGATION_STRATEGIES:
+        raise ValueError(f"Unknown class aggregation '{cleaned['strategy']}'; "
+                         f"choose from {sorted(CLASS_AGGREGATION_STRATEGIES)}")
+    if 'top_n' in cleaned:
+        cleaned['top_n'] = int(cleaned['top_n'])
+        if cleaned['top_n'] < 1:
+            raise ValueError("top_n must be at least 1")
+    if 'percentile' in cleaned:
+        cleaned['percentile'] = float(cleaned['percentile'])
+        if not 0 <= cleaned['percentile'] <= 100:
+            raise ValueError("percentile must be between 0 and 100")
+    return cleaned
+
+
+def aggregate_classes(incidence, student_scores, strategies, params):
+    """Per-class values for several strategies from one shared segment layout
+
+    student_scores is a vector indexed by the incidence's member_index, or a
+    student x config matrix; params holds the class filters plus the
+    aggregation settings. Returns {strategy: array with one unrounded value
+    per incidence class}, with a column per config for a matrix.
+    """
+    unknown = [name for name in strategies if name not in CLASS_AGGREGATION_STRATEGIES]
+    if unknown:
+        raise ValueError(f"Unknown class aggregations: {unknown}")
+    student_scores = np.asarray(student_scores, dtype=float)
+    if not len(incidence):
+        return {name: np.zeros((0,) + student_scores.shape[1:]) for name in strategies}
+
+    segments = ClassSegments(incidence, student_scores)
+    return {
+        name: CLASS_AGGREGATION_STRATEGIES[name](segments, params)
+        for name in strategies
+    }
@@ -0,0 +1,264 @@
+from collections.abc import MutableMapping
+
+import numpy as np
+
+
+class StringPool:
+    """Dictionary encoding: each distinct string stored once and referred to by an int code"""
+    __slots__ = ('values', 'codes')
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def decode(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class StudentScores(MutableMapping):
+    """name -> {'score', 'factors', 'detail'} backed by arrays indexed by student id
+
+    Each name is interned to an id the first time it is stored; ids are never
+    reused, so deleting and re-adding a name moves it to the end exactly as a
+    dict would. Scores live in one float array with a flag recording which
+    were floats, so reading a record back gives the original int/float score.
+    Records are built on access; detail tuples are kept only for the students
+    that have one.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.scores = np.zeros(0)
+        self.score_is_float = np.zeros(0, dtype=bool)
+        self.factors = np.zeros(0, dtype=np.int64)
+        self.alive = np.zeros(0, dtype=bool)
+        self.details = {}
+
+    @classmethod
+    def from_arrays(cls, names, scores, score_is_float, factors, details):
+        """Build from aligned arrays; details maps positions to detail tuples"""
+        table = cls()
+        table.names = list(names)
+        table.ids = {name: i for i, name in enumerate(table.names)}
+        table.scores = np.asarray(scores, dtype=float).copy()
+        table.score_is_float = np.asarray(score_is_float, dtype=bool).copy()
+        table.factors = np.asarray(factors, dtype=np.int64).copy()
+        table.alive = np.ones(len(table.names), dtype=bool)
+        table.details = dict(details)
+        return table
+
+    def copy(self):
+        """An independent table, for changes that must not show through an earlier reference"""
+        table = StudentScores()
+        table.names = list(self.names)
+        table.ids = dict(self.ids)
+        table.scores = np.array(self.scores)
+        table.score_is_float = np.array(self.score_is_float)
+        table.factors = np.array(self.factors)
+        table.alive = np.array(self.alive)
+        table.details = dict(self.details)
+        return table
+
+    def score_of(self, student_id):
+        """The score for an id, as the int or float it was stored as"""
+        score = self.scores[student_id]
+        return float(score) if self.score_is_float[student_id] else int(score)
+
+    def record(self, student_id):
+        return {
+            'score': self.score_of(student_id),
+            'factors': int(self.factors[student_id]),
+            'detail': self.details.get(student_id)
+        }
+
+    def _append(self, name):
+        student_id = len(self.names)
+        if student_id == len(self.scores):
+            capacity = max(16, 2 * student_id)
+            self.scores = np.resize(self.scores, capacity)
+            self.score_is_float = np.resize(self.score_is_float, capacity)
+            self.factors = np.resize(self.factors, capacity)
+            self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+        self.names.append(name)
+        self.ids[name] = student_id
+        return student_id
+
+    def __getitem__(self, name):
+        return self.record(self.ids[name])
+
+    def __setitem__(self, name, record):
+        student_id = self.ids.get(name)
+        if student_id is None:
+            student_id = self._append(name)
+        self.scores[student_id] = record['score']
+        self.score_is_float[student_id] = isinstance(record['score'], float)
+        self.factors[student_id] = record['factors']
+        self.alive[student_id] = True
+        if record['detail'] is None:
+            self.details.pop(student_id, None)
+        else:
+            self.details[student_id] = record['detail']
+
+    def __delitem__(self, name):
+        student_id = self.ids.pop(name)
+        self.alive[student_id] = False
+        self.details.pop(student_id, None)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def live_ids(self):
+        """Ids of the stored students, in insertion order"""
+        return np.flatnonzero(self.alive[:len(self.names)])
+
+    def __iter__(self):
+        for student_id in self.live_ids():
+            yield self.names[student_id]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the score, flag and factor arrays"""
+        return self.scores.nbytes + self.score_is_float.nbytes + self.factors.nbytes + self.alive.nbytes
+
+
+class ClassAggregate:
+    """Filter-independent totals for one class, with members as student ids"""
+    __slots__ = ('table', 'member_ids', 'scores', 'total', 'max', 'sorted_scores')
+
+    def __init__(self, table, member_ids, scores, total, max_score, sorted_scores):
+        self.table = table
+        self.member_ids = member_ids
+        self.scores = scores
+        self.total = total
+        self.max = max_score
+        self.sorted_scores = sorted_scores
+
+    def __len__(self):
+        return len(self.member_ids)
+
+    @property
+    def nbytes(self):
+        return self.member_ids.nbytes + self.scores.nbytes + self.sorted_scores.nbytes
+
+    def member_names(self):
+        return [self.table.names[i] for i in self.member_ids]
+
+    def students(self):
+        """[{'name', 'score'}] in enrolment order, built on demand"""
+        return [{'name': self.table.names[i], 'score': self.table.score_of(i)} for i in self.member_ids]
+
+
+def class_segments(class_members):
+    """CSR layout of class_members: (codes, offsets, member_ids) for the non-empty classes"""
+    codes = [code for code, ids in class_members.items() if len(ids)]
+    counts = np.array([len(class_members[code]) for code in codes], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    member_ids = np.concatenate(
+        [np.asarray(class_members[code], dtype=np.int32) for code in codes]
+    ) if codes else np.zeros(0, dtype=np.int32)
+    return codes, offsets, member_ids
+
+
+def aggregates_from_segments(table, codes, offsets, member_ids, totals, maxima, has_float, sorted_scores):
+    """ClassAggregates from per-segment reductions computed by any backend
+
+    Classes with any float score fall back to Python's sum/max so they match
+    the sequential arithmetic exactly.
+    """
+    scores = table.scores[member_ids]
+    aggregates = {}
+    for c, code in enumerate(codes):
+        segment = slice(offsets[c], offsets[c + 1])
+        if has_float[c]:
+            typed = [table.score_of(i) for i in member_ids[segment]]
+            total, max_score = sum(typed), max(typed)
+        else:
+            total, max_score = int(totals[c]), int(maxima[c])
+        aggregates[code] = ClassAggregate(
+            table, member_ids[segment], scores[segment], total, max_score, sorted_scores[segment]
+        )
+    return aggregates
+
+
+def build_class_aggregates(table, class_members):
+    """Aggregates for every class with scored members, from one CSR layout
+
+    class_members maps class codes to ids into table. Totals and maxima come
+    from segment reductions.
+    """
+    codes, offsets, member_ids = class_segments(class_members)
+    if not codes:
+        return {}
+    starts = offsets[:-1]
+
+    scores = table.scores[member_ids]
+    has_float = np.logical_or.reduceat(table.score_is_float[member_ids], starts)
+    totals = np.add.reduceat(scores, starts)
+    maxima = np.maximum.reduceat(scores, starts)
+    segment_ids = np.repeat(np.arange(len(codes)), np.diff(offsets))
+    sorted_scores = scores[np.lexsort((scores, segment_ids))]
+    return aggregates_from_segments(table, codes, offsets, member_ids, totals, maxima, has_float, sorted_scores)
+
+
+class ClassSummary(MutableMapping):
+    """Ranked class result with dict-style access; 'students' is built from the aggregate"""
+    FIELDS = ('student_count', 'total_need_score', 'average_need_score', 'max_need_score',
+              'high_need_students', 'weighted_score')
+    __slots__ = FIELDS + ('aggregate',)
+
+    def __init__(self, aggregate, student_count, total_need_score, average_need_score,
+                 max_need_score, high_need_students, weighted_score):
+        self.aggregate = aggregate
+        self.student_count = student_count
+        self.total_need_score = total_need_score
+        self.average_need_score = average_need_score
+        self.max_need_score = max_need_score
+        self.high_need_students = high_need_students
+        self.weighted_score = weighted_score
+
+    def member_names(self):
+        return self.aggregate.member_names()
+
+    def replace(self, **fields):
+        """A copy with some fields changed, leaving this summary as it was"""
+        values = {field: getattr(self, field) for field in self.FIELDS}
+        values.update(fields)
+        return ClassSummary(self.aggregate, **values)
+
+    def __getitem__(self, key):
+        if key == 'students':
+            return self.aggregate.students()
+        if key in self.FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        raise TypeError("ClassSummary fields cannot be removed")
+
+    def __iter__(self):
+        return iter(self.FIELDS + ('students',))
+
+    def __len__(self):
+        return len(self.FIELDS) + 1
+
+    def __repr__(self):
+        return f"ClassSummary({dict(self)})"
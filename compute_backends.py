@@ -0,0 +1,209 @@
+import bisect
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from compact_results import (
+    StudentScores, ClassAggregate, class_segments, aggregates_from_segments, build_class_aggregates
+)
+from need_breakdown import SEN_NEEDS, LOW_READING, LOW_SPELLING, record_detail, factor_masks, float_factor_bits
+
+DEFAULT_COMPUTE_BACKEND = 'numpy'
+# Characters that make str.contains treat a class code as more than a literal
+_REGEX_METACHARACTERS = frozenset('.^$*+?{}[]\\|()')
+
+
+class PandasRowBackend:
+    """Reference path: each student scored from their own SEN row, classes summed in Python
+
+    Every other backend must give exactly the results of this one; it is the
+    row-by-row logic the analyzers started from.
+    """
+    name = 'pandas'
+
+    def score_students(self, analyzer):
+        """StudentScores for every student on the analyzer's roster"""
+        table = StudentScores()
+        for student in analyzer.roster():
+            table[student] = analyzer.score_student(student)
+        return table
+
+    def aggregate_classes(self, table, class_members):
+        """{class_code: ClassAggregate} for the classes with scored members"""
+        aggregates = {}
+        for class_code, ids in class_members.items():
+            if not len(ids):
+                continue
+            member_ids = np.asarray(ids, dtype=np.int32)
+            typed = [table.score_of(i) for i in member_ids]
+            scores = table.scores[member_ids]
+            aggregates[class_code] = ClassAggregate(table, member_ids, scores, sum(typed), max(typed), np.sort(scores))
+        return aggregates
+
+    def class_time_slots(self, timetable, class_codes):
+        """{class_code: time slots of the timetable rows whose Course/Class contains it}"""
+        slots = {}
+        for class_code in class_codes:
+            timetable_matches = timetable[timetable['Course/Class'].str.contains(class_code, na=False)]
+            slots[class_code] = [str(time_slot) for time_slot in timetable_matches['Time Slot']]
+        return slots
+
+
+class NumpyBackend(PandasRowBackend):
+    """Vectorised path: factor arrays scored in one pass, classes reduced over a CSR layout"""
+    name = 'numpy'
+
+    def _scores(self, features, weightings):
+        return features.scores(weightings)
+
+    def score_students(self, analyzer):
+        features = analyzer.get_student_features()
+        compiled_rules = analyzer.get_compiled_rules()
+        weightings = analyzer.weightings
+
+        # Scores and factor bitmasks for everyone at once; breakdown text is
+        # only rendered when asked for (get_breakdown)
+        scores = self._scores(features, weightings)
+        masks = factor_masks(features, weightings)
+        # Keep the row path's int scores unless a float weight contributed
+        is_float = (masks & float_factor_bits(weightings)) != 0
+        details = {}
+        quoted = set(np.flatnonzero(masks & (SEN_NEEDS | LOW_READING | LOW_SPELLING)).tolist())
+        if compiled_rules:
+            rule_rows = compiled_rules.rows_of(features.names)
+            quoted.update(np.flatnonzero(compiled_rules.has_hits(rule_rows)).tolist())
+        for i in quoted:
+            factors = int(masks[i])
+            hits = compiled_rules.hits_at(rule_rows[i]) if compiled_rules else ()
+            if any(isinstance(points, float) for points, _ in hits):
+                is_float[i] = True
+            details[i] = record_detail(
+                int(features.sen_need_count[i]) if factors & SEN_NEEDS else None,
+                features.reading_values[i] if factors & LOW_READING else None,
+                features.spelling_values[i] if factors & LOW_SPELLING else None,
+                [label for _, label in hits]
+            )
+        return StudentScores.from_arrays(features.names, scores, is_float, masks, details)
+
+    def aggregate_classes(self, table, class_members):
+        return build_class_aggregates(table, class_members)
+
+    def class_time_slots(self, timetable, class_codes):
+        """Literal class codes are found with str.find over the joined Course/Class column
+
+        Codes str.contains would read as a regex, and columns that are not
+        text, go through the row path so its matching rules still apply.
+        """
+        courses = timetable['Course/Class']
+        if not pd.api.types.is_object_dtype(courses):
+            return super().class_time_slots(timetable, class_codes)
+
+        literal = [
+            class_code for class_code in class_codes
+            if class_code and '\n' not in class_code and not _REGEX_METACHARACTERS.intersection(class_code)
+        ]
+        # Non-text cells never match, as with na=False
+        texts = [value if isinstance(value, str) else '' for value in courses]
+        starts = list(itertools.accumulate((len(text) + 1 for text in texts), initial=0))
+        joined = '\n'.join(texts)
+        time_slots = timetable['Time Slot'].tolist()
+
+        slots = {}
+        for class_code in literal:
+            matches = []
+            position = joined.find(class_code)
+            while position != -1:
+                row = bisect.bisect_right(starts, position) - 1
+                matches.append(str(time_slots[row]))
+                position = joined.find(class_code, starts[row + 1])
+            slots[class_code] = matches
+
+        others = [class_code for class_code in class_codes if class_code not in slots]
+        if others:
+            slots.update(super().class_time_slots(timetable, others))
+        return slots
+
+
+class PolarsBackend(NumpyBackend):
+    """Scores and class reductions as polars expressions over the extracted factor columns
+
+    Factors are still read from the pandas frames (their missing-value and
+    type rules are the reference), then handed to polars as numeric columns.
+    """
+    name = 'polars'
+
+    def __init__(self):
+        try:
+            import polars
+        except ImportError:
+            raise ValueError("The polars backend needs the polars package (pip install polars)") from None
+        self.pl = polars
+
+    def _scores(self, features, weightings):
+        pl = self.pl
+        w = weightings
+        # (column, weight) in the row path's order, so float sums round the same way
+        terms = [
+            (features.pupil_premium, w['pupil_premium']),
+            (features.looked_after, w['looked_after']),
+            (features.sen_need_count, w['sen_needs_multiplier']),
+            (features.eal, w['eal']),
+            (features.reading < w['reading_threshold'], w['reading_score']),
+            (features.spelling < w['spelling_threshold'], w['spelling_score']),
+            (features.boxall, w['boxall']),
+            *[(features.medical[:, i], w['medical_info']) for i in range(features.medical.shape[1])],
+            *[(features.stages[:, i], w['stage_support']) for i in range(features.stages.shape[1])],
+            *[(features.custom_points[:, i], 1) for i in range(features.custom_points.shape[1])]
+        ]
+        frame = pl.DataFrame({f'f{i}': np.asarray(column, dtype=float) for i, (column, _) in enumerate(terms)})
+        score = pl.lit(0.0)
+        for i, (_, weight) in enumerate(terms):
+            score = score + pl.col(f'f{i}') * weight
+        return frame.select(score.alias('score')).to_series().to_numpy()
+
+    def aggregate_classes(self, table, class_members):
+        pl = self.pl
+        codes, offsets, member_ids = class_segments(class_members)
+        if not codes:
+            return {}
+        members = pl.DataFrame({
+            'segment': np.repeat(np.arange(len(codes)), np.diff(offsets)),
+            'score': table.scores[member_ids],
+            'is_float': table.score_is_float[member_ids]
+        })
+        reduced = members.group_by('segment', maintain_order=True).agg(
+            pl.col('score').sum().alias('total'),
+            pl.col('score').max().alias('max'),
+            pl.col('is_float').any().alias('has_float')
+        )
+        sorted_scores = members.sort(['segment', 'score'])['score'].to_numpy()
+        return aggregates_from_segments(
+            table, codes, offsets, member_ids,
+            reduced['total'].to_numpy(), reduced['max'].to_numpy(), reduced['has_float'].to_numpy(), sorted_scores
+        )
+
+
+COMPUTE_BACKENDS = {
+    backend.name: backend for backend in (PandasRowBackend, NumpyBackend, PolarsBackend)
+}
+
+
+def get_compute_backend(name=None):
+    """A backend instance by name (default numpy); ValueError for unknown or unavailable ones"""
+    name = name or DEFAULT_COMPUTE_BACKEND
+    if name not in COMPUTE_BACKENDS:
+        raise ValueError(f"Unknown analysis backend '{name}'; choose from {list(COMPUTE_BACKENDS)}")
+    return COMPUTE_BACKENDS[name]()
+
+
+def available_backends():
+    """Names of the backends whose dependencies are installed"""
+    available = []
+    for name in COMPUTE_BACKENDS:
+        try:
+            get_compute_backend(name)
+        except ValueError:
+            continue
+        available.append(name)
+    return available
@@ -0,0 +1,63 @@
+import os
+from sqlalchemy import event, inspect
+
+# SQLite settings applied to every new connection. WAL lets readers carry on
+# while an analysis result is being written; NORMAL sync is safe under WAL.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -16000,  # negative means KiB, so 16MB
+    'temp_store': 'MEMORY',
+}
+
+
+def engine_options_for(database_url):
+    """SQLAlchemy engine options tuned for the configured database"""
+    if database_url.startswith('sqlite'):
+        # SQLAlchemy's default file pool is fine; tuning happens via pragmas
+        return {}
+
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        # Render closes idle connections, so recycle before that and ping on checkout
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+
+
+def apply_sqlite_pragmas(engine, pragmas=None):
+    """Run the SQLite pragmas on each connection the engine opens"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = pragmas or SQLITE_PRAGMAS
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def schema_is_current(engine, tables):
+    """True when every table exists with all of its model's columns and named indexes
+
+    One inspector pass, so it is cheap enough for each worker to run instead
+    of db.create_all() and the column and index upgrades.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in tables:
+        if table.name not in existing_tables:
+            return False
+        existing = {col['name'] for col in inspector.get_columns(table.name)}
+        if any(col.name not in existing for col in table.columns):
+            return False
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        if any(index.name not in existing_indexes for index in table.indexes):
+            return False
+    return True
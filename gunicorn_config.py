@@ -6,7 +6,9 @@ backlog = 2048
 
 # Worker processes
 workers = 1
-worker_class = "sync"
+# Analyses are published as immutable snapshots, so readers are safe on threaded workers
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+worker_class = "gthread" if threads > 1 else "sync"
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -26,4 +28,9 @@ proc_name = "ta_analyser"
 # Security
 limit_request_line = 4096
 limit_request_fields = 100
-limit_request_field_size = 8192
\ No newline at end of file
+limit_request_field_size = 8192
+
+def on_starting(server):
+    """Start each deployment with empty per-worker metrics files"""
+    from metrics import clear_metrics_dir
+    clear_metrics_dir(os.environ.get('METRICS_DIR', 'metrics'))
@@ -0,0 +1,256 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 512 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2)
+
+# Counters and histograms of exited workers, folded together by collect()
+RETIRED_FILE = 'retired.json'
+LOCK_FILE = '.lock'
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'ta_http_requests_total': ('counter', 'HTTP requests by route, method and status', None),
+    'ta_http_request_duration_seconds': ('histogram', 'HTTP request latency by route', LATENCY_BUCKETS),
+    'ta_analysis_stage_duration_seconds': ('histogram', 'Time spent in each analysis stage', LATENCY_BUCKETS),
+    'ta_stage_cache_total': ('counter', 'Analysis stages reused from cache (hit) or recomputed (miss)', None),
+    'ta_upload_bytes': ('histogram', 'Size of uploaded files by file type', SIZE_BUCKETS),
+    'ta_db_query_duration_seconds': ('histogram', 'Database query time by statement type', QUERY_BUCKETS),
+    'ta_active_analyzers': ('gauge', 'Analyzers held in memory', None),
+    'ta_analyzer_bytes': ('gauge', 'Estimated bytes held by in-memory analyzers', None),
+}
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_start(pid):
+    """Kernel start time of a process (field 22 of /proc/<pid>/stat), or None without /proc"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Fields after the parenthesised command name, which may itself contain spaces
+    return stat.rsplit(')', 1)[1].split()[19]
+
+
+def _process_alive(pid, token):
+    """Whether the process that wrote a snapshot is still running, not just its pid"""
+    start = _process_start(pid)
+    if start is not None:
+        return start == token
+    return _pid_alive(pid)
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _add_snapshot(counters, histograms, snapshot):
+    for key, value in snapshot['counters'].items():
+        counters[key] += value
+    for key, values in snapshot['histograms'].items():
+        merged = histograms.setdefault(key, [0] * len(values))
+        histograms[key] = [a + b for a, b in zip(merged, values)]
+
+
+def _write_json(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class MetricsRegistry:
+    """Counters, histograms and gauges for one process, shared through per-process files
+
+    Each gunicorn worker records into its own registry and writes a JSON
+    snapshot to directory/<pid>-<token>.json at most every write_interval
+    seconds (and on every scrape). The token is the process start time, so
+    a recycled worker that is given a dead worker's pid writes a new file
+    instead of overwriting the old totals. collect() merges every worker's
+    file: counters and histograms are summed, while gauges only count live
+    workers. Files of exited workers are folded into RETIRED_FILE, so totals
+    never go backwards and the directory does not grow with every restart.
+    """
+
+    def __init__(self, directory, write_interval=5.0):
+        self.directory = directory
+        self.write_interval = write_interval
+        self.gauge_callback = None
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._last_write = 0.0
+        self._snapshot_pid = None
+        self._snapshot_path = None
+        os.makedirs(directory, exist_ok=True)
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self._counters[_key(name, labels)] += amount
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        with self._lock:
+            key = _key(name, labels)
+            # Per-bucket counts (last is +Inf), then the running sum
+            histogram = self._histograms.setdefault(key, [0] * (len(buckets) + 1) + [0.0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(buckets)] += 1
+            histogram[-1] += value
+
+    def _gauges(self):
+        if self.gauge_callback is None:
+            return {}
+        return {_key(name, labels): value for name, labels, value in self.gauge_callback()}
+
+    def _path(self):
+        """This process's snapshot file, named afresh in a process forked after the registry was made"""
+        pid = os.getpid()
+        if self._snapshot_pid != pid:
+            token = _process_start(pid) or uuid.uuid4().hex
+            self._snapshot_path = os.path.join(self.directory, f'{pid}-{token}.json')
+            self._snapshot_pid = pid
+        return self._snapshot_path
+
+    def write(self, force=False):
+        """Write this process's snapshot if write_interval has passed (or force)"""
+        now = time.monotonic()
+        if not force and now - self._last_write < self.write_interval:
+            return
+        self._last_write = now
+        gauges = self._gauges()
+        with self._lock:
+            snapshot = {
+                'counters': dict(self._counters),
+                'histograms': {key: list(values) for key, values in self._histograms.items()},
+                'gauges': gauges
+            }
+        _write_json(self._path(), snapshot)
+
+    def _merge_snapshots(self):
+        """(counters, histograms, gauges) over every worker, folding exited workers into RETIRED_FILE
+
+        Callers hold the directory lock, so concurrent scrapes never fold the
+        same file twice.
+        """
+        retired_path = os.path.join(self.directory, RETIRED_FILE)
+        retired = _read_snapshot(retired_path) or {'counters': {}, 'histograms': {}, 'merged': []}
+        # Files a scrape folded in but did not get to delete
+        for name in retired['merged']:
+            if os.path.exists(os.path.join(self.directory, name)):
+                os.remove(os.path.join(self.directory, name))
+
+        retired_counters = defaultdict(float)
+        retired_histograms = {}
+        _add_snapshot(retired_counters, retired_histograms, retired)
+        live_counters = defaultdict(float)
+        live_histograms = {}
+        gauges = defaultdict(float)
+        exited = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            name = os.path.basename(path)
+            if name == RETIRED_FILE:
+                continue
+            snapshot = _read_snapshot(path)
+            if snapshot is None:
+                continue
+            pid, _, token = name[:-len('.json')].partition('-')
+            if _process_alive(int(pid), token):
+                _add_snapshot(live_counters, live_histograms, snapshot)
+                for key, value in snapshot['gauges'].items():
+                    gauges[key] += value
+            else:
+                _add_snapshot(retired_counters, retired_histograms, snapshot)
+                exited.append(name)
+
+        if exited:
+            _write_json(retired_path, {
+                'counters': retired_counters, 'histograms': retired_histograms, 'merged': exited
+            })
+            for name in exited:
+                os.remove(os.path.join(self.directory, name))
+
+        counters = retired_counters
+        histograms = retired_histograms
+        _add_snapshot(counters, histograms, {'counters': live_counters, 'histograms': live_histograms})
+        return counters, histograms, gauges
+
+    def collect(self):
+        """Prometheus text exposition of every worker's metrics"""
+        self.write(force=True)
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                counters, histograms, gauges = self._merge_snapshots()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        series = defaultdict(list)
+        for source in (counters, gauges, histograms):
+            for key, value in source.items():
+                name, labels = json.loads(key)
+                series[name].append(([tuple(pair) for pair in labels], value))
+
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(series.get(name, [])):
+                if kind != 'histogram':
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], value[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _format_value(bound)
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(value[-1])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def clear_metrics_dir(directory):
+    """Remove every worker snapshot; call once when the server (not a worker) starts"""
+    for path in glob.glob(os.path.join(directory, '*.json*')):
+        os.remove(path)
@@ -0,0 +1,137 @@
+import numpy as np
+
+from need_features import MEDICAL_COLS, STAGE_COLS
+
+# One bit per built-in factor a student can meet
+PUPIL_PREMIUM = 1 << 0
+LOOKED_AFTER = 1 << 1
+SEN_NEEDS = 1 << 2
+EAL = 1 << 3
+LOW_READING = 1 << 4
+LOW_SPELLING = 1 << 5
+BOXALL = 1 << 6
+MEDICAL_BITS = [1 << (7 + i) for i in range(len(MEDICAL_COLS))]
+STAGE_BITS = [1 << (10 + i) for i in range(len(STAGE_COLS))]
+NO_SEN_DATA = 1 << 15
+
+# Bit -> stable name, for clients that decode factors themselves
+FACTOR_NAMES = {
+    PUPIL_PREMIUM: 'pupil_premium',
+    LOOKED_AFTER: 'looked_after',
+    SEN_NEEDS: 'sen_needs',
+    EAL: 'eal',
+    LOW_READING: 'low_reading',
+    LOW_SPELLING: 'low_spelling',
+    BOXALL: 'boxall',
+    **{bit: f'medical_{i}' for i, bit in enumerate(MEDICAL_BITS, 1)},
+    **{bit: f'stage_{i}' for i, bit in enumerate(STAGE_BITS, 1)},
+    NO_SEN_DATA: 'no_sen_data'
+}
+
+# Factor bit -> the weighting it adds
+FACTOR_WEIGHTS = {
+    PUPIL_PREMIUM: 'pupil_premium',
+    LOOKED_AFTER: 'looked_after',
+    SEN_NEEDS: 'sen_needs_multiplier',
+    EAL: 'eal',
+    LOW_READING: 'reading_score',
+    LOW_SPELLING: 'spelling_score',
+    BOXALL: 'boxall',
+    **{bit: 'medical_info' for bit in MEDICAL_BITS},
+    **{bit: 'stage_support' for bit in STAGE_BITS}
+}
+
+
+def record_detail(sen_need_count=None, reading=None, spelling=None, custom_labels=()):
+    """The values a breakdown quotes, or None for the common case of nothing to quote"""
+    if sen_need_count is None and reading is None and spelling is None and not custom_labels:
+        return None
+    return (sen_need_count, reading, spelling, tuple(custom_labels))
+
+
+def student_record(score, factors, sen_need_count=None, reading=None, spelling=None, custom_labels=()):
+    """Compact per-student result: score, factor bitmask and the few values breakdowns quote"""
+    return {
+        'score': score,
+        'factors': factors,
+        'detail': record_detail(sen_need_count, reading, spelling, custom_labels)
+    }
+
+
+def factor_masks(features, weightings):
+    """Factor bitmask for every student in a StudentFeatures, built column by column"""
+    masks = np.zeros(len(features), dtype=np.int64)
+    masks |= features.pupil_premium * PUPIL_PREMIUM
+    masks |= features.looked_after * LOOKED_AFTER
+    masks |= features.sen_listed * SEN_NEEDS
+    masks |= features.eal * EAL
+    masks |= (features.reading < weightings['reading_threshold']) * LOW_READING
+    masks |= (features.spelling < weightings['spelling_threshold']) * LOW_SPELLING
+    masks |= features.boxall * BOXALL
+    for i, bit in enumerate(MEDICAL_BITS):
+        masks |= features.medical[:, i] * bit
+    for i, bit in enumerate(STAGE_BITS):
+        masks |= features.stages[:, i] * bit
+    masks[~features.has_sen_row] = NO_SEN_DATA
+    return masks
+
+
+def float_factor_bits(weightings):
+    """Factor bits whose weighting is a float, so meeting one makes the score a float"""
+    bits = 0
+    for bit, key in FACTOR_WEIGHTS.items():
+        if isinstance(weightings[key], float):
+            bits |= bit
+    return bits
+
+
+def render_breakdown(record, weightings):
+    """The '; ' separated breakdown text calculate_student_need_score has always produced"""
+    factors = record['factors']
+    if factors & NO_SEN_DATA:
+        return "No SEN data found"
+
+    sen_need_count, reading, spelling, custom_labels = record['detail'] or (None, None, None, ())
+    w = weightings
+    breakdown = []
+    if factors & PUPIL_PREMIUM:
+        breakdown.append(f"Pupil Premium (+{w['pupil_premium']})")
+    if factors & LOOKED_AFTER:
+        breakdown.append(f"Looked After/In Care (+{w['looked_after']})")
+    if factors & SEN_NEEDS:
+        breakdown.append(f"SEN needs ({sen_need_count} types, +{sen_need_count * w['sen_needs_multiplier']})")
+    if factors & EAL:
+        breakdown.append(f"EAL (+{w['eal']})")
+    if factors & LOW_READING:
+        breakdown.append(f"Low reading comp ({reading}, +{w['reading_score']})")
+    if factors & LOW_SPELLING:
+        breakdown.append(f"Low spelling ({spelling}, +{w['spelling_score']})")
+    if factors & BOXALL:
+        breakdown.append(f"BOXALL assessment (+{w['boxall']})")
+    for bit, col in zip(MEDICAL_BITS, MEDICAL_COLS):
+        if factors & bit:
+            breakdown.append(f"{col.split('/')[0]} (+{w['medical_info']})")
+    for i, bit in enumerate(STAGE_BITS, 1):
+        if factors & bit:
+            breakdown.append(f"Stage {i} support (+{w['stage_support']})")
+    breakdown.extend(custom_labels)
+
+    return "; ".join(breakdown) if breakdown else "No specific needs identified"
+
+
+def factor_summary(record):
+    """Structured form of a record for clients that skip the breakdown text
+
+    factors is the raw bitmask; FACTOR_NAMES gives the meaning of each bit.
+    """
+    sen_need_count, reading, spelling, custom_labels = record['detail'] or (None, None, None, ())
+    summary = {'factors': record['factors']}
+    if sen_need_count is not None:
+        summary['sen_need_count'] = sen_need_count
+    if reading is not None:
+        summary['reading_score'] = float(reading)
+    if spelling is not None:
+        summary['spelling_score'] = float(spelling)
+    if custom_labels:
+        summary['custom_factors'] = list(custom_labels)
+    return summary
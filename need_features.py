@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+
+from analysis_settings import CLASS_FILTER_DEFAULTS
+from class_aggregation import DEFAULT_CLASS_AGGREGATION, aggregate_classes
+from compact_results import class_segments
+
+PUPIL_PREMIUM_COL = 'Pupil Premium Recipient at any time this academic year?'
+LOOKED_AFTER_COL = 'Looked After (In Care) Status'
+SEN_COL = 'SEN at any time this academic year?'
+SEN_NEEDS_COL = 'SEN need(s)'
+EAL_COL = 'EAL at any time this academic year?'
+READING_COL = 'Read. Comp. Standardised Score'
+SPELLING_COL = 'Spelling Standardised Score'
+BOXALL_COL = 'BOXALL'
+MEDICAL_COLS = ['Neurodiversity and/or Sensory Impairment', 'Medical Information', 'Health Care Plan/Risk Assessment']
+STAGE_COLS = ['Stage 1', 'Stage 2', 'Stage 3', 'Stage 4', 'Stage 5']
+
+# Weights multiplied by a per-student count, in factor_counts() column order
+COUNT_WEIGHT_KEYS = ['pupil_premium', 'looked_after', 'sen_needs_multiplier', 'eal',
+                     'boxall', 'medical_info', 'stage_support']
+# Every points weighting: the count weights followed by the low-score points
+POINT_KEYS = COUNT_WEIGHT_KEYS + ['reading_score', 'spelling_score']
+
+# Matches each empty entry in a comma separated list, e.g. the gap in "A,,B"
+_BLANK_LIST_ENTRY = r'(?:^|,)\s*(?=,|$)'
+
+
+def _is_filled(values):
+    """Vector form of: not pd.isna(v) and str(v).strip() not in ['', '.']"""
+    return values.notna() & ~values.astype(str).str.strip().isin(['', '.'])
+
+
+def _standardised_scores(values):
+    """Scores the row path treats as numbers, NaN elsewhere
+
+    The row path checks isinstance(value, (int, float)) on values taken from
+    a mixed-type row, which holds only for float columns (numpy.float64) or
+    genuine Python numbers in object columns, never for int64 columns.
+    """
+    if pd.api.types.is_float_dtype(values):
+        return values.to_numpy(dtype=float)
+    if pd.api.types.is_object_dtype(values):
+        return values.map(lambda v: float(v) if isinstance(v, (int, float)) else np.nan).to_numpy(dtype=float)
+    return np.full(len(values), np.nan)
+
+
+def _sen_need_counts(values):
+    """Number of non-blank comma separated needs, counting missing values as 'nan'"""
+    text = values.astype(str)
+    return (text.str.count(',') + 1 - text.str.count(_BLANK_LIST_ENTRY)).to_numpy(dtype=np.int64)
+
+
+class StudentFeatures:
+    """Per-student need factors extracted once from the SEN frame
+
+    Each array is aligned with names. Students with no SEN row have every
+    factor at zero. Weightings are applied afterwards, so one set of features
+    can be rescored under any number of weighting configurations.
+    custom_points is an optional students x rules matrix of points from
+    school-defined scoring rules, which do not depend on the weightings.
+    """
+
+    def __init__(self, students_sen, names, custom_points=None):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+        # Only each student's first SEN row counts, as in the row path
+        rows = students_sen.drop_duplicates('Name', keep='first').set_index('Name')
+        positions = rows.index.get_indexer(self.names)
+        self.has_sen_row = positions >= 0
+
+        def align(values, fill):
+            values = np.asarray(values)
+            aligned = np.full((len(self.names),) + values.shape[1:], fill, dtype=values.dtype)
+            aligned[self.has_sen_row] = values[positions[self.has_sen_row]]
+            return aligned
+
+        looked_after = rows[LOOKED_AFTER_COL]
+        has_sen = (rows[SEN_COL] == 'Yes').to_numpy()
+
+        self.pupil_premium = align(rows[PUPIL_PREMIUM_COL] == 'Yes', False)
+        self.looked_after = align(looked_after.notna() & (looked_after != ''), False)
+        self.sen_need_count = align(np.where(has_sen, _sen_need_counts(rows[SEN_NEEDS_COL]), 0), 0)
+        # The row path lists SEN needs whenever str(value) is non-empty, even at zero needs
+        self.sen_listed = align(has_sen & (rows[SEN_NEEDS_COL].astype(str) != '').to_numpy(), False)
+        self.eal = align(rows[EAL_COL] == 'Yes', False)
+        self.reading = align(_standardised_scores(rows[READING_COL]), np.nan)
+        self.spelling = align(_standardised_scores(rows[SPELLING_COL]), np.nan)
+        # Original cell values, quoted as-is in breakdowns
+        self.reading_values = align(rows[READING_COL].to_numpy(dtype=object), None)
+        self.spelling_values = align(rows[SPELLING_COL].to_numpy(dtype=object), None)
+        self.boxall = align(_is_filled(rows[BOXALL_COL]), False)
+        self.medical = align(np.column_stack([_is_filled(rows[col]) for col in MEDICAL_COLS]), False)
+        self.stages = align(np.column_stack([_is_filled(rows[col]) for col in STAGE_COLS]), False)
+        self.custom_points = custom_points if custom_points is not None else np.zeros((len(self.names), 0))
+
+    def __len__(self):
+        return len(self.names)
+
+    def factor_counts(self):
+        """Student x factor matrix of counts for the weight-only factors"""
+        return np.column_stack([
+            self.pupil_premium, self.looked_after, self.sen_need_count, self.eal,
+            self.boxall, self.medical.sum(axis=1), self.stages.sum(axis=1)
+        ]).astype(float)
+
+    def scores(self, weightings):
+        """Need scores under one weighting config, added in the row path's order"""
+        w = weightings
+        score = np.zeros(len(self.names))
+        score = score + self.pupil_premium * w['pupil_premium']
+        score = score + self.looked_after * w['looked_after']
+        score = score + self.sen_need_count * w['sen_needs_multiplier']
+        score = score + self.eal * w['eal']
+        score = score + (self.reading < w['reading_threshold']) * w['reading_score']
+        score = score + (self.spelling < w['spelling_threshold']) * w['spelling_score']
+        score = score + self.boxall * w['boxall']
+        for i in range(self.medical.shape[1]):
+            score = score + self.medical[:, i] * w['medical_info']
+        for i in range(self.stages.shape[1]):
+            score = score + self.stages[:, i] * w['stage_support']
+        for i in range(self.custom_points.shape[1]):
+            score = score + self.custom_points[:, i]
+        return score
+
+    def score_matrix(self, weightings_list):
+        """Student x config scores for many weighting configs in one batched product"""
+        return self.score_points(*weight_arrays(weightings_list))
+
+    def score_points(self, points, reading_thresholds, spelling_thresholds):
+        """Student x config scores from a config x POINT_KEYS matrix and threshold vectors"""
+        count_points = len(COUNT_WEIGHT_KEYS)
+        scores = self.factor_counts() @ points[:, :count_points].T
+        scores += (self.reading[:, None] < reading_thresholds[None, :]) * points[None, :, count_points]
+        scores += (self.spelling[:, None] < spelling_thresholds[None, :]) * points[None, :, count_points + 1]
+        for i in range(self.custom_points.shape[1]):
+            scores += self.custom_points[:, i:i + 1]
+        return scores
+
+
+def weight_arrays(weightings_list):
+    """Weighting dicts as (points matrix, reading thresholds, spelling thresholds)"""
+    points = np.array([[w[key] for key in POINT_KEYS] for w in weightings_list], dtype=float)
+    reading_thresholds = np.array([w['reading_threshold'] for w in weightings_list], dtype=float)
+    spelling_thresholds = np.array([w['spelling_threshold'] for w in weightings_list], dtype=float)
+    return points, reading_thresholds, spelling_thresholds
+
+
+class ClassIncidence:
+    """Class membership as flat index arrays: members of class c are
+    member_index[offsets[c]:offsets[c + 1]], indexes into a student score vector
+
+    params holds the class filters and class aggregation settings;
+    weighted_scores ranks classes with them exactly as
+    calculate_class_need_levels does.
+    """
+
+    def __init__(self, class_codes, offsets, member_index, params=None):
+        self.class_codes = list(class_codes)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.member_index = np.asarray(member_index, dtype=np.int64)
+        self.student_counts = np.diff(self.offsets).astype(float)
+        self.params = {**CLASS_FILTER_DEFAULTS, **DEFAULT_CLASS_AGGREGATION, **(params or {})}
+
+    @classmethod
+    def from_member_ids(cls, class_member_ids, params=None):
+        """From {class_code: array of student ids}, concatenated in one pass"""
+        codes, offsets, member_ids = class_segments(class_member_ids)
+        return cls(codes, offsets, member_ids, params)
+
+    def __len__(self):
+        return len(self.class_codes)
+
+    def sums(self, student_scores):
+        """Per-class total of a student score vector or student x config matrix"""
+        if not len(self.class_codes):
+            return np.zeros((0,) + student_scores.shape[1:])
+        return np.add.reduceat(student_scores[self.member_index], self.offsets[:-1], axis=0)
+
+    def weighted_scores(self, student_scores):
+        """Unrounded class priority for a score vector or student x config matrix
+
+        Uses the class aggregation strategy in params, through the same
+        registry as calculate_class_need_levels.
+        """
+        strategy = self.params['strategy']
+        return aggregate_classes(self, student_scores, [strategy], self.params)[strategy]
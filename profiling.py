@@ -0,0 +1,176 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+PROFILE_MODES = ('deterministic', 'sampling')
+# Files each mode stores next to its <id>.json metadata
+PROFILE_FILES = {
+    'deterministic': ('tree', 'pstats'),
+    'sampling': ('tree', 'collapsed')
+}
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+
+
+class SamplingProfiler:
+    """Samples one thread's stack from a background thread every interval seconds
+
+    Stacks are counted root first, ready to write as collapsed stacks
+    ("a;b;c 12" lines) for flamegraph.pl or speedscope.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._target = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def call_tree(self, min_fraction=0.005):
+        """Indented call tree with sample counts, hiding nodes under min_fraction of samples"""
+        tree = {}
+        for stack, count in self.stacks.items():
+            node = tree
+            for label in stack:
+                entry = node.setdefault(label, [0, {}])
+                entry[0] += count
+                node = entry[1]
+
+        total = sum(self.stacks.values())
+        lines = [f"{total} samples every {self.interval * 1000:g} ms"]
+
+        def walk(node, depth):
+            for label, (count, children) in sorted(node.items(), key=lambda item: -item[1][0]):
+                if total and count / total < min_fraction:
+                    continue
+                lines.append(f"{'  ' * depth}{count / total:6.1%} {count:6d}  {label}")
+                walk(children, depth + 1)
+
+        walk(tree, 0)
+        return '\n'.join(lines) + '\n'
+
+
+class RequestProfile:
+    """Profiles the current thread between start() and save()"""
+
+    def __init__(self, mode, interval=DEFAULT_SAMPLE_INTERVAL):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Profile mode must be one of {list(PROFILE_MODES)}")
+        self.mode = mode
+        self.id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.profiler = cProfile.Profile() if mode == 'deterministic' else SamplingProfiler(interval)
+        self.started = None
+        self.duration = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.mode == 'deterministic':
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+
+    def stop(self):
+        if self.mode == 'deterministic':
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+        self.duration = time.perf_counter() - self.started
+
+    def save(self, folder, **metadata):
+        """Write <id>.json plus the mode's files (see PROFILE_FILES); returns the metadata"""
+        os.makedirs(folder, exist_ok=True)
+        base = os.path.join(folder, self.id)
+        if self.mode == 'deterministic':
+            self.profiler.dump_stats(f'{base}.pstats')
+            text = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=text).sort_stats('cumulative')
+            stats.print_stats(60)
+            stats.print_callees(30)
+            tree = text.getvalue()
+        else:
+            with open(f'{base}.collapsed', 'w') as f:
+                f.write(self.profiler.collapsed())
+            tree = self.profiler.call_tree()
+        with open(f'{base}.tree', 'w') as f:
+            f.write(tree)
+
+        info = {
+            'id': self.id,
+            'mode': self.mode,
+            'duration_seconds': round(self.duration, 4),
+            'created_at': datetime.utcnow().isoformat(),
+            'files': list(PROFILE_FILES[self.mode]),
+            **metadata
+        }
+        with open(f'{base}.json', 'w') as f:
+            json.dump(info, f)
+        return info
+
+
+def list_profiles(folder):
+    """Stored profile metadata, newest first"""
+    profiles = []
+    if not os.path.isdir(folder):
+        return profiles
+    for name in os.listdir(folder):
+        if name.endswith('.json'):
+            try:
+                with open(os.path.join(folder, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return sorted(profiles, key=lambda info: info['id'], reverse=True)
+
+
+def prune_profiles(folder, keep):
+    """Delete all but the newest keep profiles"""
+    for info in list_profiles(folder)[keep:]:
+        for ext in ('json',) + PROFILE_FILES[info['mode']]:
+            path = os.path.join(folder, f"{info['id']}.{ext}")
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def profile_path(folder, profile_id, kind):
+    """Path of one stored profile file, or None for an unknown id or kind"""
+    if not PROFILE_ID_PATTERN.match(profile_id) or kind not in ('tree', 'pstats', 'collapsed'):
+        return None
+    path = os.path.join(folder, f'{profile_id}.{kind}')
+    return path if os.path.exists(path) else None
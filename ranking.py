@@ -0,0 +1,79 @@
+import numpy as np
+
+DEFAULT_TOP_K = 50
+
+
+def top_positions(values, k):
+    """Indexes of the k largest values, best first, ties in index order
+
+    np.argpartition finds the k-th largest value without sorting the rest;
+    only the values above it, plus the first ties at it, are then sorted.
+    This gives exactly np.argsort(-values, kind='stable')[:k]. k of None
+    ranks everything.
+    """
+    if k is None or k >= len(values):
+        return np.argsort(-values, kind='stable')
+    threshold = values[np.argpartition(-values, k - 1)[k - 1]]
+    above = np.flatnonzero(values > threshold)
+    ties = np.flatnonzero(values == threshold)[:k - len(above)]
+    candidates = np.sort(np.concatenate([above, ties]))
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+
+def top_k(scores, key, k):
+    """The k highest (name, data) pairs of a dict, best first, ties in dict order
+
+    Returns exactly sorted(..., reverse=True)[:k]. k of None ranks everything.
+    """
+    items = list(scores.items())
+    values = np.fromiter((key(data) for _, data in items), dtype=float, count=len(items))
+    return [items[i] for i in top_positions(values, k)]
+
+
+def top_k_students(student_scores, k):
+    """The k highest (name, record) pairs of a StudentScores table, ranked on its score array
+
+    Same order as top_k, but only the k returned records are built.
+    """
+    ids = student_scores.live_ids()
+    ranked = ids[top_positions(student_scores.scores[ids], k)]
+    return [(student_scores.names[i], student_scores.record(i)) for i in ranked]
+
+
+def parse_top_k(value, default=DEFAULT_TOP_K):
+    """K from a request argument: a positive integer, or 'all' for no limit"""
+    if value is None or value == '':
+        return default
+    if str(value).lower() == 'all':
+        return None
+    k = int(value)
+    if k < 1:
+        raise ValueError('Result limits must be a positive integer or "all"')
+    return k
+
+
+def score_summary(student_scores, class_scores):
+    """Need band counts and averages over every student and class
+
+    Works on the StudentScores arrays directly, one vectorised mask per
+    band, with the same inclusive bounds as the original list
+    comprehensions (so a fractional score between bands, e.g. 3.5, is in
+    none of them).
+    """
+    ids = student_scores.live_ids()
+    scores = student_scores.scores[ids]
+    class_weighted = np.fromiter((data['weighted_score'] for data in class_scores.values()),
+                                 dtype=float, count=len(class_scores))
+
+    return {
+        'total_students': len(ids),
+        'no_needs': int(np.count_nonzero(scores == 0)),
+        'low_needs': int(np.count_nonzero((scores >= 1) & (scores <= 3))),
+        'medium_needs': int(np.count_nonzero((scores >= 4) & (scores <= 7))),
+        'high_needs': int(np.count_nonzero(scores >= 8)),
+        'average_score': round(np.mean(scores), 2),
+        # score_of keeps the max's original int/float type
+        'max_score': student_scores.score_of(ids[int(np.argmax(scores))]),
+        'total_classes': len(class_scores),
+        'average_class_score': round(np.mean(class_weighted), 2)
+    }
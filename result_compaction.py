@@ -0,0 +1,186 @@
+import fcntl
+import os
+import threading
+import time
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy import text
+
+DELETE_BATCH_SIZE = 500
+LEGACY_BATCH_SIZE = 50
+# Wait before retrying a scheduled compaction that failed
+RETRY_SECONDS = 300
+
+# Report from the most recent compaction run in this process
+last_report = None
+
+
+def select_expired_results(rows, keep_last=10, keep_monthly=12):
+    """Pick saved results that fall outside the retention policy
+
+    rows must be (id, user_id, weighting_config_id, created_at) tuples ordered
+    by user, config and newest first. Within each user/config history the
+    newest keep_last results are kept, plus the newest result of each of the
+    keep_monthly most recent calendar months (None keeps every month).
+    """
+    expired = []
+    for _, history in groupby(rows, key=lambda row: (row[1], row[2])):
+        months_seen = set()
+        for position, (result_id, _, _, created_at) in enumerate(history):
+            month = (created_at.year, created_at.month)
+            is_monthly_snapshot = month not in months_seen
+            months_seen.add(month)
+
+            if position < keep_last:
+                continue
+            if is_monthly_snapshot and (keep_monthly is None or len(months_seen) <= keep_monthly):
+                continue
+            expired.append(result_id)
+    return expired
+
+
+def _compact_legacy_rows(db, model):
+    """Rewrite rows still holding an uncompressed result_json blob
+
+    Pages by id, so a row that cannot be rewritten is never selected twice.
+    """
+    compacted = 0
+    last_id = 0
+    while True:
+        batch = model.query.filter(
+            model.result_json != '', model.id > last_id
+        ).order_by(model.id).limit(LEGACY_BATCH_SIZE).all()
+        if not batch:
+            return compacted
+        for row in batch:
+            # Fills in missing sections; a row that already has all of them
+            # only needs its stale legacy blob cleared
+            row.get_results()
+            row.result_json = ''
+        db.session.commit()
+        compacted += len(batch)
+        last_id = batch[-1].id
+
+
+def _reclaim_space(engine, table_name):
+    """Return freed pages to the database after a large delete"""
+    dialect = engine.dialect.name
+    if dialect == 'sqlite':
+        statement = 'VACUUM'
+    elif dialect == 'postgresql':
+        statement = f'VACUUM ANALYZE {table_name}'
+    else:
+        return False
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text(statement))
+    return True
+
+
+def compact_analysis_history(db, model, keep_last=10, keep_monthly=12, vacuum=True):
+    """Apply the retention policy to saved analysis results and reclaim space"""
+    global last_report
+    started = time.perf_counter()
+    started_at = datetime.utcnow()
+
+    rows = db.session.query(
+        model.id, model.user_id, model.weighting_config_id, model.created_at
+    ).order_by(
+        model.user_id, model.weighting_config_id, model.created_at.desc(), model.id.desc()
+    ).all()
+
+    expired = select_expired_results(rows, keep_last, keep_monthly)
+    for i in range(0, len(expired), DELETE_BATCH_SIZE):
+        batch = expired[i:i + DELETE_BATCH_SIZE]
+        model.query.filter(model.id.in_(batch)).delete(synchronize_session=False)
+        db.session.commit()
+
+    legacy_compacted = _compact_legacy_rows(db, model)
+
+    vacuumed = False
+    if vacuum and (expired or legacy_compacted):
+        vacuumed = _reclaim_space(db.engine, model.__tablename__)
+
+    report = {
+        'started_at': started_at.isoformat(),
+        'duration_seconds': round(time.perf_counter() - started, 3),
+        'rows_examined': len(rows),
+        'rows_deleted': len(expired),
+        'legacy_rows_compacted': legacy_compacted,
+        'vacuumed': vacuumed,
+        'keep_last': keep_last,
+        'keep_monthly': keep_monthly
+    }
+    last_report = report
+    print(f"Result compaction: examined {report['rows_examined']} rows, deleted {report['rows_deleted']}, "
+          f"compacted {legacy_compacted} legacy rows in {report['duration_seconds']}s")
+    return report
+
+
+def get_last_report():
+    """Report from the most recent compaction in this process, if any"""
+    return last_report
+
+
+def _read_last_run(f):
+    f.seek(0)
+    try:
+        return float(f.read().strip() or 0)
+    except ValueError:
+        return 0.0
+
+
+def run_compaction_if_due(lock_path, interval_seconds, compact):
+    """Call compact() if no process has done so for interval_seconds; returns seconds until the next check
+
+    The lock file holds the time of the last completed run, so the schedule
+    survives worker restarts. An exclusive flock elects one runner: any other
+    process checking at the same moment skips its turn instead of running the
+    deletes and VACUUM alongside it.
+    """
+    os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+    with open(lock_path, 'a+') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return interval_seconds
+
+        try:
+            due_in = _read_last_run(f) + interval_seconds - time.time()
+            if due_in > 0:
+                return due_in
+            compact()
+            f.seek(0)
+            f.truncate()
+            f.write(str(time.time()))
+            f.flush()
+            return interval_seconds
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def start_compaction_scheduler(app, db, model, interval_seconds, lock_path, keep_last=10, keep_monthly=12):
+    """Check every worker's compaction schedule on a daemon thread, starting now
+
+    Every worker runs the thread, but run_compaction_if_due lets only one
+    process compact per interval. Call it once the schema is known to exist;
+    a failed pass is retried after RETRY_SECONDS rather than a whole interval.
+    """
+    stop_event = threading.Event()
+
+    def compact():
+        with app.app_context():
+            compact_analysis_history(db, model, keep_last, keep_monthly)
+
+    def run():
+        delay = 0
+        while not stop_event.wait(delay):
+            try:
+                delay = run_compaction_if_due(lock_path, interval_seconds, compact)
+            except Exception as e:
+                print(f"Result compaction failed: {e}")
+                delay = min(RETRY_SECONDS, interval_seconds)
+
+    thread = threading.Thread(target=run, name='result-compaction', daemon=True)
+    thread.start()
+    return stop_event
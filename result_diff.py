@@ -0,0 +1,129 @@
+from collections import defaultdict
+
+# Fields compared for each keyed row; rank is derived from list position
+STUDENT_FIELDS = ['score']
+CLASS_FIELDS = ['weighted_score', 'average_need_score', 'total_need_score',
+                'max_need_score', 'student_count', 'high_need_students']
+LESSON_FIELDS = ['need_score', 'student_count', 'high_need_students']
+
+
+def _delta(before, after):
+    if isinstance(before, (int, float)) and isinstance(after, (int, float)):
+        return round(after - before, 2)
+    return None
+
+
+def _index_ranked(rows, key):
+    """Map each row's key to (rank, row), ranks starting at 1"""
+    return {row[key]: (rank, row) for rank, row in enumerate(rows or [], 1)}
+
+
+def _diff_keyed(before, after, key_fields, fields, position_name='rank'):
+    """Hash join two {key: (position, row)} indexes and keep only changed rows
+
+    A positive <position_name>_delta means the row moved up the list.
+    """
+    changed = []
+    unchanged = 0
+
+    for key, (to_position, to_row) in after.items():
+        entry = dict(zip(key_fields, key if isinstance(key, tuple) else (key,)))
+        if key not in before:
+            entry.update({'status': 'added', f'to_{position_name}': to_position})
+            entry.update({f'to_{field}': to_row.get(field) for field in fields})
+            changed.append(entry)
+            continue
+
+        from_position, from_row = before[key]
+        field_changes = {}
+        for field in fields:
+            if from_row.get(field) != to_row.get(field):
+                field_changes[f'from_{field}'] = from_row.get(field)
+                field_changes[f'to_{field}'] = to_row.get(field)
+                field_changes[f'{field}_delta'] = _delta(from_row.get(field), to_row.get(field))
+
+        if from_position == to_position and not field_changes:
+            unchanged += 1
+            continue
+
+        entry.update({
+            'status': 'changed',
+            f'from_{position_name}': from_position,
+            f'to_{position_name}': to_position,
+            f'{position_name}_delta': from_position - to_position
+        })
+        entry.update(field_changes)
+        changed.append(entry)
+
+    for key, (from_position, from_row) in before.items():
+        if key not in after:
+            entry = dict(zip(key_fields, key if isinstance(key, tuple) else (key,)))
+            entry.update({'status': 'removed', f'from_{position_name}': from_position})
+            entry.update({f'from_{field}': from_row.get(field) for field in fields})
+            changed.append(entry)
+
+    return {'changed': changed, 'unchanged_count': unchanged}
+
+
+def _index_grid(grid):
+    """Key every lesson by slot, class, staff and room
+
+    The grid is grouped by time slot only, so the same lesson can appear once
+    per day; repeats are told apart by an occurrence counter.
+    """
+    index = {}
+    for time_slot, lessons in (grid or {}).items():
+        occurrences = defaultdict(int)
+        for position, lesson in enumerate(lessons, 1):
+            base = (time_slot, lesson.get('course_class'), lesson.get('staff'), lesson.get('room'))
+            occurrences[base] += 1
+            index[base + (occurrences[base],)] = (position, lesson)
+    return index
+
+
+def diff_statistics(before, after):
+    """Summary statistics whose values differ between two results"""
+    before, after = before or {}, after or {}
+    return {
+        key: {'from': before.get(key), 'to': after.get(key), 'delta': _delta(before.get(key), after.get(key))}
+        for key in sorted(set(before) | set(after))
+        if before.get(key) != after.get(key)
+    }
+
+
+def diff_results(from_results, to_results):
+    """Compare two analysis results section by section
+
+    Both arguments are results dicts as stored by AnalysisResult, containing
+    any of statistics, top_students, top_classes and timetable_grid. Each
+    section is joined on its natural key in linear time and only rows that
+    were added, removed, re-ranked or rescored are returned.
+    """
+    diff = {}
+
+    if 'statistics' in from_results and 'statistics' in to_results:
+        diff['statistics'] = diff_statistics(from_results['statistics'], to_results['statistics'])
+
+    if 'top_students' in from_results and 'top_students' in to_results:
+        diff['students'] = _diff_keyed(
+            _index_ranked(from_results['top_students'], 'name'),
+            _index_ranked(to_results['top_students'], 'name'),
+            ['name'], STUDENT_FIELDS
+        )
+
+    if 'top_classes' in from_results and 'top_classes' in to_results:
+        diff['classes'] = _diff_keyed(
+            _index_ranked(from_results['top_classes'], 'class_code'),
+            _index_ranked(to_results['top_classes'], 'class_code'),
+            ['class_code'], CLASS_FIELDS
+        )
+
+    if 'timetable_grid' in from_results and 'timetable_grid' in to_results:
+        diff['grid'] = _diff_keyed(
+            _index_grid(from_results['timetable_grid']),
+            _index_grid(to_results['timetable_grid']),
+            ['time_slot', 'course_class', 'staff', 'room', 'occurrence'], LESSON_FIELDS,
+            position_name='position'
+        )
+
+    return diff
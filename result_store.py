@@ -0,0 +1,91 @@
+import hashlib
+import json
+import zlib
+from sqlalchemy import inspect, text
+
+# Independently addressable sections of a saved analysis, mapped to the key
+# each one occupies in TANeedAnalyzer.get_analysis_results()
+RESULT_SECTIONS = {
+    'statistics': 'statistics',
+    'students': 'top_students',
+    'classes': 'top_classes',
+    'grid': 'timetable_grid',
+}
+
+COMPRESSION_LEVEL = 6
+
+
+def section_column(section):
+    """Name of the AnalysisResult column holding a section"""
+    return f'{section}_blob'
+
+
+def _section_payload(data):
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def pack_section(data):
+    """Serialise one result section to compressed compact JSON"""
+    return zlib.compress(_section_payload(data), COMPRESSION_LEVEL)
+
+
+def unpack_section(blob):
+    """Decode a section written by pack_section"""
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+def pack_results(results):
+    """Split a full results dict into compressed sections plus a content hash
+
+    The hash covers the uncompressed section payloads, so two runs that
+    produced byte-identical results share a hash regardless of zlib version.
+    """
+    digest = hashlib.sha256()
+    sections = {}
+    for section, key in RESULT_SECTIONS.items():
+        payload = _section_payload(results.get(key))
+        digest.update(section.encode('utf-8') + b'\0' + payload)
+        sections[section] = zlib.compress(payload, COMPRESSION_LEVEL)
+    return sections, digest.hexdigest()
+
+
+def parse_sections(value):
+    """Parse a comma separated ?sections= argument, defaulting to every section"""
+    if not value:
+        return list(RESULT_SECTIONS)
+
+    sections = [s.strip() for s in value.split(',') if s.strip()]
+    unknown = [s for s in sections if s not in RESULT_SECTIONS]
+    if unknown:
+        raise ValueError(f'Unknown result sections: {unknown}. Valid sections: {list(RESULT_SECTIONS)}')
+    return sections
+
+
+def ensure_table_columns(engine, table):
+    """Bring a table created by an older release up to date with its model
+
+    db.create_all() only creates missing tables, so nullable columns and
+    indexes added to an existing model are created here instead.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(table.name):
+        return []
+
+    existing = {col['name'] for col in inspector.get_columns(table.name)}
+    missing = [col for col in table.columns if col.name not in existing]
+    added = []
+    with engine.begin() as conn:
+        for col in missing:
+            if not col.nullable:
+                print(f"Cannot add non-nullable column {table.name}.{col.name} automatically")
+                continue
+            column_type = col.type.compile(dialect=engine.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {col.name} {column_type}'))
+            added.append(col.name)
+
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+    if added:
+        print(f"Added columns to {table.name}: {added}")
+    return added
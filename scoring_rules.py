@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+from need_features import _is_filled, _BLANK_LIST_ENTRY
+
+# predicate -> whether it needs a comparison value
+RULE_PREDICATES = {
+    'present': False,
+    'equals': True,
+    'below': True,
+    'above': True,
+    'count_list': False
+}
+
+
+def validate_rules(rules):
+    """Check custom scoring rules, returning them with defaults filled in
+
+    Each rule is {'column', 'predicate', 'points'} plus 'value' for equals,
+    below and above, and an optional 'name' used in breakdowns.
+    """
+    if not isinstance(rules, list):
+        raise ValueError("Scoring rules must be a list")
+
+    cleaned = []
+    for i, rule in enumerate(rules, 1):
+        if not isinstance(rule, dict):
+            raise ValueError(f"Rule {i} must be an object")
+        unknown = [key for key in rule if key not in ('name', 'column', 'predicate', 'value', 'points')]
+        if unknown:
+            raise ValueError(f"Rule {i} has unknown keys: {unknown}")
+        if not rule.get('column'):
+            raise ValueError(f"Rule {i} needs a column")
+
+        predicate = rule.get('predicate')
+        if predicate not in RULE_PREDICATES:
+            raise ValueError(f"Rule {i} predicate must be one of {list(RULE_PREDICATES)}")
+
+        value = rule.get('value')
+        if RULE_PREDICATES[predicate]:
+            if value is None or value == '':
+                raise ValueError(f"Rule {i} ({predicate}) needs a value")
+            if predicate in ('below', 'above'):
+                value = float(value)
+            else:
+                value = str(value).strip()
+
+        points = float(rule.get('points', 1))
+        cleaned.append({
+            'name': str(rule.get('name') or rule['column']),
+            'column': str(rule['column']),
+            'predicate': predicate,
+            'value': value,
+            'points': int(points) if points.is_integer() else points
+        })
+    return cleaned
+
+
+def missing_rule_columns(rules, columns):
+    """Columns rules refer to that a SEN file does not have"""
+    return sorted({rule['column'] for rule in rules} - set(columns))
+
+
+def _rule_counts(rule, values):
+    """How many times each row meets the rule (0/1, or the list length for count_list)"""
+    predicate = rule['predicate']
+    if predicate == 'present':
+        return _is_filled(values).to_numpy(dtype=np.int64)
+    if predicate == 'equals':
+        return (values.notna() & (values.astype(str).str.strip() == rule['value'])).to_numpy(dtype=np.int64)
+    if predicate in ('below', 'above'):
+        numbers = pd.to_numeric(values, errors='coerce')
+        met = numbers < rule['value'] if predicate == 'below' else numbers > rule['value']
+        return met.fillna(False).to_numpy(dtype=np.int64)
+
+    # count_list: non-blank comma separated entries, missing values count as none
+    text = values.fillna('').astype(str)
+    counts = text.str.count(',') + 1 - text.str.count(_BLANK_LIST_ENTRY)
+    return counts.to_numpy(dtype=np.int64)
+
+
+def _rule_label(rule, count, raw_value):
+    points = rule['points'] * count
+    if rule['predicate'] == 'count_list':
+        return f"{rule['name']} ({count} items, +{points})"
+    if rule['predicate'] in ('below', 'above'):
+        return f"{rule['name']} ({raw_value}, +{points})"
+    return f"{rule['name']} (+{points})"
+
+
+class CompiledRules:
+    """Custom rules evaluated once, column by column, over a SEN frame
+
+    Only each student's first SEN row counts, as for the built-in factors.
+    counts is a SEN rows x rules matrix of how often each rule is met, with
+    a trailing zero row that row -1 (no SEN row) picks up; breakdown labels
+    are only rendered for the students whose hits are asked for.
+    """
+
+    def __init__(self, rules, students_sen):
+        self.rules = rules
+        rows = students_sen.drop_duplicates('Name', keep='first')
+        missing = missing_rule_columns(rules, rows.columns)
+        if missing:
+            raise ValueError(f"Scoring rules use columns not in the SEN file: {missing}")
+
+        self.names = pd.Index(rows['Name'])
+        self.points = np.array([rule['points'] for rule in rules], dtype=float)
+        self.counts = np.zeros((len(rows) + 1, len(rules)), dtype=np.int64)
+        self.raw_values = []
+        for r, rule in enumerate(rules):
+            values = rows[rule['column']]
+            self.counts[:-1, r] = _rule_counts(rule, values)
+            self.raw_values.append(values.to_numpy())
+
+    def rows_of(self, names):
+        """SEN row of each name, -1 for students without one"""
+        return self.names.get_indexer(names)
+
+    def points_matrix(self, names):
+        """names x rules matrix of points earned, zero for students without a SEN row"""
+        return self.counts[self.rows_of(names)] * self.points
+
+    def has_hits(self, rows):
+        """Whether each SEN row (-1 for none) meets at least one rule"""
+        return self.counts[rows].any(axis=1)
+
+    def hits_at(self, row):
+        """(points, breakdown label) pairs of the rules a SEN row meets, in rule order"""
+        return [
+            (rule['points'] * int(count), _rule_label(rule, int(count), self.raw_values[r][row]))
+            for r, (rule, count) in enumerate(zip(self.rules, self.counts[row]))
+            if count
+        ]
+
+    def hits(self, name):
+        """hits_at() for a student's name"""
+        return self.hits_at(self.rows_of([name])[0])
@@ -0,0 +1,250 @@
+import copy
+import os
+import pickle
+import struct
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from analysis_settings import INPUT_FRAMES
+from compact_results import StringPool, StudentScores, ClassAggregate, ClassSummary, class_segments
+
+# Bump when the layout or the analyzer attributes it restores change; older
+# snapshots are then ignored rather than misread
+SNAPSHOT_VERSION = 2
+MAGIC = b'TASESS\x00\x01'
+# Arrays start on 64-byte boundaries so each maps cleanly
+ALIGNMENT = 64
+SNAPSHOT_SUFFIX = '.session'
+
+SETTINGS = ('weightings', 'class_filters', 'class_aggregation', 'scoring_rules')
+
+
+def snapshot_path(folder, key):
+    return os.path.join(folder, f'{key}{SNAPSHOT_SUFFIX}')
+
+
+def session_token(analyzer):
+    """Changes whenever a snapshot of the analyzer would differ; unchanged sessions are not rewritten"""
+    return (
+        tuple(getattr(analyzer, f'{name}_file') for name in INPUT_FRAMES),
+        tuple(sorted(analyzer._versions.items())),
+        repr([getattr(analyzer, name) for name in SETTINGS])
+    )
+
+
+def _capture(analyzer):
+    """(header state, {name: array}) for an analyzer's inputs, stage cache and results"""
+    table = analyzer.student_scores
+    count = len(table.names)
+    arrays = {
+        'scores': table.scores[:count],
+        'score_is_float': table.score_is_float[:count],
+        'factors': table.factors[:count],
+        'alive': table.alive[:count],
+    }
+
+    aggregates = analyzer._class_aggregates
+    codes, offsets, member_ids = class_segments({code: aggregate.member_ids for code, aggregate in aggregates.items()})
+    arrays['class_offsets'] = offsets
+    arrays['class_member_ids'] = member_ids
+    arrays['class_member_scores'] = np.concatenate(
+        [aggregates[code].scores for code in codes]) if codes else np.zeros(0)
+    arrays['class_sorted_scores'] = np.concatenate(
+        [aggregates[code].sorted_scores for code in codes]) if codes else np.zeros(0)
+
+    state = {
+        'files': {name: getattr(analyzer, f'{name}_file') for name in INPUT_FRAMES},
+        'file_fingerprints': dict(analyzer._file_fingerprints),
+        'settings': {name: getattr(analyzer, name) for name in SETTINGS},
+        'scored_weightings': analyzer._scored_weightings,
+        'versions': dict(analyzer._versions),
+        'computed_from': dict(analyzer._computed_from),
+        'names': table.names,
+        'details': table.details,
+        'roster': analyzer._roster,
+        'class_memberships': analyzer._class_memberships,
+        'student_memberships': analyzer._student_memberships,
+        'class_codes': codes,
+        'class_totals': [(aggregates[code].total, aggregates[code].max) for code in codes],
+        # Ranked order matters; each summary shares its class's aggregate
+        'class_scores': [
+            (code, tuple(summary[field] for field in ClassSummary.FIELDS))
+            for code, summary in analyzer.class_scores.items()
+        ],
+        'class_time_slots': analyzer._class_time_slots,
+        'timetable_grid': analyzer._timetable_grid,
+        'grid_rows_by_class': analyzer._grid_rows_by_class,
+        'grid_slot_rows': analyzer._grid_slot_rows,
+        'grid_strings': analyzer._grid_strings.values,
+    }
+    return state, arrays
+
+
+def save_session(analyzer, path, extra=None):
+    """Write the analyzer's session to path, atomically replacing any earlier snapshot
+
+    extra is stored alongside and handed back by restore_session (auth_app
+    keeps the user's upload session in it).
+    """
+    state, arrays = _capture(analyzer)
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = (array.dtype.str, array.shape, offset)
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header = pickle.dumps({
+        'version': SNAPSHOT_VERSION,
+        'saved_at': time.time(),
+        'state': state,
+        'layout': layout,
+        'extra': extra,
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name][2])
+            f.write(array.tobytes())
+        # Keep the file as long as its last array's padding, so every map fits
+        f.truncate(data_start + offset)
+    # Workers mapping the old snapshot keep their pages; new readers get this one
+    os.replace(tmp_path, path)
+
+
+def _read_header(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None, 0
+        (length,) = struct.unpack('<Q', f.read(8))
+        header = pickle.loads(f.read(length))
+    data_start = -(-(len(MAGIC) + 8 + length) // ALIGNMENT) * ALIGNMENT
+    return header, data_start
+
+
+def _map_array(path, data_start, dtype, shape, offset):
+    """Copy-on-write view of one stored array; pages are read when first touched"""
+    dtype = np.dtype(dtype)
+    if int(np.prod(shape)) == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='c', offset=data_start + offset, shape=shape)
+
+
+def restore_session(path, analyzer, max_age=None):
+    """Load a snapshot into a fresh analyzer; returns its extra, or None when there is nothing usable
+
+    Snapshots that are unreadable, from another SNAPSHOT_VERSION, older than
+    max_age seconds or pointing at uploads that have since changed are
+    deleted. Input frames are not stored: load_data_from_files re-reads them
+    when an analysis needs them, and the restored stages stay valid because
+    the files match the fingerprints they were computed from.
+    """
+    try:
+        header, data_start = _read_header(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, pickle.UnpicklingError, struct.error):
+        header = None
+
+    if (
+        header is None
+        or header['version'] != SNAPSHOT_VERSION
+        or (max_age is not None and time.time() - header['saved_at'] > max_age)
+        or not _inputs_unchanged(analyzer, header['state'])
+    ):
+        discard_session(path)
+        return None
+
+    state = header['state']
+    arrays = {name: _map_array(path, data_start, *layout) for name, layout in header['layout'].items()}
+
+    for name in INPUT_FRAMES:
+        setattr(analyzer, f'{name}_file', state['files'][name])
+    for name, value in state['settings'].items():
+        setattr(analyzer, name, value)
+
+    table = StudentScores()
+    table.names = state['names']
+    table.ids = {table.names[i]: int(i) for i in np.flatnonzero(arrays['alive'])}
+    table.scores = arrays['scores']
+    table.score_is_float = arrays['score_is_float']
+    table.factors = arrays['factors']
+    table.alive = arrays['alive']
+    table.details = state['details']
+    analyzer.student_scores = table
+
+    offsets = arrays['class_offsets']
+    aggregates = {}
+    for c, code in enumerate(state['class_codes']):
+        segment = slice(int(offsets[c]), int(offsets[c + 1]))
+        total, max_score = state['class_totals'][c]
+        aggregates[code] = ClassAggregate(
+            table, arrays['class_member_ids'][segment], arrays['class_member_scores'][segment],
+            total, max_score, arrays['class_sorted_scores'][segment]
+        )
+    analyzer._class_aggregates = aggregates
+    analyzer.class_scores = {
+        code: ClassSummary(aggregates[code], *fields) for code, fields in state['class_scores']
+    }
+
+    analyzer._scored_weightings = state['scored_weightings']
+    analyzer._versions = defaultdict(int, state['versions'])
+    analyzer._computed_from = state['computed_from']
+    # Settings count as the inputs the stages were built from, so re-applying
+    # the same school settings leaves every stage cached
+    analyzer._input_objects = copy.deepcopy(state['settings'])
+    analyzer._file_fingerprints = state['file_fingerprints']
+    analyzer._restored_fingerprints = dict(state['file_fingerprints'])
+    analyzer._roster = state['roster']
+    analyzer._class_memberships = state['class_memberships']
+    analyzer._student_memberships = state['student_memberships']
+    analyzer._class_time_slots = state['class_time_slots']
+    analyzer._timetable_grid = state['timetable_grid']
+    analyzer._grid_rows_by_class = state['grid_rows_by_class']
+    analyzer._grid_slot_rows = state['grid_slot_rows']
+    pool = StringPool()
+    for value in state['grid_strings']:
+        pool.encode(value)
+    analyzer._grid_strings = pool
+    analyzer.publish()
+    return header['extra']
+
+
+def _inputs_unchanged(analyzer, state):
+    """Whether every uploaded file the snapshot refers to is still on disk as it was"""
+    for name, fingerprint in state['file_fingerprints'].items():
+        try:
+            if analyzer._file_fingerprint(fingerprint[0]) != fingerprint:
+                return False
+        except OSError:
+            return False
+    return all(path is None or os.path.exists(path) for path in state['files'].values())
+
+
+def discard_session(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def prune_sessions(folder, max_age):
+    """Delete snapshots (and stray temp files) not written for max_age seconds; returns how many"""
+    if not os.path.isdir(folder):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(folder):
+        if SNAPSHOT_SUFFIX in entry.name and entry.stat().st_mtime < cutoff:
+            discard_session(entry.path)
+            removed += 1
+    return removed
@@ -0,0 +1,79 @@
+import functools
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+# Pipeline stages, in the order a full run passes through them
+STAGES = ('load', 'score', 'class_aggregation', 'tutor_filtering', 'grid', 'serialise', 'persist')
+
+
+class StageTimer:
+    """Wall-clock seconds spent in each stage during one request
+
+    Stages may nest (calculate_class_need_levels rebuilds aggregates before
+    filtering); each stage is charged only its own time, so the durations add
+    up to the instrumented part of the request without double counting.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.durations = {}
+        # (stage, 'hit' or 'miss') -> count of cached stages reused or recomputed
+        self.cache_events = {}
+        self._child_time = [0.0]
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        self._child_time.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            own = elapsed - self._child_time.pop()
+            self._child_time[-1] += elapsed
+            self.durations[name] = self.durations.get(name, 0.0) + own
+
+    def record_cache(self, stage, hit):
+        key = (stage, 'hit' if hit else 'miss')
+        self.cache_events[key] = self.cache_events.get(key, 0) + 1
+
+    def server_timing(self, total=None):
+        """Server-Timing header value, durations in milliseconds"""
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.durations.items()]
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.1f}")
+        return ', '.join(entries)
+
+    def log_line(self, **fields):
+        """One JSON log record: the given request fields plus per-stage milliseconds"""
+        stages = {name: round(seconds * 1000, 1) for name, seconds in self.durations.items()}
+        return json.dumps({**fields, 'stages_ms': stages}, sort_keys=True)
+
+
+class _DisabledTimer:
+    """Stand-in when timing is off: every stage is the same no-op context"""
+    enabled = False
+    durations = {}
+    cache_events = {}
+    _noop = nullcontext()
+
+    def stage(self, name):
+        return self._noop
+
+    def record_cache(self, stage, hit):
+        pass
+
+
+NULL_TIMER = _DisabledTimer()
+
+
+def timed_stage(name):
+    """Method decorator charging the call to self.timer's stage name"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.timer.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
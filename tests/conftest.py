@@ -0,0 +1,68 @@
+"""Fixtures for tests that drive auth_app in-process
+
+auth_app reads its configuration when it is imported, so the environment
+points every folder and the database at a temporary directory first.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope='session')
+def auth_app(tmp_path_factory):
+    pytest.importorskip('flask_sqlalchemy')
+    root = tmp_path_factory.mktemp('auth_app')
+    # Routes import the analysis modules lazily, so the repo stays on the path
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    env = pytest.MonkeyPatch()
+    for name, value in {
+        'DATABASE_URL': f"sqlite:///{root / 'auth_app.db'}",
+        'METRICS_DIR': str(root / 'metrics'),
+        'PROFILE_FOLDER': str(root / 'profiles'),
+        'RESULT_SPOOL_FOLDER': str(root / 'result_spool'),
+        'RESULT_COMPACTION_LOCK_FILE': str(root / 'result_compaction.lock'),
+        'RESULT_COMPACTION_INTERVAL_HOURS': '0',
+        'SESSION_SNAPSHOTS': '0',
+        'ROBUSTNESS_WORKERS': '1',
+    }.items():
+        env.setenv(name, value)
+    # The upload folder is created relative to the working directory on import
+    env.chdir(root)
+    try:
+        import auth_app
+    finally:
+        env.undo()
+    auth_app.app.config['UPLOAD_FOLDER'] = str(root / 'uploads')
+    return auth_app
+
+
+@pytest.fixture
+def admin_client(auth_app):
+    """A test client logged in as the default admin, which the first request creates"""
+    client = auth_app.app.test_client()
+    response = client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 200
+    return client
+
+
+@pytest.fixture(scope='session')
+def school_files(tmp_path_factory):
+    sys.path.insert(0, str(REPO_ROOT / 'benchmarks'))
+    from synthetic_school import write_school
+    return write_school(tmp_path_factory.mktemp('school'), 300)
+
+
+@pytest.fixture
+def school_client(admin_client, school_files):
+    """The admin client with the synthetic school's three files uploaded"""
+    for file_type, path in school_files.items():
+        with open(path, 'rb') as f:
+            response = admin_client.post(f'/api/upload/{file_type}', data={'file': (f, f'{file_type}.csv')})
+        assert response.status_code == 200, response.get_json()
+    return admin_client
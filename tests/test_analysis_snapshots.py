@@ -0,0 +1,116 @@
+"""Published analysis snapshots never change, and readers never see a half-finished run
+
+Reader threads check that every class in the snapshot they hold agrees with
+that snapshot's student scores while a writer keeps re-running the
+analysis with different weightings and applying deltas.
+"""
+
+import contextlib
+import io
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(REPO_ROOT), str(REPO_ROOT / 'benchmarks')]
+
+import web_ta_analyzer  # noqa: E402
+from synthetic_school import write_school  # noqa: E402
+
+WEIGHTINGS = [{}, {'eal': 4, 'boxall': 0.5}, {'sen_needs_multiplier': 1}]
+
+
+def run(analyzer, weightings):
+    with contextlib.redirect_stdout(io.StringIO()), analyzer.write_lock:
+        analyzer.set_weightings(weightings)
+        analyzer.load_data_from_files()
+        analyzer.calculate_all_student_scores()
+        analyzer.calculate_class_need_levels()
+        analyzer.generate_timetable_grid_data()
+
+
+def check_consistent(snapshot):
+    scores = snapshot.student_scores
+    for class_code, data in snapshot.class_scores.items():
+        members = data['students']
+        assert [member['score'] for member in members] == [scores[member['name']]['score'] for member in members]
+        assert data['total_need_score'] == sum(member['score'] for member in members)
+    if snapshot.timetable_grid is not None:
+        for lessons in snapshot.timetable_grid.values():
+            for lesson in lessons:
+                assert lesson['need_score'] == snapshot.class_scores[lesson['class_code']]['weighted_score']
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    paths = write_school(tmp_path / 'school', 300)
+    analyzer = web_ta_analyzer.TANeedAnalyzer()
+    analyzer.students_classes_file = paths['students_classes']
+    analyzer.students_sen_file = paths['students_sen']
+    analyzer.timetable_file = paths['timetable']
+    run(analyzer, {})
+    return analyzer
+
+
+def test_snapshot_is_immutable(analyzer):
+    snapshot = analyzer.snapshot
+    with pytest.raises(AttributeError):
+        snapshot.student_scores = None
+    with pytest.raises(TypeError):
+        snapshot.class_scores['new'] = None
+
+
+def test_published_snapshot_survives_later_changes(analyzer):
+    before = analyzer.snapshot
+    results = {code: dict(data) for code, data in before.class_scores.items()}
+    grid = {slot: list(lessons) for slot, lessons in before.timetable_grid.items()}
+
+    student = analyzer.students_sen.iloc[[0]].assign(Action='remove')
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert analyzer.apply_delta('students_sen', student)['incremental']
+    assert analyzer.snapshot is not before
+    run(analyzer, WEIGHTINGS[1])
+
+    assert {code: dict(data) for code, data in before.class_scores.items()} == results
+    assert dict(before.timetable_grid) == grid
+    check_consistent(before)
+    check_consistent(analyzer.snapshot)
+
+
+def test_delta_swaps_class_aggregates_whole(analyzer):
+    # estimated_bytes (metrics gauges) iterates these from other threads without the lock
+    before = analyzer._class_aggregates
+    contents = dict(before)
+    student = analyzer.students_classes.iloc[[0]].assign(Action='remove')
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert analyzer.apply_delta('students_classes', student)['updated_classes']
+    assert analyzer._class_aggregates is not before
+    assert before == contents
+    assert analyzer.estimated_bytes() > 0
+
+
+def test_readers_see_whole_analyses(analyzer):
+    stop = threading.Event()
+    errors = []
+
+    def read():
+        while not stop.is_set():
+            try:
+                check_consistent(analyzer.snapshot)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    try:
+        for i in range(6):
+            run(analyzer, WEIGHTINGS[i % len(WEIGHTINGS)])
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+    assert not errors, errors[0]
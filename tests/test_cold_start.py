@@ -0,0 +1,87 @@
+"""auth_app starts without pandas and leaves database setup to init-db
+
+Each check runs in a fresh interpreter, since the point is what an import
+does. Timings for the same steps:
+
+    python benchmarks/startup.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+pytest.importorskip('flask_sqlalchemy')
+
+PROBE = '''
+import json, sys
+import auth_app
+status = auth_app.app.test_client().get('/api/health').status_code
+with auth_app.app.app_context():
+    bootstrapped = auth_app.database_is_bootstrapped()
+print(json.dumps({'pandas_at_health': 'pandas' in sys.modules, 'status': status, 'bootstrapped': bootstrapped}))
+'''
+
+
+SCHEDULER_PROBE = '''
+import json, os, threading, time
+import auth_app
+def compaction_threads():
+    return [thread.name for thread in threading.enumerate() if thread.name == 'result-compaction']
+at_import = compaction_threads()
+auth_app.app.test_client().get('/api/health')
+after_request = compaction_threads()
+# Let the first pass finish logging before printing the result
+lock_file = auth_app.app.config['RESULT_COMPACTION_LOCK_FILE']
+for _ in range(100):
+    if os.path.exists(lock_file) and os.path.getsize(lock_file):
+        break
+    time.sleep(0.05)
+print(json.dumps({'at_import': at_import, 'after_request': after_request}))
+'''
+
+
+@pytest.fixture
+def app_env(tmp_path):
+    return dict(
+        os.environ,
+        PYTHONPATH=str(REPO_ROOT),
+        DATABASE_URL=f"sqlite:///{tmp_path / 'cold_start.db'}",
+        METRICS_DIR=str(tmp_path / 'metrics'),
+        RESULT_SPOOL_FOLDER=str(tmp_path / 'result_spool'),
+        RESULT_COMPACTION_INTERVAL_HOURS='0',
+        FLASK_ENV='production'
+    )
+
+
+def run_python(code, env, cwd):
+    completed = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, check=True, capture_output=True, text=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_health_check_does_not_import_pandas(app_env, tmp_path):
+    result = run_python(PROBE, app_env, tmp_path)
+    assert result['status'] == 200
+    assert not result['pandas_at_health']
+    # The first request bootstrapped the empty database
+    assert result['bootstrapped']
+
+
+def test_init_db_is_idempotent(app_env, tmp_path):
+    command = [sys.executable, '-m', 'flask', '--app', 'auth_app', 'init-db']
+    first = subprocess.run(command, cwd=tmp_path, env=app_env, check=True, capture_output=True, text=True)
+    second = subprocess.run(command, cwd=tmp_path, env=app_env, check=True, capture_output=True, text=True)
+    assert 'Database initialised' in first.stdout
+    assert 'Database already initialised' in second.stdout
+
+
+def test_compaction_starts_with_the_first_request(app_env, tmp_path):
+    env = dict(app_env, RESULT_COMPACTION_INTERVAL_HOURS='24',
+               RESULT_COMPACTION_LOCK_FILE=str(tmp_path / 'result_compaction.lock'))
+    result = run_python(SCHEDULER_PROBE, env, tmp_path)
+    assert result == {'at_import': [], 'after_request': ['result-compaction']}
@@ -0,0 +1,87 @@
+"""The array-backed result structures behave exactly like the dicts they replaced"""
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from compact_results import ClassSummary, StringPool, StudentScores, build_class_aggregates  # noqa: E402
+
+
+def record(score, factors=0, detail=None):
+    return {'score': score, 'factors': factors, 'detail': detail}
+
+
+def test_student_scores_follow_dict_semantics():
+    rnd = random.Random(3)
+    table, expected = StudentScores(), {}
+    for step in range(2000):
+        name = f'Student{rnd.randrange(60)}'
+        if name in expected and rnd.random() < 0.3:
+            del table[name]
+            del expected[name]
+        else:
+            score = rnd.choice([rnd.randrange(20), rnd.randrange(20) + 0.5])
+            detail = rnd.choice([None, (2, None, 71.0, ())])
+            table[name] = expected[name] = record(score, rnd.randrange(1 << 16), detail)
+    # Same order, values and int/float score types
+    assert list(table) == list(expected)
+    assert {name: table[name] for name in table} == expected
+    assert [type(table[name]['score']) for name in table] == [type(r['score']) for r in expected.values()]
+    assert len(table) == len(expected) and 'Nobody' not in table
+    assert len(table.details) == sum(r['detail'] is not None for r in expected.values())
+
+
+def test_copies_and_array_tables_are_independent():
+    table = StudentScores.from_arrays(['A', 'B', 'C'], [3, 2.5, 0], [False, True, False], [1, 4, 0], {1: (1, None, None, ())})
+    assert dict(table) == {'A': record(3, 1), 'B': record(2.5, 4, (1, None, None, ())), 'C': record(0)}
+
+    copy = table.copy()
+    copy['A'] = record(9)
+    del copy['C']
+    copy['D'] = record(1)
+    assert dict(table) == {'A': record(3, 1), 'B': record(2.5, 4, (1, None, None, ())), 'C': record(0)}
+    assert list(copy) == ['A', 'B', 'D']
+
+
+def test_class_aggregates_match_python_sums():
+    table = StudentScores.from_arrays(['A', 'B', 'C', 'D'], [4, 1, 0.1, 0.2], [False, False, True, True], [0] * 4, {})
+    aggregates = build_class_aggregates(table, {'7A/Ma1': [0, 1], '7B/En1': [2, 3, 1], 'Empty': []})
+    assert set(aggregates) == {'7A/Ma1', '7B/En1'}
+
+    ints, floats = aggregates['7A/Ma1'], aggregates['7B/En1']
+    assert (ints.total, ints.max) == (5, 4) and isinstance(ints.total, int)
+    # Float classes use sequential Python arithmetic, not a reduction
+    assert floats.total == 0.1 + 0.2 + 1 and floats.max == 1
+    assert floats.sorted_scores.tolist() == [0.1, 0.2, 1.0]
+    assert floats.students() == [{'name': 'C', 'score': 0.1}, {'name': 'D', 'score': 0.2}, {'name': 'B', 'score': 1}]
+
+
+def test_class_summaries_read_like_dicts():
+    table = StudentScores.from_arrays(['A', 'B'], [4, 1], [False, False], [0, 0], {})
+    aggregate = build_class_aggregates(table, {'7A/Ma1': [0, 1]})['7A/Ma1']
+    summary = ClassSummary(aggregate, 2, 5, 2.5, 4, 0, 5.0)
+
+    assert dict(summary) == {
+        'student_count': 2, 'total_need_score': 5, 'average_need_score': 2.5, 'max_need_score': 4,
+        'high_need_students': 0, 'weighted_score': 5.0,
+        'students': [{'name': 'A', 'score': 4}, {'name': 'B', 'score': 1}]
+    }
+    changed = summary.replace(weighted_score=7.5)
+    assert (summary['weighted_score'], changed['weighted_score']) == (5.0, 7.5)
+    summary['high_need_students'] = 1
+    assert summary['high_need_students'] == 1
+    with pytest.raises(KeyError):
+        summary['room'] = 'S1'
+    with pytest.raises(TypeError):
+        del summary['weighted_score']
+
+
+def test_string_pool_stores_each_value_once():
+    pool = StringPool()
+    codes = [pool.encode(value) for value in ['S1', 'S2', 'S1', 'S1']]
+    assert codes == [0, 1, 0, 0] and len(pool) == 2
+    assert [pool.decode(code) for code in codes] == ['S1', 'S2', 'S1', 'S1']
@@ -0,0 +1,40 @@
+"""The composite indexes behind the weighting and saved result queries exist, and are restored if missing"""
+
+from sqlalchemy import inspect, text
+
+EXPECTED_INDEXES = {
+    'weighting_config': {
+        'ix_weighting_config_school_user_default': ['school_id', 'user_id', 'is_default'],
+    },
+    'analysis_result': {
+        'ix_analysis_result_user_config_hash': ['user_id', 'weighting_config_id', 'content_hash'],
+        'ix_analysis_result_user_hash': ['user_id', 'content_hash'],
+        'ix_analysis_result_user_config_created': ['user_id', 'weighting_config_id', 'created_at'],
+    },
+}
+
+
+def indexes(engine, table):
+    return {index['name']: index['column_names'] for index in inspect(engine).get_indexes(table)}
+
+
+def test_composite_indexes_exist(auth_app):
+    with auth_app.app.app_context():
+        auth_app.bootstrap_database()
+        for table, expected in EXPECTED_INDEXES.items():
+            existing = indexes(auth_app.db.engine, table)
+            assert {name: existing.get(name) for name in expected} == expected
+
+
+def test_missing_index_is_recreated(auth_app):
+    with auth_app.app.app_context():
+        engine = auth_app.db.engine
+        auth_app.bootstrap_database()
+        with engine.begin() as conn:
+            conn.execute(text('DROP INDEX ix_analysis_result_user_hash'))
+
+        # A database from before the index is not current, so workers bootstrap it
+        assert not auth_app.database_is_bootstrapped()
+        auth_app.bootstrap_database()
+        assert 'ix_analysis_result_user_hash' in indexes(engine, 'analysis_result')
+        assert auth_app.database_is_bootstrapped()
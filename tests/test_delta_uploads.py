@@ -0,0 +1,87 @@
+"""A delta upload patched into an analysis matches a full run over the patched files
+
+Compares students, classes with their member order, and the timetable grid
+including the order of lessons that tie on need score within a slot.
+"""
+
+import contextlib
+import io
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(REPO_ROOT), str(REPO_ROOT / 'benchmarks')]
+
+import web_ta_analyzer  # noqa: E402
+from equivalence import collect_output, compare  # noqa: E402
+from synthetic_school import write_school  # noqa: E402
+
+
+def analyze(paths, class_aggregation=None):
+    analyzer = web_ta_analyzer.TANeedAnalyzer()
+    analyzer.set_class_aggregation(class_aggregation or {})
+    analyzer.students_classes_file = paths['students_classes']
+    analyzer.students_sen_file = paths['students_sen']
+    analyzer.timetable_file = paths['timetable']
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer.load_data_from_files()
+        analyzer.calculate_all_student_scores()
+        analyzer.calculate_class_need_levels()
+        analyzer.generate_timetable_grid_data()
+    return analyzer
+
+
+def output(analyzer):
+    return collect_output(analyzer, analyzer.generate_timetable_grid_data(), analyzer.get_breakdown)
+
+
+@pytest.fixture
+def school(tmp_path):
+    return write_school(tmp_path / 'school', 300)
+
+
+def sen_delta(analyzer):
+    rows = analyzer.students_sen.iloc[:40]
+    changed = rows.iloc[:30].assign(**{
+        'EAL at any time this academic year?': 'Yes',
+        'Looked After (In Care) Status': 'Yes',
+        'Action': 'change'
+    })
+    removed = rows.iloc[30:].assign(Action='remove')
+    return pd.concat([changed, removed])
+
+
+def classes_delta(analyzer):
+    rows = analyzer.students_classes.iloc[:20]
+    # Each student takes the enrolments of the one five rows on, in the same year group
+    swapped = rows.iloc[:10].assign(**{'Courses/classes': rows.iloc[5:15]['Courses/classes'].to_numpy()})
+    return swapped.assign(Action='change')
+
+
+@pytest.mark.parametrize('file_type, make_delta, class_aggregation', [
+    ('students_sen', sen_delta, None),
+    ('students_classes', classes_delta, None),
+    ('students_sen', sen_delta, {'strategy': 'percentile', 'percentile': 75}),
+    ('students_classes', classes_delta, {'strategy': 'top_n_sum', 'top_n': 3}),
+])
+def test_delta_matches_full_run(school, tmp_path, file_type, make_delta, class_aggregation):
+    patched = analyze(school, class_aggregation)
+    # Only the classes the delta touches are re-aggregated
+    aggregated = []
+    get_class_metrics = patched.get_class_metrics
+    patched.get_class_metrics = lambda strategies, class_codes=None: (
+        aggregated.append(len(class_codes)), get_class_metrics(strategies, class_codes)
+    )[1]
+    patched_path = str(tmp_path / f'{file_type}_patched.csv')
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary = patched.apply_delta(file_type, make_delta(patched), save_to=patched_path)
+    assert summary['incremental'] and summary['updated_classes']
+    if class_aggregation:
+        assert aggregated and aggregated[0] <= summary['updated_classes'] < len(patched.class_scores)
+
+    rebuilt = analyze({**school, file_type: patched_path}, class_aggregation)
+    differences = compare(output(rebuilt), output(patched))
+    assert not differences, differences[:10]
@@ -0,0 +1,66 @@
+"""The optimised analyzer matches the legacy row-by-row implementations exactly
+
+Uses the harness in benchmarks/equivalence.py over a generated school and
+a handful of fuzzed ones. Larger or longer runs, with timings:
+
+    python benchmarks/equivalence.py --students 10000 --fuzz 25
+"""
+
+import copy
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+
+import equivalence  # noqa: E402
+from synthetic_school import write_school  # noqa: E402
+
+FUZZ_SEEDS = range(1, 6)
+
+
+def assert_identical(differences):
+    report = {name: lines[:equivalence.MAX_REPORTED] for name, lines in differences.items() if lines}
+    assert not report, report
+
+
+@pytest.fixture(scope='module')
+def generated_school(tmp_path_factory):
+    return write_school(tmp_path_factory.mktemp('generated'), 400)
+
+
+def test_generated_school_matches(generated_school):
+    outputs, differences = equivalence.run_case(generated_school)
+    assert {'cli', 'web:pandas', 'web:numpy'} <= set(differences)
+    assert outputs['web:numpy']['classes'] and outputs['web:numpy']['grid']
+    assert_identical(differences)
+
+
+@pytest.mark.parametrize('seed', FUZZ_SEEDS)
+def test_fuzzed_school_matches(seed, tmp_path):
+    paths = equivalence.fuzz_school(tmp_path, 250, seed)
+    assert_identical(equivalence.run_case(paths)[1])
+    assert_identical(equivalence.run_case(paths, equivalence.fuzz_weightings(seed))[1])
+
+
+def test_float_weightings_keep_score_types(generated_school):
+    outputs, differences = equivalence.run_case(generated_school, {'eal': 1.5, 'boxall': 0.5})
+    assert 'cli' not in outputs
+    assert_identical(differences)
+    assert {type_name for _, type_name, _ in outputs['web:numpy']['students'].values()} == {'int', 'float'}
+
+
+def test_compare_reports_type_changes(generated_school):
+    output = equivalence.run_implementation('backend', generated_school)
+    changed = copy.deepcopy(output)
+    class_code = next(iter(changed['classes']))
+    changed['classes'][class_code]['total_need_score'] = float(changed['classes'][class_code]['total_need_score'])
+    student = next(iter(changed['students']))
+    score, _, breakdown = changed['students'][student]
+    changed['students'][student] = (float(score), 'float', breakdown)
+
+    differences = equivalence.compare(output, changed)
+    assert len(differences) == 2
+    assert any(line.startswith(f"classes {class_code!r}") for line in differences)
+    assert any(line.startswith(f"students {student!r}") for line in differences)
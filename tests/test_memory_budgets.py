@@ -0,0 +1,153 @@
+"""Peak and retained memory of each analyzer stage, checked against memory_budgets.json
+
+Runs both the production analyzer (web_ta_analyzer) and the ta_web_app
+backend copy over a synthetic school of 1k students. Budgets are also
+recorded for 10k and 50k; those runs take minutes, so they are opt-in:
+
+    MEMORY_BUDGET_SCALES=1000,10000,50000 python -m pytest tests/test_memory_budgets.py
+
+A stage over budget fails with the allocation sites (file:line) that grew
+most during it. After an intended change in memory use, re-record the
+budgets by adding UPDATE_MEMORY_BUDGETS=1 to the same command.
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(REPO_ROOT), str(REPO_ROOT / 'benchmarks'), str(REPO_ROOT / 'ta_web_app' / 'backend')]
+
+import ta_analyzer  # noqa: E402  (the backend copy)
+import web_ta_analyzer  # noqa: E402
+from synthetic_school import write_school  # noqa: E402
+
+BUDGETS_PATH = Path(__file__).with_name('memory_budgets.json')
+ANALYZERS = {
+    'web_ta_analyzer': web_ta_analyzer.TANeedAnalyzer,
+    'backend': ta_analyzer.TANeedAnalyzer
+}
+STAGES = (
+    'load_data_from_files',
+    'calculate_all_student_scores',
+    'calculate_class_need_levels',
+    'generate_timetable_grid_data',
+    'get_analysis_results'
+)
+SCALES = [int(scale) for scale in os.environ.get('MEMORY_BUDGET_SCALES', '1000').split(',')]
+UPDATE_BUDGETS = os.environ.get('UPDATE_MEMORY_BUDGETS') == '1'
+# Recorded budgets allow for allocator and library-version noise
+HEADROOM = 1.5
+MIN_SLACK = 256 * 1024
+GROWTH_SITES = 8
+
+
+def load_analyzer(analyzer_class, paths):
+    analyzer = analyzer_class()
+    analyzer.students_classes_file = paths['students_classes']
+    analyzer.students_sen_file = paths['students_sen']
+    analyzer.timetable_file = paths['timetable']
+    return analyzer
+
+
+def growth_sites(before):
+    """The allocation sites holding the most new memory since the before snapshot"""
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    after = tracemalloc.take_snapshot().filter_traces(ignore)
+    diffs = [diff for diff in after.compare_to(before.filter_traces(ignore), 'lineno') if diff.size_diff > 0]
+    return [f"{diff.traceback[0]}: +{diff.size_diff / 1024:.0f} KB ({diff.count_diff:+d} blocks)"
+            for diff in diffs[:GROWTH_SITES]]
+
+
+def measure_stages(analyzer_class, paths):
+    """{stage: {'peak', 'retained', 'growth'}} for one run of the pipeline, in bytes"""
+    analyzer = load_analyzer(analyzer_class, paths)
+    measured = {}
+    tracemalloc.start()
+    try:
+        for stage in STAGES:
+            before = tracemalloc.take_snapshot()
+            start, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            with contextlib.redirect_stdout(io.StringIO()):
+                getattr(analyzer, stage)()
+            current, peak = tracemalloc.get_traced_memory()
+            measured[stage] = {
+                'peak': peak - start,
+                'retained': current - start,
+                'growth': growth_sites(before)
+            }
+    finally:
+        tracemalloc.stop()
+    return measured
+
+
+def read_budgets():
+    if not BUDGETS_PATH.exists():
+        return {}
+    return json.loads(BUDGETS_PATH.read_text())
+
+
+def record_budgets(analyzer_name, scale, measured):
+    budgets = read_budgets()
+    budgets.setdefault(analyzer_name, {})[str(scale)] = {
+        stage: {
+            f'{kind}_bytes': int(max(0, values[kind]) * HEADROOM + MIN_SLACK) // 1024 * 1024
+            for kind in ('peak', 'retained')
+        }
+        for stage, values in measured.items()
+    }
+    BUDGETS_PATH.write_text(json.dumps(budgets, indent=2, sort_keys=True) + '\n')
+
+
+@pytest.fixture(scope='session')
+def school_files(tmp_path_factory):
+    """Synthetic school CSVs per scale, written once per session"""
+    cache = {}
+
+    def files(scale):
+        if scale not in cache:
+            cache[scale] = write_school(tmp_path_factory.mktemp(f'school_{scale}'), scale)
+        return cache[scale]
+    return files
+
+
+@pytest.fixture(scope='session', autouse=True)
+def warm_up(school_files):
+    # First calls populate pandas/numpy caches that would otherwise count against a stage
+    for analyzer_class in ANALYZERS.values():
+        analyzer = load_analyzer(analyzer_class, school_files(200))
+        with contextlib.redirect_stdout(io.StringIO()):
+            for stage in STAGES:
+                getattr(analyzer, stage)()
+
+
+@pytest.mark.parametrize('scale', SCALES)
+@pytest.mark.parametrize('analyzer_name', list(ANALYZERS))
+def test_stage_memory_within_budget(analyzer_name, scale, school_files):
+    measured = measure_stages(ANALYZERS[analyzer_name], school_files(scale))
+    if UPDATE_BUDGETS:
+        record_budgets(analyzer_name, scale, measured)
+        return
+
+    budget = read_budgets().get(analyzer_name, {}).get(str(scale))
+    if budget is None:
+        pytest.skip(f"No memory budget recorded for {analyzer_name} at {scale} students")
+
+    failures = []
+    for stage, values in measured.items():
+        for kind in ('peak', 'retained'):
+            limit = budget[stage][f'{kind}_bytes']
+            if values[kind] > limit:
+                failures.append(
+                    f"{analyzer_name} {stage} at {scale} students: {kind} {values[kind] / 1024 ** 2:.2f} MB "
+                    f"over budget {limit / 1024 ** 2:.2f} MB; sites that grew:\n    "
+                    + '\n    '.join(values['growth'])
+                )
+    assert not failures, '\n'.join(failures)
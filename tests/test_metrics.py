@@ -0,0 +1,51 @@
+"""Counters merged across workers never go backwards when workers exit or pids are reused"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from metrics import MetricsRegistry, RETIRED_FILE, _key  # noqa: E402
+
+COUNTER = 'ta_http_requests_total'
+
+
+def write_exited_worker(directory, name, requests):
+    """A snapshot left behind by a worker that is no longer running"""
+    with open(os.path.join(directory, name), 'w') as f:
+        json.dump({'counters': {_key(COUNTER, {'route': '/x'}): requests}, 'histograms': {}, 'gauges': {
+            _key('ta_active_analyzers', {}): 7
+        }}, f)
+
+
+def requests_total(exposition):
+    line = next(line for line in exposition.splitlines() if line.startswith(COUNTER + '{'))
+    return float(line.rsplit(' ', 1)[1])
+
+
+def test_exited_workers_are_folded_in_once(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    registry.inc(COUNTER, route='/x')
+    # Same pid as this process but another start time: a recycled pid's previous owner
+    write_exited_worker(tmp_path, f'{os.getpid()}-0.json', 5)
+    write_exited_worker(tmp_path, '999999999-0.json', 10)
+
+    first = registry.collect()
+    assert requests_total(first) == 16
+    # Gauges only count running workers
+    assert 'ta_active_analyzers 7' not in first
+    assert sorted(os.listdir(tmp_path)) == sorted([RETIRED_FILE, os.path.basename(registry._path()), '.lock'])
+
+    registry.inc(COUNTER, route='/x')
+    assert requests_total(registry.collect()) == 17
+
+
+def test_interrupted_fold_is_not_counted_twice(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    write_exited_worker(tmp_path, '999999999-0.json', 10)
+    registry.collect()
+    # As if the scrape stopped after writing the retired totals but before deleting the file
+    write_exited_worker(tmp_path, '999999999-0.json', 10)
+    assert requests_total(registry.collect()) == 10
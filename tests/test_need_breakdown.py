@@ -0,0 +1,63 @@
+"""Breakdowns are stored as factor bitmasks and only rendered for the students a response includes"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import analysis_snapshot  # noqa: E402
+from analysis_settings import DEFAULT_WEIGHTINGS  # noqa: E402
+from need_breakdown import (  # noqa: E402
+    FACTOR_NAMES, LOW_READING, NO_SEN_DATA, PUPIL_PREMIUM, SEN_NEEDS, STAGE_BITS,
+    factor_summary, render_breakdown, student_record
+)
+
+
+def test_records_render_the_breakdown_text():
+    record = student_record(
+        13, PUPIL_PREMIUM | SEN_NEEDS | LOW_READING | STAGE_BITS[1],
+        sen_need_count=2, reading=72.0, custom_labels=['Young carer (+2)']
+    )
+    assert render_breakdown(record, DEFAULT_WEIGHTINGS) == (
+        'Pupil Premium (+2); SEN needs (2 types, +6); Low reading comp (72.0, +2); '
+        'Stage 2 support (+1); Young carer (+2)'
+    )
+    assert factor_summary(record) == {
+        'factors': PUPIL_PREMIUM | SEN_NEEDS | LOW_READING | STAGE_BITS[1],
+        'sen_need_count': 2,
+        'reading_score': 72.0,
+        'custom_factors': ['Young carer (+2)']
+    }
+    assert {FACTOR_NAMES[bit] for bit in (SEN_NEEDS, STAGE_BITS[1])} == {'sen_needs', 'stage_2'}
+
+    assert render_breakdown(student_record(0, NO_SEN_DATA), DEFAULT_WEIGHTINGS) == 'No SEN data found'
+    assert render_breakdown(student_record(0, 0), DEFAULT_WEIGHTINGS) == 'No specific needs identified'
+    assert student_record(0, 0)['detail'] is None
+
+
+def test_students_endpoint_renders_only_the_requested_page(school_client, monkeypatch):
+    assert school_client.post('/api/analysis/run', json={}).status_code == 200
+    rendered = []
+    render = analysis_snapshot.render_breakdown
+    monkeypatch.setattr(analysis_snapshot, 'render_breakdown',
+                        lambda record, weightings: rendered.append(record) or render(record, weightings))
+
+    response = school_client.get('/api/students?page=2&per_page=5')
+    page = response.get_json()
+    assert response.headers['X-Total-Count'] == '300'
+    assert len(page) == 5 and len(rendered) == 5
+    assert all(student['breakdown'] for student in page)
+
+    everyone = school_client.get('/api/students?breakdown=none').get_json()
+    assert len(rendered) == 5
+    assert [set(student) for student in everyone] == [{'name', 'score'}] * 300
+    assert everyone[5:10] == [{'name': s['name'], 'score': s['score']} for s in page]
+
+    factors = school_client.get('/api/students?breakdown=factors&page=2&per_page=5').get_json()
+    assert len(rendered) == 5
+    assert [s['name'] for s in factors] == [s['name'] for s in page]
+    for student, text in zip(factors, (s['breakdown'] for s in page)):
+        assert (student['factors'] & NO_SEN_DATA != 0) == (text == 'No SEN data found')
+        assert ('sen_need_count' in student) == ('SEN needs' in text)
+
+    assert school_client.get('/api/students?breakdown=html').status_code == 400
@@ -0,0 +1,53 @@
+"""Array-based ranking gives exactly the order and summary of a full stable sort"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from compact_results import StudentScores  # noqa: E402
+from ranking import top_k, top_k_students, top_positions, score_summary  # noqa: E402
+
+
+@pytest.mark.parametrize('k', [1, 3, 10, 49, 50, 200, None])
+def test_top_positions_match_stable_sort(k):
+    rng = np.random.default_rng(k or 0)
+    # Few distinct values, so most of the ranking is ties
+    values = rng.integers(0, 6, size=50).astype(float)
+    assert list(top_positions(values, k)) == list(np.argsort(-values, kind='stable')[:k])
+
+
+def table_of(scores):
+    table = StudentScores()
+    for i, score in enumerate(scores):
+        table[f'student{i}'] = {'score': score, 'factors': 0, 'detail': None}
+    return table
+
+
+def test_top_k_students_skips_removed_and_keeps_types():
+    table = table_of([3, 7.5, 7.5, 0, 9, 7.5])
+    del table['student4']
+    expected = sorted(table.items(), key=lambda item: item[1]['score'], reverse=True)
+    assert top_k_students(table, 2) == expected[:2]
+    assert top_k_students(table, None) == expected
+    assert top_k(dict(table.items()), lambda data: data['score'], 3) == expected[:3]
+
+
+def test_score_summary_bands():
+    table = table_of([0, 0, 2, 3.5, 5, 8, 12.5])
+    summary = score_summary(table, {'A': {'weighted_score': 4.0}, 'B': {'weighted_score': 6.0}})
+    assert summary == {
+        'total_students': 7,
+        'no_needs': 2,
+        'low_needs': 1,
+        'medium_needs': 1,
+        'high_needs': 2,
+        'average_score': round(31 / 7, 2),
+        'max_score': 12.5,
+        'total_classes': 2,
+        'average_class_score': 5.0
+    }
+    assert isinstance(score_summary(table_of([1, 4]), {'A': {'weighted_score': 1}})['max_score'], int)
@@ -0,0 +1,48 @@
+"""Admins profile requests on demand or arm their next analysis run; other users are never profiled"""
+
+import pytest
+
+
+@pytest.fixture
+def teacher_client(auth_app):
+    client = auth_app.app.test_client()
+    client.post('/api/auth/register', json={'username': 'teacher', 'email': 'teacher@example.com', 'password': 'pw'})
+    assert client.post('/api/auth/login', json={'username': 'teacher', 'password': 'pw'}).status_code == 200
+    return client
+
+
+def test_other_users_profile_arguments_are_ignored(teacher_client):
+    response = teacher_client.get('/api/auth/user?profile=sampling')
+    assert response.status_code == 200
+    assert 'X-Profile-Id' not in response.headers
+    assert teacher_client.post('/api/admin/profiles/arm', json={'mode': 'sampling'}).status_code == 403
+
+
+def test_admin_profiles_a_request(admin_client):
+    response = admin_client.get('/api/auth/user?profile=deterministic')
+    profile_id = response.headers['X-Profile-Id']
+    profiles = admin_client.get('/api/admin/profiles').get_json()
+    assert profile_id in [profile['id'] for profile in profiles]
+    assert admin_client.get(f'/api/admin/profiles/{profile_id}/tree').status_code == 200
+
+    assert admin_client.get('/api/auth/user?profile=everything').status_code == 400
+
+
+def test_armed_profile_applies_to_the_next_analysis_run_only(school_client):
+    assert school_client.post('/api/admin/profiles/arm', json={'mode': 'bogus'}).status_code == 400
+    assert school_client.post('/api/admin/profiles/arm', json={'mode': 'sampling'}).get_json() == {'armed': 'sampling'}
+
+    # Other requests leave it armed
+    assert 'X-Profile-Id' not in school_client.get('/api/auth/user').headers
+    response = school_client.post('/api/analysis/run', json={})
+    assert response.status_code == 200
+    profile_id = response.headers['X-Profile-Id']
+    profile = next(p for p in school_client.get('/api/admin/profiles').get_json() if p['id'] == profile_id)
+    assert (profile['mode'], profile['path']) == ('sampling', '/api/analysis/run')
+
+    assert school_client.get('/api/admin/profiles/arm').get_json() == {'armed': None}
+    assert 'X-Profile-Id' not in school_client.post('/api/analysis/run', json={}).headers
+
+    school_client.post('/api/admin/profiles/arm', json={'mode': 'deterministic'})
+    assert school_client.post('/api/admin/profiles/arm', json={'mode': None}).get_json() == {'armed': None}
+    assert 'X-Profile-Id' not in school_client.post('/api/analysis/run', json={}).headers
@@ -0,0 +1,60 @@
+"""Only one process compacts per interval, and the schedule outlives the process"""
+
+import fcntl
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from result_compaction import compact_analysis_history, run_compaction_if_due  # noqa: E402
+
+DAY = 24 * 3600
+
+
+def test_runs_at_once_then_waits_for_the_interval(tmp_path):
+    lock_path = str(tmp_path / 'compaction.lock')
+    runs = []
+
+    assert run_compaction_if_due(lock_path, DAY, lambda: runs.append(1)) == DAY
+    # A later check, e.g. from a restarted worker, finds the last run recorded
+    delay = run_compaction_if_due(lock_path, DAY, lambda: runs.append(2))
+    assert runs == [1]
+    assert 0 < delay <= DAY
+
+
+def test_skips_while_another_process_holds_the_lock(tmp_path):
+    lock_path = str(tmp_path / 'compaction.lock')
+    runs = []
+    # flock locks belong to the open file, so a second handle stands in for another worker
+    with open(lock_path, 'a+') as other_worker:
+        fcntl.flock(other_worker, fcntl.LOCK_EX)
+        assert run_compaction_if_due(lock_path, DAY, lambda: runs.append(1)) == DAY
+    assert runs == []
+
+    run_compaction_if_due(lock_path, DAY, lambda: runs.append(1))
+    assert runs == [1]
+
+
+def test_legacy_blobs_are_cleared_from_rows_that_have_every_section(auth_app):
+    from result_store import pack_results
+    AnalysisResult, db = auth_app.AnalysisResult, auth_app.db
+    results = {'statistics': {'total_students': 1}}
+    with auth_app.app.app_context():
+        auth_app.bootstrap_database()
+        admin = auth_app.User.query.filter_by(username='admin').one()
+        config = auth_app.WeightingConfig.query.filter_by(user_id=admin.id).first()
+        # Sections already written, but the legacy blob was never cleared
+        stale = AnalysisResult(school_id=1, user_id=admin.id, weighting_config_id=config.id)
+        stale.set_packed_results(*pack_results(results))
+        stale.result_json = '{"statistics": {}}'
+        legacy = AnalysisResult(
+            school_id=1, user_id=admin.id, weighting_config_id=config.id, result_json='{"statistics": {}}'
+        )
+        db.session.add_all([stale, legacy])
+        db.session.commit()
+
+        report = compact_analysis_history(db, AnalysisResult, keep_last=1000, vacuum=False)
+        assert report['legacy_rows_compacted'] >= 2
+        assert not AnalysisResult.query.filter(AnalysisResult.result_json != '').count()
+        assert db.session.get(AnalysisResult, stale.id).get_results(['statistics']) == results
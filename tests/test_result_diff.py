@@ -0,0 +1,72 @@
+"""A diff between two results lists only the rows that were added, removed, re-ranked or rescored"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from result_diff import diff_results  # noqa: E402
+
+
+def lesson(course_class, need_score, staff='Mr 1', room='R1'):
+    return {'course_class': course_class, 'staff': staff, 'room': room, 'need_score': need_score,
+            'student_count': 20, 'high_need_students': 1}
+
+
+BEFORE = {
+    'statistics': {'total_students': 4, 'average_score': 2.0, 'max_score': 6},
+    'top_students': [{'name': 'A', 'score': 6}, {'name': 'B', 'score': 3}, {'name': 'C', 'score': 1}],
+    'top_classes': [{'class_code': 'X', 'weighted_score': 5.0}, {'class_code': 'Y', 'weighted_score': 2.0}],
+    # The same lesson twice in one slot, e.g. on two days
+    'timetable_grid': {'09:00': [lesson('Ma', 5.0), lesson('Ma', 5.0), lesson('En', 2.0)]},
+}
+AFTER = {
+    'statistics': {'total_students': 4, 'average_score': 2.5, 'max_score': 6},
+    'top_students': [{'name': 'B', 'score': 7}, {'name': 'A', 'score': 6}, {'name': 'D', 'score': 2}],
+    'top_classes': [{'class_code': 'X', 'weighted_score': 5.0}, {'class_code': 'Y', 'weighted_score': 2.5}],
+    'timetable_grid': {'09:00': [lesson('Ma', 5.0), lesson('En', 2.0)]},
+}
+
+
+def by_key(rows, key):
+    return {row[key]: row for row in rows}
+
+
+def test_identical_results_have_no_changes():
+    diff = diff_results(BEFORE, BEFORE)
+    assert diff['statistics'] == {}
+    for section in ('students', 'classes', 'grid'):
+        assert diff[section]['changed'] == []
+    assert diff['students']['unchanged_count'] == 3
+
+
+def test_changed_rows():
+    diff = diff_results(BEFORE, AFTER)
+    assert diff['statistics'] == {'average_score': {'from': 2.0, 'to': 2.5, 'delta': 0.5}}
+
+    students = by_key(diff['students']['changed'], 'name')
+    assert students['B'] == {
+        'name': 'B', 'status': 'changed', 'from_rank': 2, 'to_rank': 1, 'rank_delta': 1,
+        'from_score': 3, 'to_score': 7, 'score_delta': 4
+    }
+    # Same score, lower rank
+    assert students['A']['rank_delta'] == -1 and 'score_delta' not in students['A']
+    assert students['C'] == {'name': 'C', 'status': 'removed', 'from_rank': 3, 'from_score': 1}
+    assert students['D'] == {'name': 'D', 'status': 'added', 'to_rank': 3, 'to_score': 2}
+
+    classes = diff['classes']
+    assert classes['unchanged_count'] == 1
+    assert [(row['class_code'], row['weighted_score_delta']) for row in classes['changed']] == [('Y', 0.5)]
+
+
+def test_repeated_lessons_are_matched_by_occurrence():
+    grid = diff_results(BEFORE, AFTER)['grid']['changed']
+    # The second Ma lesson went and En moved up a place
+    assert sorted((row['course_class'], row['occurrence'], row['status']) for row in grid) == [
+        ('En', 1, 'changed'), ('Ma', 2, 'removed')
+    ]
+
+
+def test_only_sections_present_in_both_are_compared():
+    diff = diff_results({'statistics': BEFORE['statistics']}, AFTER)
+    assert set(diff) == {'statistics'}
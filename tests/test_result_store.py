@@ -0,0 +1,64 @@
+"""Saved results round-trip through compressed sections, and legacy rows migrate on first read"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from result_store import RESULT_SECTIONS, pack_results, unpack_section  # noqa: E402
+
+RESULTS = {
+    'statistics': {'total_students': 3, 'average_score': 2.5, 'max_score': 6},
+    'top_students': [{'name': 'Smith, Ann', 'score': 6, 'breakdown': 'SEN (x3)'}, {'name': 'Jones, Bo', 'score': 1.5}],
+    'top_classes': [{'class_code': '7A/Ma1', 'weighted_score': 4.25, 'students': [{'name': 'Smith, Ann'}]}],
+    'timetable_grid': {'Monday_09:00 - 10:00': [{'class_code': '7A/Ma1', 'need_score': 4.25}]},
+}
+
+
+def unpacked(sections):
+    return {RESULT_SECTIONS[section]: unpack_section(blob) for section, blob in sections.items()}
+
+
+def test_sections_round_trip():
+    sections, content_hash = pack_results(RESULTS)
+    assert set(sections) == set(RESULT_SECTIONS)
+    assert unpacked(sections) == RESULTS
+
+    # The hash depends on the content only
+    assert pack_results(json.loads(json.dumps(RESULTS)))[1] == content_hash
+    changed = {**RESULTS, 'statistics': {**RESULTS['statistics'], 'max_score': 7}}
+    assert pack_results(changed)[1] != content_hash
+
+
+def test_missing_sections_round_trip_as_none():
+    sections, _ = pack_results({'statistics': RESULTS['statistics']})
+    assert unpacked(sections) == {**{key: None for key in RESULT_SECTIONS.values()}, 'statistics': RESULTS['statistics']}
+
+
+def test_legacy_row_is_migrated_on_first_read(auth_app, admin_client):
+    AnalysisResult, db = auth_app.AnalysisResult, auth_app.db
+    with auth_app.app.app_context():
+        admin = auth_app.User.query.filter_by(username='admin').one()
+        config = auth_app.WeightingConfig.query.filter_by(user_id=admin.id).first()
+        # Written before sectioned storage: one JSON blob and no section columns
+        row = AnalysisResult(
+            school_id=1, user_id=admin.id, weighting_config_id=config.id, result_json=json.dumps(RESULTS)
+        )
+        db.session.add(row)
+        db.session.commit()
+        row_id = row.id
+
+    response = admin_client.get(f'/api/analysis/results/{row_id}?sections=statistics,classes')
+    assert response.status_code == 200
+    assert response.get_json()['results'] == {
+        'statistics': RESULTS['statistics'],
+        'top_classes': RESULTS['top_classes']
+    }
+
+    with auth_app.app.app_context():
+        row = db.session.get(AnalysisResult, row_id)
+        assert row.result_json == ''
+        assert row.content_hash == pack_results(RESULTS)[1]
+        assert all(getattr(row, f'{section}_blob') is not None for section in RESULT_SECTIONS)
+        assert row.get_results() == RESULTS
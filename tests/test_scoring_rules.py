@@ -0,0 +1,101 @@
+"""Custom scoring rules score the same on every backend, and unknown columns are rejected up front"""
+
+import contextlib
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import web_ta_analyzer  # noqa: E402
+from scoring_rules import CompiledRules, validate_rules  # noqa: E402
+
+RULES = [
+    {'name': 'Young carer', 'column': 'Young Carer', 'predicate': 'equals', 'value': 'Yes', 'points': 2},
+    {'name': 'Low attendance', 'column': 'Attendance %', 'predicate': 'below', 'value': 90, 'points': 1.5},
+    {'name': 'Interventions', 'column': 'Interventions', 'predicate': 'count_list', 'points': 1},
+]
+
+
+def test_compiled_rules_match_rule_by_rule():
+    sen = pd.DataFrame({
+        'Name': ['A', 'B', 'C', 'A'],
+        'Young Carer': ['Yes', ' yes', None, 'No'],
+        'Attendance %': [95, 80, 'n/a', 50],
+        'Interventions': ['Reading, Maths', '', 'Nurture', 'Reading'],
+    })
+    compiled = CompiledRules(validate_rules(RULES), sen)
+
+    # Only A's first row counts; D has no SEN row
+    assert compiled.points_matrix(['D', 'C', 'B', 'A']).tolist() == [
+        [0, 0, 0], [0, 0, 1], [0, 1.5, 0], [2, 0, 2]
+    ]
+    assert compiled.hits('A') == [(2, 'Young carer (+2)'), (2, 'Interventions (2 items, +2)')]
+    assert compiled.hits('B') == [(1.5, 'Low attendance (80, +1.5)')]
+    assert compiled.hits('D') == []
+    assert compiled.has_hits(compiled.rows_of(['A', 'D'])).tolist() == [True, False]
+
+
+def analyze(backend, paths, rules):
+    analyzer = web_ta_analyzer.TANeedAnalyzer(backend)
+    analyzer.students_classes_file = paths['students_classes']
+    analyzer.students_sen_file = paths['students_sen']
+    analyzer.timetable_file = paths['timetable']
+    analyzer.set_scoring_rules(rules)
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer.load_data_from_files()
+        analyzer.calculate_all_student_scores()
+        analyzer.calculate_class_need_levels()
+        results = analyzer.get_analysis_results(top_students=None, top_classes=None)
+    breakdowns = {name: analyzer.get_breakdown(name) for name in analyzer.student_scores.names}
+    return results['top_students'], breakdowns
+
+
+def test_backends_agree_with_rules(school_files, tmp_path):
+    sen = pd.read_csv(school_files['students_sen'])
+    rnd = np.random.default_rng(1)
+    sen['Young Carer'] = rnd.choice(['Yes', 'No', None], len(sen))
+    sen['Attendance %'] = rnd.uniform(70, 100, len(sen)).round(1)
+    sen['Interventions'] = rnd.choice(['', 'Reading', 'Reading, Maths', None], len(sen))
+    paths = {**school_files, 'students_sen': str(tmp_path / 'students_sen.csv')}
+    sen.to_csv(paths['students_sen'], index=False)
+
+    students, breakdowns = analyze('pandas', paths, RULES)
+    assert any('Young carer' in text for text in breakdowns.values())
+    assert analyze('numpy', paths, RULES) == (students, breakdowns)
+
+
+@pytest.fixture
+def rules_reset(auth_app):
+    yield
+    with auth_app.app.app_context():
+        auth_app.ScoringRuleSet.query.delete()
+        auth_app.db.session.commit()
+
+
+def test_unknown_columns_are_rejected(auth_app, school_client, school_files, rules_reset):
+    unknown_rule = {'rules': [{'column': 'Young Carer', 'predicate': 'present'}]}
+    response = school_client.post('/api/scoring-rules', json=unknown_rule)
+    assert response.status_code == 400, response.get_json()
+    assert 'Young Carer' in response.get_json()['error']
+
+    known_rule = {'rules': [{'column': 'BOXALL', 'predicate': 'present'}]}
+    assert school_client.post('/api/scoring-rules', json=known_rule).status_code == 200
+    sen = pd.read_csv(school_files['students_sen']).drop(columns='BOXALL')
+    upload = io.BytesIO(sen.to_csv(index=False).encode())
+    response = school_client.post('/api/upload/students_sen', data={'file': (upload, 'students_sen.csv')})
+    assert response.status_code == 400
+    assert 'BOXALL' in response.get_json()['error']
+
+    # Rules saved by other means after the upload fail the run, not the server
+    with auth_app.app.app_context():
+        rule_set = auth_app.ScoringRuleSet.query.filter_by(school_id=1).one()
+        rule_set.rules_json = '[{"column": "Young Carer", "predicate": "present"}]'
+        auth_app.db.session.commit()
+    response = school_client.post('/api/analysis/run', json={})
+    assert response.status_code == 400, response.get_json()
+    assert 'Young Carer' in response.get_json()['error']
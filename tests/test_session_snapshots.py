@@ -0,0 +1,78 @@
+"""A snapshotted analyzer session comes back in a fresh analyzer with the same results
+
+The restored analyzer serves results without re-reading the uploads, and a
+later run (or delta upload) reuses its cached stages instead of recomputing.
+"""
+
+import contextlib
+import io
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(REPO_ROOT), str(REPO_ROOT / 'benchmarks')]
+
+import web_ta_analyzer  # noqa: E402
+from session_snapshots import save_session, restore_session, session_token, snapshot_path  # noqa: E402
+from synthetic_school import write_school  # noqa: E402
+
+
+def run_pipeline(analyzer):
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer.load_data_from_files()
+        analyzer.calculate_all_student_scores()
+        analyzer.calculate_class_need_levels()
+        return analyzer.get_analysis_results(None, None), analyzer.generate_timetable_grid_data()
+
+
+@pytest.fixture
+def analyzed(tmp_path):
+    paths = write_school(tmp_path / 'school', 300)
+    analyzer = web_ta_analyzer.TANeedAnalyzer()
+    analyzer.students_classes_file = paths['students_classes']
+    analyzer.students_sen_file = paths['students_sen']
+    analyzer.timetable_file = paths['timetable']
+    analyzer.set_weightings({'eal': 1.5})
+    results, grid = run_pipeline(analyzer)
+    path = snapshot_path(tmp_path / 'sessions', 'user_1')
+    save_session(analyzer, path, extra={'upload_session': ['students_sen']})
+    return analyzer, results, grid, path
+
+
+def test_restored_session_matches(analyzed):
+    analyzer, results, grid, path = analyzed
+    restored = web_ta_analyzer.TANeedAnalyzer()
+    assert restore_session(path, restored) == {'upload_session': ['students_sen']}
+
+    assert restored.students_sen is None
+    assert restored.get_analysis_results(None, None) == results
+    assert restored.generate_timetable_grid_data() == grid
+    name = next(iter(analyzer.student_scores))
+    assert restored.get_breakdown(name) == analyzer.get_breakdown(name)
+    assert session_token(restored) == session_token(analyzer)
+
+
+def test_restored_stages_stay_cached(analyzed):
+    analyzer, results, grid, path = analyzed
+    restored = web_ta_analyzer.TANeedAnalyzer()
+    restore_session(path, restored)
+    versions = dict(restored._versions)
+
+    assert run_pipeline(restored) == (results, grid)
+    assert restored.students_sen is not None
+    assert dict(restored._versions) == versions
+
+    student = restored.students_sen.iloc[[0]].assign(Action='change')
+    assert restored.apply_delta('students_sen', student)['incremental']
+
+
+def test_changed_upload_discards_snapshot(analyzed):
+    analyzer, _, _, path = analyzed
+    frame = pd.read_csv(analyzer.students_sen_file)
+    frame.iloc[1:].to_csv(analyzer.students_sen_file, index=False)
+
+    assert restore_session(path, web_ta_analyzer.TANeedAnalyzer()) is None
+    assert not Path(path).exists()
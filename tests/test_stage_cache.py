@@ -0,0 +1,83 @@
+"""Replacing one input re-runs only the stages downstream of it, with the same results as a fresh run"""
+
+import contextlib
+import io
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(REPO_ROOT), str(REPO_ROOT / 'benchmarks')]
+
+import web_ta_analyzer  # noqa: E402
+from stage_timing import StageTimer  # noqa: E402
+from synthetic_school import write_school  # noqa: E402
+
+
+def analyze(analyzer, paths):
+    """Run the pipeline, returning (stages reused, stages recomputed)"""
+    analyzer.students_classes_file = paths['students_classes']
+    analyzer.students_sen_file = paths['students_sen']
+    analyzer.timetable_file = paths['timetable']
+    analyzer.timer = StageTimer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer.load_data_from_files()
+        analyzer.calculate_all_student_scores()
+        analyzer.calculate_class_need_levels()
+        analyzer.generate_timetable_grid_data()
+    events = analyzer.timer.cache_events
+    return ({stage for (stage, result) in events if result == 'hit'},
+            {stage for (stage, result) in events if result == 'miss'})
+
+
+def results(analyzer):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return analyzer.get_analysis_results(top_students=None, top_classes=None)
+
+
+def results_of_fresh_run(paths):
+    analyzer = web_ta_analyzer.TANeedAnalyzer()
+    analyze(analyzer, paths)
+    return results(analyzer)
+
+
+@pytest.fixture
+def school(tmp_path):
+    return write_school(tmp_path / 'school', 300)
+
+
+def test_new_timetable_reuses_student_stages(school, tmp_path):
+    analyzer = web_ta_analyzer.TANeedAnalyzer()
+    analyze(analyzer, school)
+
+    timetable = tmp_path / 'timetable.csv'
+    pd.read_csv(school['timetable']).iloc[::2].to_csv(timetable, index=False)
+    changed = {**school, 'timetable': str(timetable)}
+    reused, recomputed = analyze(analyzer, changed)
+    assert {'student_scores', 'memberships', 'class_aggregates'} <= reused
+    assert {'class_scores', 'grid'} <= recomputed
+    assert results(analyzer) == results_of_fresh_run(changed)
+
+
+def test_new_weightings_reuse_memberships(school):
+    analyzer = web_ta_analyzer.TANeedAnalyzer()
+    analyze(analyzer, school)
+
+    analyzer.set_weightings({'eal': 4})
+    reused, recomputed = analyze(analyzer, school)
+    assert 'memberships' in reused
+    assert {'student_scores', 'class_aggregates', 'class_scores', 'grid'} <= recomputed
+
+    fresh = web_ta_analyzer.TANeedAnalyzer()
+    fresh.set_weightings({'eal': 4})
+    analyze(fresh, school)
+    assert results(analyzer) == results(fresh)
+
+
+def test_unchanged_inputs_recompute_nothing(school):
+    analyzer = web_ta_analyzer.TANeedAnalyzer()
+    analyze(analyzer, school)
+    _, recomputed = analyze(analyzer, school)
+    assert recomputed == set()
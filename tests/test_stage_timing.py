@@ -0,0 +1,42 @@
+"""Stage timings add up without double counting and are reported in Server-Timing when STAGE_TIMING is on"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stage_timing import STAGES, StageTimer  # noqa: E402
+
+
+def parse_server_timing(header):
+    entries = (entry.split(';dur=') for entry in header.split(', '))
+    return {name: float(duration) for name, duration in entries}
+
+
+def test_nested_stages_are_charged_their_own_time():
+    timer = StageTimer()
+    with timer.stage('class_aggregation'):
+        time.sleep(0.02)
+        with timer.stage('score'):
+            time.sleep(0.05)
+    with timer.stage('score'):
+        time.sleep(0.01)
+
+    assert 0.02 <= timer.durations['class_aggregation'] < 0.05
+    assert timer.durations['score'] >= 0.06
+    assert parse_server_timing(timer.server_timing(0.5)).keys() == {'class_aggregation', 'score', 'total'}
+
+
+def test_analysis_run_reports_its_stages(auth_app, school_client, monkeypatch):
+    # The files were just uploaded, so every stage runs rather than coming from the cache
+    monkeypatch.setitem(auth_app.app.config, 'STAGE_TIMING', True)
+    response = school_client.post('/api/analysis/run', json={})
+    assert response.status_code == 200
+
+    timings = parse_server_timing(response.headers['Server-Timing'])
+    assert {'load', 'score', 'class_aggregation', 'serialise'} <= timings.keys() <= set(STAGES) | {'total'}
+    assert sum(duration for name, duration in timings.items() if name != 'total') <= timings['total'] + 0.5
+
+    monkeypatch.setitem(auth_app.app.config, 'STAGE_TIMING', False)
+    assert 'Server-Timing' not in school_client.post('/api/analysis/run', json={}).headers
@@ -0,0 +1,149 @@
+"""Sweeps and robustness reports rank classes exactly as a real analysis run does
+
+A sweep at the analyzer's current weightings must reproduce the top classes
+of get_analysis_results under the school's class filters and class
+aggregation strategy.
+"""
+
+import contextlib
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(REPO_ROOT), str(REPO_ROOT / 'benchmarks')]
+
+import web_ta_analyzer  # noqa: E402
+from class_aggregation import CLASS_AGGREGATION_STRATEGIES, aggregate_classes  # noqa: E402
+from synthetic_school import write_school  # noqa: E402
+from weight_robustness import run_robustness_analysis  # noqa: E402
+from weighting_sweep import run_weighting_sweep  # noqa: E402
+
+TOP_K = 15
+
+
+@pytest.fixture(scope='module')
+def school(tmp_path_factory):
+    return write_school(tmp_path_factory.mktemp('school'), 400)
+
+
+def analyzed(school, class_filters, class_aggregation=None):
+    analyzer = web_ta_analyzer.TANeedAnalyzer()
+    analyzer.students_classes_file = school['students_classes']
+    analyzer.students_sen_file = school['students_sen']
+    analyzer.timetable_file = school['timetable']
+    analyzer.set_class_filters(class_filters)
+    analyzer.set_class_aggregation(class_aggregation or {})
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer.load_data_from_files()
+        analyzer.calculate_all_student_scores()
+        analyzer.calculate_class_need_levels()
+    return analyzer
+
+
+def expected_top_classes(analyzer):
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = analyzer.get_analysis_results(top_classes=TOP_K)
+    return [(data['class_code'], data['weighted_score']) for data in results['top_classes']]
+
+
+@pytest.mark.parametrize('class_filters, class_aggregation', [
+    ({}, None),
+    ({'size_factor_divisor': 5}, None),
+    ({}, 'average'),
+    ({}, {'strategy': 'top_n_sum', 'top_n': 4}),
+    ({}, {'strategy': 'percentile', 'percentile': 75}),
+    ({'high_need_threshold': 3}, 'count_above_threshold'),
+])
+def test_sweep_at_current_weights_matches_run(school, class_filters, class_aggregation):
+    analyzer = analyzed(school, class_filters, class_aggregation)
+    sweep = run_weighting_sweep(
+        analyzer.get_student_features(), analyzer.get_class_incidence(),
+        [analyzer.weightings], ['current'], top_k=TOP_K
+    )
+    top_classes = [(data['class_code'], data['weighted_score']) for data in sweep['configs'][0]['top_classes']]
+    assert top_classes == expected_top_classes(analyzer)
+
+
+@pytest.mark.parametrize('class_aggregation', [None, {'strategy': 'percentile', 'percentile': 90}])
+def test_robustness_base_ranks_match_run(school, class_aggregation):
+    analyzer = analyzed(school, {'size_factor_divisor': 5}, class_aggregation)
+    report = run_robustness_analysis(
+        analyzer.get_student_features(), analyzer.get_class_incidence(), analyzer.weightings,
+        samples=50, top_n=TOP_K, seed=1
+    )
+    base = sorted((data['base_rank'], data['class_code'], data['base_weighted_score'])
+                  for data in report['classes'] if data['base_rank'] <= TOP_K)
+    assert [(code, score) for _, code, score in base] == expected_top_classes(analyzer)
+
+
+def test_matrix_aggregation_matches_each_column(school):
+    analyzer = analyzed(school, {})
+    features, incidence = analyzer.get_student_features(), analyzer.get_class_incidence()
+    scores = features.score_matrix([analyzer.weightings, {**analyzer.weightings, 'eal': 4, 'boxall': 0.5}])
+    strategies = sorted(CLASS_AGGREGATION_STRATEGIES)
+    together = aggregate_classes(incidence, scores, strategies, incidence.params)
+    for column in range(scores.shape[1]):
+        alone = aggregate_classes(incidence, scores[:, column], strategies, incidence.params)
+        for name in strategies:
+            assert together[name][:, column].tolist() == alone[name].tolist(), name
+
+
+@pytest.mark.parametrize('top_k, top_band', [(0, None), (-3, None), (5, 0), (5, -1)])
+def test_sweep_rejects_empty_bands(school, top_k, top_band):
+    analyzer = analyzed(school, {})
+    with pytest.raises(ValueError):
+        run_weighting_sweep(analyzer.get_student_features(), analyzer.get_class_incidence(),
+                            [analyzer.weightings], ['current'], top_k=top_k, top_band=top_band)
+
+
+@pytest.mark.parametrize('body', [
+    {'weightings': [{}], 'top_k': 0},
+    {'weightings': [{}], 'top_k': -2},
+    {'weightings': [{}], 'top_band': 0},
+    {'weightings': [1]},
+    {'weightings': ['eal']},
+    {'weightings': [{'config': [1, 2]}]},
+    {'weightings': {'config': {}}},
+])
+def test_sweep_route_rejects_bad_requests(school_client, body):
+    response = school_client.post('/api/analysis/sweep', json=body)
+    assert response.status_code == 400, response.get_json()
+
+
+def test_sweep_route(school_client):
+    response = school_client.post('/api/analysis/sweep', json={
+        'weightings': [{'name': 'default'}, {'config': {'eal': 4}}], 'top_k': 3, 'top_band': 5
+    })
+    assert response.status_code == 200
+    sweep = response.get_json()
+    assert [len(config['top_classes']) for config in sweep['configs']] == [3, 3]
+    assert sweep['top_band'] == 5
+
+
+def test_robustness_report_does_not_depend_on_worker_count(school, monkeypatch):
+    import weight_robustness
+    analyzer = analyzed(school, {})
+    features, incidence = analyzer.get_student_features(), analyzer.get_class_incidence()
+
+    def report(workers):
+        result = run_robustness_analysis(features, incidence, analyzer.weightings,
+                                         samples=600, top_n=TOP_K, seed=7, workers=workers)
+        del result['duration_seconds']
+        return result
+
+    serial = report(1)
+    assert serial['workers'] == 1
+    # Small enough to stay in the calling thread, whatever the worker count
+    assert report(2) == serial
+
+    monkeypatch.setattr(weight_robustness, 'PARALLEL_MIN_WORK', 0)
+    pooled = report(2)
+    assert pooled.pop('workers') == 2
+    assert pooled == {key: value for key, value in serial.items() if key != 'workers'}
+    # Later runs reuse the pool
+    pool = weight_robustness._pool
+    report(2)
+    assert weight_robustness._pool is pool
@@ -0,0 +1,108 @@
+"""Results written behind the response are never lost and are readable from every worker until written"""
+
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from write_behind import WriteBehindQueue  # noqa: E402
+
+
+def blocking_writer(release, written):
+    def write(item):
+        release.wait(10)
+        written.append(item)
+    return write
+
+
+def test_queued_and_in_flight_items_survive_a_timed_out_stop(tmp_path):
+    release, started, written = threading.Event(), threading.Event(), []
+    write = blocking_writer(release, written)
+    queue = WriteBehindQueue(lambda item: (started.set(), write(item)), str(tmp_path))
+    queue.start()
+    queue.submit(1, {'n': 1})
+    queue.submit(2, {'n': 2})
+    assert started.wait(5)
+    # Item 1 is being written and item 2 is still queued
+    queue.stop(timeout=0.1)
+
+    replayed = []
+    next_worker = WriteBehindQueue(replayed.append, str(tmp_path))
+    next_worker.start()
+    assert next_worker.flush(5)
+    release.set()
+    assert sorted(item['n'] for item in replayed) == [1, 2]
+    next_worker.stop()
+
+
+def test_items_given_up_on_leave_memory_but_stay_journaled(tmp_path):
+    def failing(item):
+        raise RuntimeError('database unavailable')
+
+    queue = WriteBehindQueue(failing, str(tmp_path), max_attempts=2, retry_delay=0)
+    queue.start()
+    queue.submit('a', {'n': 1})
+    assert queue.flush(5)
+    assert queue.pending_count() == 0
+    assert queue.get_pending('a') == {'n': 1}
+    queue.stop()
+
+    replayed = []
+    next_worker = WriteBehindQueue(replayed.append, str(tmp_path))
+    next_worker.start()
+    assert next_worker.flush(5)
+    assert replayed == [{'n': 1}]
+    assert next_worker.get_pending('a') is None
+    next_worker.stop()
+
+
+def test_other_workers_read_but_do_not_replay_a_running_queue(tmp_path):
+    release, written, replayed = threading.Event(), [], []
+    worker = WriteBehindQueue(blocking_writer(release, written), str(tmp_path))
+    worker.start()
+    worker.submit(7, {'n': 7})
+
+    other_worker = WriteBehindQueue(replayed.append, str(tmp_path))
+    other_worker.start()
+    assert other_worker.flush(5)
+    assert other_worker.get_pending(7) == {'n': 7}
+    assert replayed == []
+
+    release.set()
+    assert worker.flush(5)
+    assert written == [{'n': 7}]
+    assert other_worker.get_pending(7) is None
+    worker.stop()
+    other_worker.stop()
+
+
+def default_config_id(auth_app):
+    with auth_app.app.app_context():
+        admin = auth_app.User.query.filter_by(username='admin').one()
+        return auth_app.WeightingConfig.query.filter_by(user_id=admin.id, is_default=True).one().id
+
+
+def test_result_id_is_a_row_id_that_resolves_before_the_write(auth_app, school_client, monkeypatch):
+    release = threading.Event()
+    write = auth_app.result_writer.write_fn
+    monkeypatch.setattr(auth_app.result_writer, 'write_fn', lambda item: (release.wait(10), write(item)))
+    # Identical results are deduplicated, so make this run's results unique
+    run = {'weighting_config_id': default_config_id(auth_app), 'top_students': 7}
+
+    response = school_client.post('/api/analysis/run', json=run).get_json()
+    result_id = response['result_id']
+    assert isinstance(result_id, int)
+
+    pending = school_client.get(f'/api/analysis/results/{result_id}?sections=students,classes').get_json()
+    assert pending['pending']
+    assert pending['results'] == {key: response['results'][key] for key in ('top_students', 'top_classes')}
+
+    release.set()
+    assert auth_app.result_writer.flush(10)
+    saved = school_client.get(f'/api/analysis/results/{result_id}?sections=students,classes').get_json()
+    assert not saved['pending']
+    assert saved['results'] == pending['results']
+
+    # An identical re-run reuses the row
+    assert school_client.post('/api/analysis/run', json=run).get_json()['result_id'] == result_id
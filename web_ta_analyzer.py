@@ -1,65 +1,219 @@
+import os
+import copy
+import threading
 import pandas as pd
 import numpy as np
 from collections import defaultdict
 import re
+from need_features import StudentFeatures, ClassIncidence, MEDICAL_COLS, STAGE_COLS
+from analysis_settings import (  # noqa: F401  (re-exported for existing imports)
+    DEFAULT_WEIGHTINGS, CLASS_FILTER_DEFAULTS, INPUT_FRAMES, DELTA_FILE_TYPES, validate_class_filters
+)
+from compact_results import StringPool, StudentScores, ClassSummary
+from analysis_snapshot import AnalysisSnapshot
+from compute_backends import get_compute_backend
+from stage_timing import NULL_TIMER, timed_stage
+from ranking import DEFAULT_TOP_K, top_k, top_k_students, score_summary
+from class_aggregation import DEFAULT_CLASS_AGGREGATION, aggregate_classes, validate_class_aggregation
+from scoring_rules import CompiledRules, validate_rules
+from need_breakdown import (
+    PUPIL_PREMIUM, LOOKED_AFTER, SEN_NEEDS, EAL, LOW_READING, LOW_SPELLING, BOXALL,
+    MEDICAL_BITS, STAGE_BITS, NO_SEN_DATA,
+    student_record, render_breakdown
+)
+
+# Settings versioned like input frames
+INPUT_SETTINGS = ('weightings', 'class_filters', 'class_aggregation', 'scoring_rules')
+
+# Derived stages and what each is computed from. A stage is only recomputed
+# when one of its inputs has a newer version than the one it was built from,
+# so replacing a single file re-runs just the stages downstream of it.
+STAGE_INPUTS = {
+    'roster': ('students_classes', 'students_sen'),
+    'student_scores': ('students_sen', 'roster', 'weightings', 'scoring_rules'),
+    'memberships': ('students_classes',),
+    'class_aggregates': ('student_scores', 'memberships'),
+    'class_scores': ('class_aggregates', 'timetable', 'class_filters', 'class_aggregation'),
+    'grid': ('class_scores', 'timetable', 'class_filters'),
+}
+
+# Delta uploads: one row per added/changed/removed student, keyed by Name
+DELTA_ACTION_COLUMN = 'Action'
+DELTA_ACTIONS = {
+    'add': 'add', 'added': 'add',
+    'change': 'change', 'changed': 'change', 'update': 'change',
+    'remove': 'remove', 'removed': 'remove', 'delete': 'remove'
+}
 
 class TANeedAnalyzer:
-    def __init__(self):
+    def __init__(self, backend=None):
+        # How scores and class reductions are computed (see compute_backends);
+        # every backend gives identical results
+        self.backend = get_compute_backend(backend)
         self.students_classes = None
         self.students_sen = None
         self.timetable = None
-        self.student_scores = {}
+        self.student_scores = StudentScores()
         self.class_scores = {}
+        self._reset_stage_cache()
+        # The last complete analysis, for readers; replaced whole by publish(), never modified
+        self.snapshot = AnalysisSnapshot(self.student_scores, self.class_scores)
+        # Held by anything that changes the analyzer; readers use snapshot instead
+        self.write_lock = threading.RLock()
+        # Per-request stage timings (see stage_timing); a no-op unless enabled
+        self.timer = NULL_TIMER
         
         # File paths for uploaded files
         self.students_classes_file = None
         self.students_sen_file = None
         self.timetable_file = None
         
-        # Configurable weightings
-        self.weightings = {
-            'pupil_premium': 2,
-            'looked_after': 3,
-            'sen_needs_multiplier': 3,
-            'eal': 1,
-            'reading_threshold': 85,
-            'reading_score': 2,
-            'spelling_threshold': 85,
-            'spelling_score': 2,
-            'boxall': 2,
-            'medical_info': 1,
-            'stage_support': 1
-        }
+        # Configurable weightings, class filters and class priority strategy
+        self.weightings = dict(DEFAULT_WEIGHTINGS)
+        self.class_filters = dict(CLASS_FILTER_DEFAULTS)
+        self.class_aggregation = dict(DEFAULT_CLASS_AGGREGATION)
+        # School-defined need factors scored after the built-in ones
+        self.scoring_rules = []
     
     def set_weightings(self, weightings):
         """Update the weighting configuration"""
         self.weightings.update(weightings)
     
+    def set_class_filters(self, class_filters):
+        """Update the class size cap, high-need threshold, size factor or tutor slot"""
+        self.class_filters.update(validate_class_filters(class_filters))
+    
+    def set_class_aggregation(self, class_aggregation):
+        """Choose how class priority (weighted_score) is computed; unset keys revert to defaults"""
+        self.class_aggregation = {**DEFAULT_CLASS_AGGREGATION, **validate_class_aggregation(class_aggregation)}
+    
+    def set_scoring_rules(self, rules):
+        """Replace the custom scoring rules (see scoring_rules.validate_rules)"""
+        self.scoring_rules = validate_rules(rules)
+    
+    def _reset_stage_cache(self):
+        """Forget every cached intermediate and its input versions"""
+        self._versions = defaultdict(int)
+        self._computed_from = {}
+        self._input_objects = {}
+        self._file_fingerprints = {}
+        self._roster = set()
+        self._class_memberships = {}
+        self._student_memberships = {}
+        self._class_aggregates = {}
+        self._class_time_slots = {}
+        self._timetable_grid = None
+        self._grid_rows_by_class = {}
+        # Timetable row of each grid lesson, aligned with the slot's lesson list
+        self._grid_slot_rows = {}
+        # Staff, room and time slot strings of the grid lessons, stored once each
+        self._grid_strings = StringPool()
+        self._features = None
+        self._features_key = None
+        self._incidence = None
+        self._incidence_key = None
+        self._compiled_rules = None
+        self._compiled_rules_key = None
+        # Deep frame sizes for estimated_bytes, keyed by the frame they measured
+        self._frame_bytes = {}
+        # Files a restored session's stages were computed from (see session_snapshots)
+        self._restored_fingerprints = {}
+        # Weightings the current student_scores were computed with, for rendering breakdowns
+        self._scored_weightings = dict(DEFAULT_WEIGHTINGS)
+    
+    def _sync_inputs(self):
+        """Bump the version of any input frame or weighting replaced since the last stage ran"""
+        for name in INPUT_FRAMES:
+            frame = getattr(self, name)
+            if frame is not self._input_objects.get(name):
+                self._input_objects[name] = frame
+                self._versions[name] += 1
+                if name == 'timetable':
+                    self._class_time_slots = {}
+        
+        for name in INPUT_SETTINGS:
+            settings = getattr(self, name)
+            if settings != self._input_objects.get(name):
+                self._input_objects[name] = copy.deepcopy(settings)
+                self._versions[name] += 1
+    
+    def _stage_inputs(self, stage):
+        return tuple(self._versions[name] for name in STAGE_INPUTS[stage])
+    
+    def _is_stale(self, stage):
+        return self._computed_from.get(stage) != self._stage_inputs(stage)
+    
+    def _can_reuse(self, stage, available=True):
+        """Whether a stage's cached result is current, counted as a cache hit or miss"""
+        hit = available and not self._is_stale(stage)
+        self.timer.record_cache(stage, hit)
+        return hit
+    
+    def _mark_computed(self, stage, inputs, changed=True):
+        self._computed_from[stage] = inputs
+        if changed:
+            self._versions[stage] += 1
+    
     def clear_analysis_data(self):
         """Clear all analysis data and file references"""
         self.students_classes = None
         self.students_sen = None
         self.timetable = None
-        self.student_scores = {}
+        self.student_scores = StudentScores()
         self.class_scores = {}
         self.students_classes_file = None
         self.students_sen_file = None
         self.timetable_file = None
+        self._reset_stage_cache()
+        self.snapshot = AnalysisSnapshot(self.student_scores, self.class_scores)
         print("Cleared all previous analysis data")
     
+    def publish(self):
+        """Swap in a snapshot of the current analysis, if every stage up to class_scores is current
+
+        The grid is included when it was built from these class scores.
+        Stages are never modified once published (later runs and deltas
+        build new objects), so the swap is a single attribute assignment.
+        """
+        self._sync_inputs()
+        if any(self._is_stale(stage) for stage in STAGE_INPUTS if stage != 'grid'):
+            return
+        grid_current = self._timetable_grid is not None and not self._is_stale('grid')
+        self.snapshot = AnalysisSnapshot(
+            self.student_scores, self.class_scores,
+            self._timetable_grid if grid_current else None,
+            self._scored_weightings
+        )
+    
+    def _file_fingerprint(self, path):
+        stat = os.stat(path)
+        return (path, stat.st_size, stat.st_mtime_ns)
+    
+    @timed_stage('load')
     def load_data_from_files(self):
-        """Load data from uploaded files"""
+        """Load data from uploaded files, re-reading only files that changed"""
         if not all([self.students_classes_file, self.students_sen_file, self.timetable_file]):
             raise ValueError("Missing required data files")
         
         print("Loading data files...")
-        self.students_classes = pd.read_csv(self.students_classes_file)
-        self.students_sen = pd.read_csv(self.students_sen_file)
-        self.timetable = pd.read_csv(self.timetable_file)
-        
-        print(f"Loaded {len(self.students_classes)} student-class records")
-        print(f"Loaded {len(self.students_sen)} student SEN records")
-        print(f"Loaded {len(self.timetable)} timetable entries")
+        labels = {
+            'students_classes': 'student-class records',
+            'students_sen': 'student SEN records',
+            'timetable': 'timetable entries'
+        }
+        for name in INPUT_FRAMES:
+            path = getattr(self, f'{name}_file')
+            fingerprint = self._file_fingerprint(path)
+            if getattr(self, name) is not None and self._file_fingerprints.get(name) == fingerprint:
+                print(f"Reusing {len(getattr(self, name))} {labels[name]} (file unchanged)")
+                continue
+            
+            setattr(self, name, pd.read_csv(path))
+            self._file_fingerprints[name] = fingerprint
+            if self._restored_fingerprints.pop(name, None) == fingerprint:
+                # Same file the restored stages were built from, so they stay current
+                self._input_objects[name] = getattr(self, name)
+            print(f"Loaded {len(getattr(self, name))} {labels[name]}")
     
     def load_data(self):
         """Load all three CSV files (legacy method)"""
@@ -71,84 +225,177 @@ class TANeedAnalyzer:
         print(f"Loaded {len(self.students_sen)} student SEN records")
         print(f"Loaded {len(self.timetable)} timetable entries")
     
-    def calculate_student_need_score(self, student_name):
-        """Calculate need score for a single student using configurable weightings"""
+    def score_student(self, student_name):
+        """Score one student from the SEN frame as a compact record (see need_breakdown)"""
         student_row = self.students_sen[self.students_sen['Name'] == student_name]
         if student_row.empty:
-            return 0, "No SEN data found"
+            return student_record(0, NO_SEN_DATA)
         
         row = student_row.iloc[0]
         score = 0
-        breakdown = []
+        factors = 0
+        sen_need_count = reading = spelling = None
         
         # Pupil Premium
         if row['Pupil Premium Recipient at any time this academic year?'] == 'Yes':
             score += self.weightings['pupil_premium']
-            breakdown.append(f"Pupil Premium (+{self.weightings['pupil_premium']})")
+            factors |= PUPIL_PREMIUM
         
         # Looked After status
         if not pd.isna(row['Looked After (In Care) Status']) and row['Looked After (In Care) Status'] != '':
             score += self.weightings['looked_after']
-            breakdown.append(f"Looked After/In Care (+{self.weightings['looked_after']})")
+            factors |= LOOKED_AFTER
         
         # SEN needs
         if row['SEN at any time this academic year?'] == 'Yes':
             sen_needs = str(row['SEN need(s)'])
             if not pd.isna(sen_needs) and sen_needs != '':
-                need_count = len([n for n in sen_needs.split(',') if n.strip()])
-                points = need_count * self.weightings['sen_needs_multiplier']
-                score += points
-                breakdown.append(f"SEN needs ({need_count} types, +{points})")
+                sen_need_count = len([n for n in sen_needs.split(',') if n.strip()])
+                score += sen_need_count * self.weightings['sen_needs_multiplier']
+                factors |= SEN_NEEDS
         
         # EAL
         if row['EAL at any time this academic year?'] == 'Yes':
             score += self.weightings['eal']
-            breakdown.append(f"EAL (+{self.weightings['eal']})")
+            factors |= EAL
         
         # Low reading comprehension
         reading_score = row['Read. Comp. Standardised Score']
         if not pd.isna(reading_score) and isinstance(reading_score, (int, float)) and reading_score < self.weightings['reading_threshold']:
             score += self.weightings['reading_score']
-            breakdown.append(f"Low reading comp ({reading_score}, +{self.weightings['reading_score']})")
+            factors |= LOW_READING
+            reading = reading_score
         
         # Low spelling
         spelling_score = row['Spelling Standardised Score']
         if not pd.isna(spelling_score) and isinstance(spelling_score, (int, float)) and spelling_score < self.weightings['spelling_threshold']:
             score += self.weightings['spelling_score']
-            breakdown.append(f"Low spelling ({spelling_score}, +{self.weightings['spelling_score']})")
+            factors |= LOW_SPELLING
+            spelling = spelling_score
         
         # BOXALL assessment present
         if not pd.isna(row['BOXALL']) and str(row['BOXALL']).strip() not in ['', '.']:
             score += self.weightings['boxall']
-            breakdown.append(f"BOXALL assessment (+{self.weightings['boxall']})")
+            factors |= BOXALL
         
         # Medical/Health information
-        medical_cols = ['Neurodiversity and/or Sensory Impairment', 'Medical Information', 'Health Care Plan/Risk Assessment']
-        for col in medical_cols:
+        for bit, col in zip(MEDICAL_BITS, MEDICAL_COLS):
             if not pd.isna(row[col]) and str(row[col]).strip() not in ['', '.']:
                 score += self.weightings['medical_info']
-                breakdown.append(f"{col.split('/')[0]} (+{self.weightings['medical_info']})")
+                factors |= bit
         
         # Support stages
-        stage_cols = ['Stage 1', 'Stage 2', 'Stage 3', 'Stage 4', 'Stage 5']
-        for i, col in enumerate(stage_cols, 1):
+        for bit, col in zip(STAGE_BITS, STAGE_COLS):
             if not pd.isna(row[col]) and str(row[col]).strip() not in ['', '.']:
                 score += self.weightings['stage_support']
-                breakdown.append(f"Stage {i} support (+{self.weightings['stage_support']})")
+                factors |= bit
         
-        return score, "; ".join(breakdown) if breakdown else "No specific needs identified"
+        # School-defined rules, evaluated once per SEN frame
+        custom_labels = []
+        compiled_rules = self.get_compiled_rules()
+        if compiled_rules:
+            for points, label in compiled_rules.hits(student_name):
+                score += points
+                custom_labels.append(label)
+        
+        return student_record(score, factors, sen_need_count, reading, spelling, custom_labels)
+    
+    def calculate_student_need_score(self, student_name):
+        """Calculate need score and breakdown text for a single student using configurable weightings"""
+        record = self.score_student(student_name)
+        return record['score'], render_breakdown(record, self.weightings)
+    
+    def get_breakdown(self, student_name):
+        """Breakdown text for a scored student, rendered on demand"""
+        return render_breakdown(self.student_scores[student_name], self._scored_weightings)
+    
+    def estimated_bytes(self):
+        """Approximate memory held by the input frames and the result arrays"""
+        total = 0
+        for name in INPUT_FRAMES:
+            frame = getattr(self, name)
+            if frame is None:
+                continue
+            cached = self._frame_bytes.get(name)
+            if cached is None or cached[0] is not frame:
+                cached = self._frame_bytes[name] = (frame, int(frame.memory_usage(deep=True).sum()))
+            total += cached[1]
+        total += self.student_scores.nbytes
+        # Called without the write lock; the aggregates dict is replaced, never modified
+        total += sum(aggregate.nbytes for aggregate in self._class_aggregates.values())
+        return total
+    
+    def roster(self):
+        """Every student named in either file, in scoring order"""
+        return list(self._roster)
     
+    def _update_roster(self):
+        """Every student named in either file; only versioned when the set changes"""
+        if not self._is_stale('roster'):
+            return
+        inputs = self._stage_inputs('roster')
+        unique_students = set(self.students_classes['Name'].unique()) | set(self.students_sen['Name'].unique())
+        changed = unique_students != self._roster
+        if changed:
+            self._roster = unique_students
+        self._mark_computed('roster', inputs, changed)
+    
+    @timed_stage('score')
     def calculate_all_student_scores(self):
         """Calculate need scores for all students"""
-        print("Calculating student need scores...")
-        unique_students = set(self.students_classes['Name'].unique()) | set(self.students_sen['Name'].unique())
-        
-        for student in unique_students:
-            score, breakdown = self.calculate_student_need_score(student)
-            self.student_scores[student] = {'score': score, 'breakdown': breakdown}
+        self._sync_inputs()
+        self._update_roster()
+        if self._can_reuse('student_scores'):
+            print(f"Reusing scores for {len(self.student_scores)} students (SEN data and weightings unchanged)")
+            return
         
+        print("Calculating student need scores...")
+        inputs = self._stage_inputs('student_scores')
+        self.student_scores = self.backend.score_students(self)
+        self._scored_weightings = dict(self.weightings)
+        self._mark_computed('student_scores', inputs)
         print(f"Calculated scores for {len(self.student_scores)} students")
     
+    def get_compiled_rules(self):
+        """The custom scoring rules compiled against the current SEN frame, or None"""
+        if not self.scoring_rules:
+            return None
+        # Checked against the frame itself so delta patches recompile before rescoring
+        frame, rules = self._compiled_rules_key or (None, None)
+        if self._compiled_rules is None or frame is not self.students_sen or rules != self.scoring_rules:
+            self._compiled_rules = CompiledRules(self.scoring_rules, self.students_sen)
+            self._compiled_rules_key = (self.students_sen, copy.deepcopy(self.scoring_rules))
+        return self._compiled_rules
+    
+    def get_student_features(self):
+        """Need factors for every student, rebuilt only when SEN data, rules or the roster change"""
+        self._sync_inputs()
+        self._update_roster()
+        key = (self._versions['students_sen'], self._versions['roster'], self._versions['scoring_rules'])
+        if self._features_key != key:
+            names = list(self._roster)
+            compiled_rules = self.get_compiled_rules()
+            custom_points = compiled_rules.points_matrix(names) if compiled_rules else None
+            self._features = StudentFeatures(self.students_sen, names, custom_points)
+            self._features_key = key
+        return self._features
+    
+    def get_class_incidence(self):
+        """Membership arrays for the classes that passed filtering in the last run, indexing the features
+        
+        Built from the ranked classes' member id arrays, with student ids
+        mapped to feature rows in one vectorised lookup.
+        """
+        features = self.get_student_features()
+        key = (self._versions['class_scores'], self._features_key)
+        if self._incidence_key != key:
+            incidence = self._ranked_class_incidence()
+            feature_rows = pd.Index(features.names).get_indexer(self.student_scores.names)
+            incidence.member_index = feature_rows[incidence.member_index]
+            self._incidence = incidence
+            self._incidence_key = key
+        return self._incidence
+    
     def extract_classes_from_string(self, class_string):
         """Extract individual class codes from the classes string, retaining year group format"""
         if pd.isna(class_string):
@@ -172,104 +419,410 @@ class TANeedAnalyzer:
         
         return list(set(classes))
     
-    def calculate_class_need_levels(self):
-        """Calculate need levels for all classes"""
-        print("Calculating class need levels...")
-        class_students = defaultdict(list)
+    @timed_stage('class_aggregation')
+    def _update_class_memberships(self):
+        """Map each class to its enrolled students, in enrolment file order"""
+        if self._can_reuse('memberships'):
+            print(f"Reusing class memberships for {len(self._class_memberships)} classes (enrolments unchanged)")
+            return
+        inputs = self._stage_inputs('memberships')
+        memberships = defaultdict(list)
+        student_memberships = defaultdict(list)
         
         for _, row in self.students_classes.iterrows():
             student = row['Name']
-            classes = self.extract_classes_from_string(row['Courses/classes'])
-            
-            for class_code in classes:
-                if student in self.student_scores:
-                    class_students[class_code].append({
-                        'name': student,
-                        'score': self.student_scores[student]['score']
-                    })
+            for class_code in self.extract_classes_from_string(row['Courses/classes']):
+                memberships[class_code].append(student)
+                student_memberships[student].append(class_code)
         
+        self._class_memberships = dict(memberships)
+        self._student_memberships = dict(student_memberships)
+        self._mark_computed('memberships', inputs)
+    
+    def _member_ids(self, class_code):
+        """Interned ids of a class's scored students, in enrolment order"""
+        ids = self.student_scores.ids
+        return [ids[student] for student in self._class_memberships.get(class_code, []) if student in ids]
+    
+    def _build_class_aggregate(self, class_code):
+        """Filter-independent totals for one class, or None when it has no scored students"""
+        return self.backend.aggregate_classes(self.student_scores, {class_code: self._member_ids(class_code)}).get(class_code)
+    
+    def _class_summary(self, class_code, aggregate):
+        """Apply the class filters to a cached aggregate
+        
+        Returns (summary, excluded) where excluded marks oversized classes
+        (assemblies) and tutor periods.
+        """
+        filters = self.class_filters
+        student_count = len(aggregate)
+        if student_count > filters['max_class_size']:
+            return None, True
+        
+        is_tutor_time = self.is_tutor_time_class(class_code)
+        if is_tutor_time:
+            return None, True
+        
+        avg_score = aggregate.total / student_count
+        sorted_scores = aggregate.sorted_scores
+        high_need_count = student_count - int(np.searchsorted(sorted_scores, filters['high_need_threshold']))
+        
+        weighted_score = avg_score * (1 + student_count / filters['size_factor_divisor'])
+        
+        return ClassSummary(
+            aggregate,
+            student_count=student_count,
+            total_need_score=aggregate.total,
+            average_need_score=round(avg_score, 2),
+            max_need_score=aggregate.max,
+            high_need_students=high_need_count,
+            weighted_score=round(weighted_score, 2)
+        ), False
+    
+    def _aggregate_class(self, class_code, aggregates):
+        """Refresh one class's aggregate in aggregates and return (summary, excluded)"""
+        aggregate = self._build_class_aggregate(class_code)
+        if aggregate is None:
+            aggregates.pop(class_code, None)
+            return None, False
+        aggregates[class_code] = aggregate
+        return self._class_summary(class_code, aggregate)
+    
+    @timed_stage('class_aggregation')
+    def _update_class_aggregates(self):
+        """Rebuild per-class totals when student scores or memberships change"""
+        if self._can_reuse('class_aggregates'):
+            return
+        inputs = self._stage_inputs('class_aggregates')
+        # One CSR pass over every class's member ids
+        self._class_aggregates = self.backend.aggregate_classes(
+            self.student_scores,
+            {class_code: self._member_ids(class_code) for class_code in self._class_memberships}
+        )
+        self._mark_computed('class_aggregates', inputs)
+    
+    @timed_stage('tutor_filtering')
+    def calculate_class_need_levels(self):
+        """Calculate need levels for all classes
+        
+        Only a change to class_filters re-applies the filters over the cached
+        aggregates, without rescanning enrolments or rescoring students.
+        """
+        self._sync_inputs()
+        self._update_class_memberships()
+        self._update_class_aggregates()
+        if self._can_reuse('class_scores'):
+            print(f"Reusing need levels for {len(self.class_scores)} classes (inputs unchanged)")
+            self.publish()
+            return
+        
+        print("Calculating class need levels...")
+        inputs = self._stage_inputs('class_scores')
+        if self.class_filters['tutor_time_slot']:
+            # Time slots of every class under the size cap, looked up in one pass
+            self._load_class_time_slots([
+                class_code for class_code, aggregate in self._class_aggregates.items()
+                if len(aggregate) <= self.class_filters['max_class_size']
+            ])
         filtered_classes = {}
         excluded_count = 0
         
-        for class_code, students in class_students.items():
-            if not students:
+        for class_code in self._class_memberships:
+            aggregate = self._class_aggregates.get(class_code)
+            if aggregate is None:
                 continue
-            
-            if len(students) > 33:
-                excluded_count += 1
-                continue
-            
-            is_tutor_time = self.is_tutor_time_class(class_code)
-            if is_tutor_time:
+            summary, excluded = self._class_summary(class_code, aggregate)
+            if excluded:
                 excluded_count += 1
-                continue
-                
-            scores = [s['score'] for s in students]
-            total_score = sum(scores)
-            avg_score = total_score / len(scores)
-            max_score = max(scores)
-            high_need_count = len([s for s in scores if s >= 5])
-            
-            weighted_score = avg_score * (1 + len(students) / 30)
-            
-            filtered_classes[class_code] = {
-                'student_count': len(students),
-                'total_need_score': total_score,
-                'average_need_score': round(avg_score, 2),
-                'max_need_score': max_score,
-                'high_need_students': high_need_count,
-                'weighted_score': round(weighted_score, 2),
-                'students': students
-            }
+            else:
+                filtered_classes[class_code] = summary
         
         self.class_scores = filtered_classes
+        self._apply_class_aggregation()
+        self._mark_computed('class_scores', inputs)
+        self.publish()
         print(f"Calculated need levels for {len(self.class_scores)} classes")
         print(f"Excluded {excluded_count} classes (assemblies and tutor periods)")
     
+    def _ranked_class_incidence(self, class_codes=None):
+        """Membership arrays for the ranked classes (or some of them), indexing student_scores' arrays
+        
+        Reuses each class aggregate's member id array, so no student name is
+        looked up.
+        """
+        if class_codes is None:
+            class_codes = self.class_scores
+        return ClassIncidence.from_member_ids(
+            {class_code: self.class_scores[class_code].aggregate.member_ids for class_code in class_codes},
+            {**self.class_filters, **self.class_aggregation}
+        )
+    
+    def get_class_metrics(self, strategies, class_codes=None):
+        """{class_code: {strategy: value}} for several aggregation strategies in one pass
+        
+        class_codes limits the pass to some of the ranked classes.
+        """
+        incidence = self._ranked_class_incidence(class_codes)
+        values = aggregate_classes(incidence, self.student_scores.scores, strategies, incidence.params)
+        return {
+            # Python's round, as _class_summary uses, not numpy's half-way rounding
+            class_code: {name: round(float(values[name][i]), 2) for name in strategies}
+            for i, class_code in enumerate(incidence.class_codes)
+        }
+    
+    def _apply_class_aggregation(self, class_codes=None):
+        """Replace weighted_score with the selected strategy's value
+        
+        The default strategy is already computed per class by _class_summary.
+        class_codes limits it to classes whose summaries were just rebuilt.
+        """
+        strategy = self.class_aggregation['strategy']
+        if strategy == DEFAULT_CLASS_AGGREGATION['strategy']:
+            return
+        for class_code, metrics in self.get_class_metrics([strategy], class_codes).items():
+            # A new summary, as the old one may belong to a published snapshot
+            self.class_scores[class_code] = self.class_scores[class_code].replace(weighted_score=metrics[strategy])
+    
     def is_tutor_time_class(self, class_code):
-        """Check if a class runs during tutor time (08:40-09:00)"""
-        timetable_matches = self.timetable[self.timetable['Course/Class'].str.contains(class_code, na=False)]
+        """Check if a class runs during the tutor time slot
         
-        for _, row in timetable_matches.iterrows():
-            time_slot = str(row['Time Slot'])
-            if '08:40 - 09:00' in time_slot:
-                return True
+        The time slots of each class are cached until the timetable changes,
+        so a new tutor slot setting needs no timetable scan.
+        """
+        tutor_slot = self.class_filters['tutor_time_slot']
+        if not tutor_slot:
+            return False
         
-        return False
+        self._load_class_time_slots([class_code])
+        return any(tutor_slot in time_slot for time_slot in self._class_time_slots[class_code])
+    
+    def _load_class_time_slots(self, class_codes):
+        missing = [class_code for class_code in class_codes if class_code not in self._class_time_slots]
+        if missing:
+            self._class_time_slots.update(self.backend.class_time_slots(self.timetable, missing))
     
+    @timed_stage('grid')
     def generate_timetable_grid_data(self):
         """Generate timetable grid data for web interface"""
-        timetable_grid = defaultdict(list)
-        class_need_lookup = {code: data['weighted_score'] for code, data in self.class_scores.items()}
-        
-        for _, row in self.timetable.iterrows():
+        self._sync_inputs()
+        if self._can_reuse('grid', self._timetable_grid is not None):
+            if self.snapshot.timetable_grid is None:
+                self.publish()
+            return self._timetable_grid
+        
+        inputs = self._stage_inputs('grid')
+        tutor_slot = self.class_filters['tutor_time_slot']
+        # (timetable row, lesson) pairs per time slot
+        slot_lessons = defaultdict(list)
+        # Every schedulable lesson per class, kept so delta uploads can patch the grid
+        rows_by_class = defaultdict(list)
+        
+        for position, (_, row) in enumerate(self.timetable.iterrows()):
             course_class = str(row['Course/Class'])
             time_slot = str(row['Time Slot'])
             staff = str(row['Staff'])
             room = str(row['Room'])
             
-            if row.get('Suspended?') == 'Yes' or '08:40 - 09:00' in time_slot:
+            if row.get('Suspended?') == 'Yes' or (tutor_slot and tutor_slot in time_slot):
                 continue
             
             class_code = self.extract_class_code_from_timetable(course_class)
+            lesson = tuple(self._grid_strings.encode(value) for value in (time_slot, course_class, staff, room))
+            rows_by_class[class_code].append((position,) + lesson)
+            # Grid entries share the pooled strings rather than holding per-row copies
+            time_slot, course_class, staff, room = (self._grid_strings.decode(code) for code in lesson)
             
             if class_code in self.class_scores:
-                data = self.class_scores[class_code]
-                timetable_grid[time_slot].append({
-                    'class_code': class_code,
-                    'course_class': course_class,
-                    'need_score': data['weighted_score'],
-                    'student_count': data['student_count'],
-                    'high_need_students': data['high_need_students'],
-                    'staff': staff,
-                    'room': room
-                })
-        
-        # Sort lessons by need score within each time slot
-        for time_slot in timetable_grid:
-            timetable_grid[time_slot].sort(key=lambda x: x['need_score'], reverse=True)
-        
-        return dict(timetable_grid)
+                slot_lessons[time_slot].append(
+                    (position, self._grid_entry(class_code, course_class, staff, room))
+                )
+        
+        self._timetable_grid = {}
+        self._grid_slot_rows = {}
+        for time_slot, lessons in slot_lessons.items():
+            self._set_grid_slot(time_slot, lessons)
+        self._grid_rows_by_class = dict(rows_by_class)
+        self._mark_computed('grid', inputs)
+        self.publish()
+        return self._timetable_grid
+    
+    def _set_grid_slot(self, time_slot, lessons):
+        """Store a slot's (timetable row, lesson) pairs by need score, ties in timetable order
+        
+        The row is an explicit sort key so a slot patched by a delta upload
+        comes out in the same order as a full rebuild.
+        """
+        lessons.sort(key=lambda pair: (-pair[1]['need_score'], pair[0]))
+        self._timetable_grid[time_slot] = [lesson for _, lesson in lessons]
+        self._grid_slot_rows[time_slot] = [position for position, _ in lessons]
+    
+    def _grid_entry(self, class_code, course_class, staff, room):
+        data = self.class_scores[class_code]
+        return {
+            'class_code': class_code,
+            'course_class': course_class,
+            'need_score': data['weighted_score'],
+            'student_count': data['student_count'],
+            'high_need_students': data['high_need_students'],
+            'staff': staff,
+            'room': room
+        }
+    
+    def apply_delta(self, file_type, delta, save_to=None):
+        """Patch students_sen or students_classes with added, changed and removed rows
+
+        delta holds the file's usual columns plus an Action column of
+        add/change/remove, keyed by Name; an add or change replaces every
+        existing row for that student. When an analysis is already in place,
+        only the touched students are rescored and only the classes (and grid
+        slots) containing them are re-aggregated, so scoring and aggregation
+        follow the size of the delta; only flat copies of the patched file and
+        score arrays follow the school. save_to writes the patched file
+        so later full runs start from it.
+        """
+        if file_type not in DELTA_FILE_TYPES:
+            raise ValueError(f"Delta uploads are only supported for {list(DELTA_FILE_TYPES)}")
+        if 'Name' not in delta.columns or DELTA_ACTION_COLUMN not in delta.columns:
+            raise ValueError(f"Delta files need 'Name' and '{DELTA_ACTION_COLUMN}' columns")
+        
+        if any(getattr(self, name) is None for name in INPUT_FRAMES):
+            self.load_data_from_files()
+        
+        base = getattr(self, file_type)
+        unknown_cols = [col for col in delta.columns if col not in base.columns and col != DELTA_ACTION_COLUMN]
+        if unknown_cols:
+            raise ValueError(f"Delta has columns not in the {file_type} file: {unknown_cols}")
+        
+        actions = delta[DELTA_ACTION_COLUMN].astype(str).str.strip().str.lower().map(DELTA_ACTIONS)
+        if actions.isna().any():
+            bad = sorted(set(delta.loc[actions.isna(), DELTA_ACTION_COLUMN].astype(str)))
+            raise ValueError(f"Unknown {DELTA_ACTION_COLUMN} values {bad}; use add, change or remove")
+        
+        # Analyses already in place are patched; otherwise the next run picks the change up
+        self._sync_inputs()
+        incremental = bool(self.student_scores) and not (
+            self._is_stale('student_scores') or self._is_stale('class_scores')
+        )
+        grid_current = self._timetable_grid is not None and not self._is_stale('grid')
+        
+        touched = list(dict.fromkeys(delta['Name']))
+        upserts = delta[actions != 'remove'].drop(columns=[DELTA_ACTION_COLUMN]).reindex(columns=base.columns)
+        patched = pd.concat([base[~base['Name'].isin(touched)], upserts], ignore_index=True)
+        setattr(self, file_type, patched)
+        
+        summary = {
+            'added': int((actions == 'add').sum()),
+            'changed': int((actions == 'change').sum()),
+            'removed': int((actions == 'remove').sum()),
+            'incremental': incremental,
+            'rescored_students': 0,
+            'updated_classes': 0
+        }
+        
+        if incremental:
+            # Patch copies; the published snapshot keeps the previous analysis until this one is done
+            self.student_scores = self.student_scores.copy()
+            self.class_scores = dict(self.class_scores)
+            if grid_current:
+                self._timetable_grid = dict(self._timetable_grid)
+            affected_classes = self._apply_student_delta(file_type, touched, upserts)
+            summary['rescored_students'] = len(touched)
+            summary['updated_classes'] = len(affected_classes)
+            if grid_current:
+                self._patch_timetable_grid(affected_classes)
+            
+            # Every stage now reflects the patched inputs
+            self._sync_inputs()
+            for stage in STAGE_INPUTS:
+                if stage != 'grid' or grid_current:
+                    self._mark_computed(stage, self._stage_inputs(stage))
+            self.publish()
+        
+        if save_to:
+            patched.to_csv(save_to, index=False)
+            setattr(self, f'{file_type}_file', save_to)
+            self._file_fingerprints[file_type] = self._file_fingerprint(save_to)
+        
+        print(f"Applied {file_type} delta: {summary}")
+        return summary
+    
+    def _apply_student_delta(self, file_type, touched, upserts):
+        """Rescore touched students and re-aggregate the classes they are or were in"""
+        sen_names = self.students_sen['Name']
+        class_names = self.students_classes['Name']
+        still_present = set(sen_names[sen_names.isin(touched)]) | set(class_names[class_names.isin(touched)])
+        
+        affected_classes = set()
+        for student in touched:
+            affected_classes.update(self._student_memberships.get(student, []))
+        
+        if file_type == 'students_classes':
+            for student in touched:
+                for class_code in set(self._student_memberships.pop(student, [])):
+                    remaining = [s for s in self._class_memberships[class_code] if s != student]
+                    if remaining:
+                        self._class_memberships[class_code] = remaining
+                    else:
+                        del self._class_memberships[class_code]
+            
+            for _, row in upserts.iterrows():
+                student = row['Name']
+                for class_code in self.extract_classes_from_string(row['Courses/classes']):
+                    self._class_memberships.setdefault(class_code, []).append(student)
+                    self._student_memberships.setdefault(student, []).append(class_code)
+                    affected_classes.add(class_code)
+        
+        for student in touched:
+            if student in still_present:
+                self._roster.add(student)
+                self.student_scores[student] = self.score_student(student)
+            else:
+                self._roster.discard(student)
+                self.student_scores.pop(student, None)
+        
+        # Patched in a copy and swapped in whole: estimated_bytes iterates the
+        # aggregates from other threads without the write lock
+        aggregates = dict(self._class_aggregates)
+        for class_code in affected_classes:
+            summary, _ = self._aggregate_class(class_code, aggregates)
+            if summary:
+                self.class_scores[class_code] = summary
+            else:
+                self.class_scores.pop(class_code, None)
+        self._class_aggregates = aggregates
+        self._apply_class_aggregation([
+            class_code for class_code in affected_classes if class_code in self.class_scores
+        ])
+        
+        return affected_classes
+    
+    def _patch_timetable_grid(self, class_codes):
+        """Refresh the grid entries of the given classes and re-sort only their slots"""
+        slot_lessons = {}
+        for class_code in class_codes:
+            for _, time_slot, _, _, _ in self._grid_rows_by_class.get(class_code, []):
+                time_slot = self._grid_strings.decode(time_slot)
+                if time_slot not in slot_lessons:
+                    slot_lessons[time_slot] = [
+                        (position, lesson) for position, lesson in zip(
+                            self._grid_slot_rows.get(time_slot, []), self._timetable_grid.get(time_slot, [])
+                        )
+                        if lesson['class_code'] not in class_codes
+                    ]
+        
+        for class_code in class_codes:
+            if class_code not in self.class_scores:
+                continue
+            for position, *lesson in self._grid_rows_by_class.get(class_code, []):
+                time_slot, course_class, staff, room = (self._grid_strings.decode(code) for code in lesson)
+                slot_lessons[time_slot].append((position, self._grid_entry(class_code, course_class, staff, room)))
+        
+        for time_slot, lessons in slot_lessons.items():
+            if lessons:
+                self._set_grid_slot(time_slot, lessons)
+            else:
+                self._timetable_grid.pop(time_slot, None)
+                self._grid_slot_rows.pop(time_slot, None)
     
     def extract_class_code_from_timetable(self, course_class_string):
         """Extract class code from timetable course/class string"""
@@ -284,24 +837,27 @@ class TANeedAnalyzer:
         
         return course_class_string.strip()
     
-    def get_analysis_results(self):
-        """Get comprehensive analysis results for web interface"""
+    def get_analysis_results(self, top_students=DEFAULT_TOP_K, top_classes=DEFAULT_TOP_K):
+        """Get comprehensive analysis results for web interface
+        
+        top_students/top_classes limit the ranked lists (None returns all).
+        """
         if not self.student_scores or not self.class_scores:
             raise ValueError("No analysis results available")
         
         # Top students by need
-        sorted_students = sorted(self.student_scores.items(), key=lambda x: x[1]['score'], reverse=True)
+        ranked_students = top_k_students(self.student_scores, top_students)
         top_students = [
             {
                 'name': name,
                 'score': data['score'],
-                'breakdown': data['breakdown']
+                'breakdown': render_breakdown(data, self._scored_weightings)
             }
-            for name, data in sorted_students[:50]  # Top 50 for web display
+            for name, data in ranked_students
         ]
         
         # Top classes by need
-        sorted_classes = sorted(self.class_scores.items(), key=lambda x: x[1]['weighted_score'], reverse=True)
+        ranked_classes = top_k(self.class_scores, lambda data: data['weighted_score'], top_classes)
         top_classes = [
             {
                 'class_code': class_code,
@@ -312,22 +868,11 @@ class TANeedAnalyzer:
                 'high_need_students': data['high_need_students'],
                 'weighted_score': data['weighted_score']
             }
-            for class_code, data in sorted_classes[:50]  # Top 50 for web display
+            for class_code, data in ranked_classes
         ]
         
         # Summary statistics
-        all_scores = [data['score'] for data in self.student_scores.values()]
-        statistics = {
-            'total_students': len(all_scores),
-            'no_needs': len([s for s in all_scores if s == 0]),
-            'low_needs': len([s for s in all_scores if 1 <= s <= 3]),
-            'medium_needs': len([s for s in all_scores if 4 <= s <= 7]),
-            'high_needs': len([s for s in all_scores if s >= 8]),
-            'average_score': round(np.mean(all_scores), 2),
-            'max_score': max(all_scores),
-            'total_classes': len(self.class_scores),
-            'average_class_score': round(np.mean([data['weighted_score'] for data in self.class_scores.values()]), 2)
-        }
+        statistics = score_summary(self.student_scores, self.class_scores)
         
         return {
             'top_students': top_students,
@@ -342,35 +887,32 @@ class TANeedAnalyzer:
         print("TEACHING ASSISTANT NEED ANALYSIS REPORT")
         print("="*60)
         
-        sorted_students = sorted(self.student_scores.items(), key=lambda x: x[1]['score'], reverse=True)
         print("\nTOP 20 HIGHEST NEED STUDENTS:")
         print("-" * 50)
-        for i, (name, data) in enumerate(sorted_students[:20], 1):
-            print(f"{i:2d}. {name:<25} Score: {data['score']:2d} - {data['breakdown']}")
+        for i, (name, data) in enumerate(top_k_students(self.student_scores, 20), 1):
+            print(f"{i:2d}. {name:<25} Score: {data['score']:2d} - {render_breakdown(data, self._scored_weightings)}")
         
-        sorted_classes = sorted(self.class_scores.items(), key=lambda x: x[1]['weighted_score'], reverse=True)
         print("\n\nTOP 20 HIGHEST NEED CLASSES:")
         print("-" * 70)
-        for i, (class_code, data) in enumerate(sorted_classes[:20], 1):
+        for i, (class_code, data) in enumerate(top_k(self.class_scores, lambda data: data['weighted_score'], 20), 1):
             print(f"{i:2d}. {class_code:<20} Students: {data['student_count']:2d} | "
                   f"Avg Need: {data['average_need_score']:5.2f} | "
                   f"Total: {data['total_need_score']:3d} | "
                   f"High Need: {data['high_need_students']:2d} | "
                   f"Weighted: {data['weighted_score']:5.2f}")
         
-        all_scores = [data['score'] for data in self.student_scores.values()]
+        stats = score_summary(self.student_scores, self.class_scores)
         print(f"\n\nSUMMARY STATISTICS:")
-        print(f"Total students analyzed: {len(all_scores)}")
-        print(f"Students with no additional needs (score 0): {len([s for s in all_scores if s == 0])}")
-        print(f"Students with low needs (score 1-3): {len([s for s in all_scores if 1 <= s <= 3])}")
-        print(f"Students with medium needs (score 4-7): {len([s for s in all_scores if 4 <= s <= 7])}")
-        print(f"Students with high needs (score 8+): {len([s for s in all_scores if s >= 8])}")
-        print(f"Average need score: {np.mean(all_scores):.2f}")
-        print(f"Maximum need score: {max(all_scores)}")
-        
-        print(f"\nTotal classes analyzed: {len(self.class_scores)}")
-        class_weighted_scores = [data['weighted_score'] for data in self.class_scores.values()]
-        print(f"Average class weighted score: {np.mean(class_weighted_scores):.2f}")
+        print(f"Total students analyzed: {stats['total_students']}")
+        print(f"Students with no additional needs (score 0): {stats['no_needs']}")
+        print(f"Students with low needs (score 1-3): {stats['low_needs']}")
+        print(f"Students with medium needs (score 4-7): {stats['medium_needs']}")
+        print(f"Students with high needs (score 8+): {stats['high_needs']}")
+        print(f"Average need score: {stats['average_score']:.2f}")
+        print(f"Maximum need score: {stats['max_score']}")
+        
+        print(f"\nTotal classes analyzed: {stats['total_classes']}")
+        print(f"Average class weighted score: {stats['average_class_score']:.2f}")
     
     def run_analysis(self):
         """Run the complete analysis (legacy method)"""
@@ -0,0 +1,160 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from need_features import POINT_KEYS, weight_arrays
+
+DEFAULT_SAMPLES = 2000
+MAX_ROBUSTNESS_SAMPLES = 20000
+SHARD_SIZE = 250
+# Students x samples below which scoring in the calling thread beats
+# shipping shards to the pool (about a second of serial scoring)
+PARALLEL_MIN_WORK = 10_000_000
+
+# One pool per process, spawned on the first parallel run and reused after
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool(pool):
+    """Forget a pool whose processes died, so the next run spawns a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _class_ranks(weighted):
+    """Rank of every class (rows) in every sample (columns), ties kept in class order"""
+    order = np.argsort(-weighted, axis=0, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, weighted.shape[0] + 1)[:, None], axis=0)
+    return ranks
+
+
+def _run_shard(features, incidence, base, seed, sample_count, spread, top_n):
+    """Score one batch of perturbed weightings and tally each class's ranks"""
+    points, reading_threshold, spelling_threshold = base
+    rng = np.random.default_rng(seed)
+    sample_points = points * rng.uniform(1 - spread, 1 + spread, size=(sample_count, points.size))
+
+    student_scores = features.score_points(
+        sample_points,
+        np.full(sample_count, reading_threshold),
+        np.full(sample_count, spelling_threshold)
+    )
+    ranks = _class_ranks(np.round(incidence.weighted_scores(student_scores), 2))
+    return (ranks <= top_n).sum(axis=1), ranks.sum(axis=1), ranks.min(axis=1), ranks.max(axis=1)
+
+
+def _run_shard_task(args):
+    return _run_shard(*args)
+
+
+def run_robustness_analysis(features, incidence, weightings, samples=DEFAULT_SAMPLES,
+                            spread=0.25, top_n=10, seed=None, workers=1):
+    """Monte Carlo check of how sensitive the top_n class priorities are to the weights
+
+    Each sample scales every points weighting by an independent factor drawn
+    uniformly from [1 - spread, 1 + spread]; reading and spelling thresholds
+    stay fixed. Samples are scored in batches of SHARD_SIZE. With workers > 1
+    and at least PARALLEL_MIN_WORK students x samples, the batches are
+    spread over a process pool that is started on first use and kept for
+    later runs; smaller runs are scored in the calling thread, which is
+    faster than shipping them out. Shard seeds come from one SeedSequence,
+    so a given seed gives the same report whatever the worker count.
+
+    Pool processes are spawned, not forked. Forking a threaded gunicorn
+    worker can copy a lock that another thread holds, and the child then
+    hangs on it.
+    """
+    if not 0 <= spread < 1:
+        raise ValueError('spread must be at least 0 and less than 1')
+    if not 1 <= samples <= MAX_ROBUSTNESS_SAMPLES:
+        raise ValueError(f'samples must be between 1 and {MAX_ROBUSTNESS_SAMPLES}')
+    if top_n < 1:
+        raise ValueError('top_n must be at least 1')
+
+    start = time.perf_counter()
+    points, reading_thresholds, spelling_thresholds = weight_arrays([weightings])
+    base = (points[0], reading_thresholds[0], spelling_thresholds[0])
+
+    base_weighted = np.round(incidence.weighted_scores(features.score_points(points, reading_thresholds, spelling_thresholds)), 2)
+    base_ranks = _class_ranks(base_weighted)[:, 0]
+
+    seed_sequence = np.random.SeedSequence(seed)
+    shard_sizes = [min(SHARD_SIZE, samples - i) for i in range(0, samples, SHARD_SIZE)]
+    tasks = [
+        (base, shard_seed, size, spread, top_n)
+        for shard_seed, size in zip(seed_sequence.spawn(len(shard_sizes)), shard_sizes)
+    ]
+
+    if samples * len(features) < PARALLEL_MIN_WORK or len(tasks) < 2:
+        workers = 1
+    if workers > 1:
+        pool = _get_pool(workers)
+        try:
+            shard_results = list(pool.map(_run_shard_task, [(features, incidence) + task for task in tasks]))
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+        workers = min(workers, len(tasks))
+    else:
+        shard_results = [_run_shard(features, incidence, *task) for task in tasks]
+
+    class_count = len(incidence)
+    top_counts = np.zeros(class_count, dtype=np.int64)
+    rank_sums = np.zeros(class_count, dtype=np.int64)
+    best = np.full(class_count, class_count, dtype=np.int64)
+    worst = np.zeros(class_count, dtype=np.int64)
+    for shard_top, shard_sums, shard_best, shard_worst in shard_results:
+        top_counts += shard_top
+        rank_sums += shard_sums
+        best = np.minimum(best, shard_best)
+        worst = np.maximum(worst, shard_worst)
+
+    classes = [
+        {
+            'class_code': incidence.class_codes[i],
+            'base_rank': int(base_ranks[i]),
+            'base_weighted_score': float(base_weighted[i, 0]),
+            'top_n_probability': round(float(top_counts[i]) / samples, 4),
+            'mean_rank': round(float(rank_sums[i]) / samples, 2),
+            'best_rank': int(best[i]),
+            'worst_rank': int(worst[i])
+        }
+        for i in range(class_count)
+        if top_counts[i] or base_ranks[i] <= top_n
+    ]
+    classes.sort(key=lambda c: (-c['top_n_probability'], c['base_rank']))
+
+    return {
+        'classes': classes,
+        'samples': samples,
+        'spread': spread,
+        'top_n': top_n,
+        'seed': str(seed_sequence.entropy),
+        'perturbed_weights': POINT_KEYS,
+        'workers': workers,
+        'student_count': len(features),
+        'class_count': class_count,
+        'duration_seconds': round(time.perf_counter() - start, 3)
+    }
+
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+MAX_SWEEP_CONFIGS = 100
+
+
+def _top_classes(class_codes, weighted, top_k):
+    """Highest priority classes for one config, ties kept in class order"""
+    order = np.argsort(-weighted, kind='stable')[:top_k]
+    return [
+        {'rank': rank, 'class_code': class_codes[i], 'weighted_score': float(weighted[i])}
+        for rank, i in enumerate(order, 1)
+    ]
+
+
+def _rank_correlations(weighted, labels):
+    """Spearman correlation between every pair of configs' class rankings"""
+    if weighted.shape[0] < 2:
+        return [[None] * len(labels) for _ in labels]
+    matrix = pd.DataFrame(weighted, columns=range(len(labels))).corr(method='spearman')
+    return [[None if pd.isna(v) else round(float(v), 4) for v in row] for row in matrix.to_numpy()]
+
+
+def run_weighting_sweep(features, incidence, weightings_list, labels, top_k=10, top_band=None):
+    """Score every student and class under many weighting configs at once
+
+    All configs are evaluated together: one student x config score matrix
+    from the feature matrix, then one segment reduction over the class
+    incidence with the school's class aggregation strategy.
+    Returns each config's top_k classes, Spearman rank correlations between
+    the configs' class rankings, and the classes that sit in the top_band
+    (defaulting to top_k) under every config.
+    """
+    if top_band is None:
+        top_band = top_k
+    if top_k < 1 or top_band < 1:
+        raise ValueError('top_k and top_band must be at least 1')
+    student_scores = features.score_matrix(weightings_list)
+    weighted = np.round(incidence.weighted_scores(student_scores), 2)
+
+    configs = []
+    in_band = np.ones(len(incidence), dtype=bool)
+    for i, label in enumerate(labels):
+        column = weighted[:, i]
+        ranks = np.empty(len(column), dtype=np.int64)
+        ranks[np.argsort(-column, kind='stable')] = np.arange(1, len(column) + 1)
+        in_band &= ranks <= top_band
+
+        configs.append({
+            'name': label,
+            'weightings': weightings_list[i],
+            'average_student_score': round(float(student_scores[:, i].mean()), 2) if len(features) else 0,
+            'top_classes': _top_classes(incidence.class_codes, column, top_k)
+        })
+
+    band_index = np.flatnonzero(in_band)
+    band_index = band_index[np.argsort(-weighted[band_index].mean(axis=1), kind='stable')]
+    stable = [incidence.class_codes[i] for i in band_index]
+
+    return {
+        'configs': configs,
+        'rank_correlation': {
+            'method': 'spearman',
+            'labels': labels,
+            'matrix': _rank_correlations(weighted, labels)
+        },
+        'stable_top_classes': stable,
+        'top_k': top_k,
+        'top_band': top_band,
+        'student_count': len(features),
+        'class_count': len(incidence)
+    }
@@ -0,0 +1,203 @@
+import fcntl
+import glob
+import os
+import pickle
+import queue
+import shutil
+import threading
+import time
+import uuid
+
+LOCK_FILE = '.lock'
+
+
+class WriteBehindQueue:
+    """Bounded background writer with retry and an on-disk journal
+
+    submit() journals the item to its own folder under spool_dir, then
+    queues it and returns. A single daemon thread hands each item to
+    write_fn, retrying with backoff, and deletes the journal entry once the
+    write succeeds. Anything unwritten stays journaled: items that keep
+    failing, items still queued or being written when the process stops,
+    and everything of a worker that crashed. Each queue holds a lock on its
+    folder while it runs, and start() replays the folders of queues that no
+    longer hold theirs. Until an item is written it is readable through
+    get_pending(), from any process sharing spool_dir.
+    """
+
+    def __init__(self, write_fn, spool_dir, maxsize=32, max_attempts=4,
+                 retry_delay=0.5, put_timeout=2.0, name='write-behind'):
+        self.write_fn = write_fn
+        self.spool_dir = spool_dir
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.put_timeout = put_timeout
+        self.name = name
+        self._queue = queue.Queue(maxsize)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+        self._journal_dir = None
+        self._journal_lock = None
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def start(self):
+        """Open this queue's journal, replay those of stopped queues and start the writer thread"""
+        if self._thread is not None:
+            return
+        self._journal_dir = os.path.join(self.spool_dir, f'{os.getpid()}-{uuid.uuid4().hex[:8]}')
+        os.makedirs(self._journal_dir)
+        self._journal_lock = open(os.path.join(self._journal_dir, LOCK_FILE), 'w')
+        fcntl.flock(self._journal_lock, fcntl.LOCK_EX)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self._replay_orphans()
+
+    def submit(self, key, item):
+        """Journal and queue an item for writing; returns False if the same key is already pending
+
+        When the queue stays full for put_timeout seconds the item is written
+        in the calling thread instead, so back-pressure slows requests down
+        rather than dropping results.
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending[key] = item
+        self._journal(key, item)
+
+        try:
+            self._queue.put((key, item), timeout=self.put_timeout)
+        except queue.Full:
+            print(f"{self.name}: queue full, writing {key} synchronously")
+            self._write_with_retry(key, item)
+        return True
+
+    def get_pending(self, key):
+        """The unwritten item for key, from this process or any other journal in spool_dir
+
+        None once the item has been written.
+        """
+        with self._lock:
+            item = self._pending.get(key)
+        if item is not None:
+            return item
+        for path in glob.glob(os.path.join(self.spool_dir, '*', self._journal_name(key))):
+            entry = self._read_journal(path)
+            if entry is not None:
+                return entry[1]
+        return None
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far has been written or given up on"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout=10.0):
+        """Drain the queue on shutdown; whatever is left stays journaled for the next start"""
+        if self._thread is None:
+            return
+        self.flush(timeout)
+        self._stopped.set()
+        self._thread.join(timeout=1.0)
+        self._thread = None
+
+        left = len(glob.glob(os.path.join(self._journal_dir, '*.pkl')))
+        if left:
+            print(f"{self.name}: leaving {left} unwritten items in {self._journal_dir}")
+        else:
+            shutil.rmtree(self._journal_dir, ignore_errors=True)
+        # Releasing the lock hands the journal to the next queue that starts
+        self._journal_lock.close()
+        self._journal_lock = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                key, item = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                self._write_with_retry(key, item)
+            finally:
+                self._queue.task_done()
+
+    def _write_with_retry(self, key, item):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self.write_fn(item)
+                break
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    # The journal entry stays, so a later start writes it
+                    print(f"{self.name}: giving up on {key} after {attempt} attempts ({e}), kept in the journal")
+                    with self._lock:
+                        self._pending.pop(key, None)
+                    return
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+        with self._lock:
+            self._pending.pop(key, None)
+        try:
+            os.remove(os.path.join(self._journal_dir, self._journal_name(key)))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _journal_name(key):
+        safe_key = ''.join(c if c.isalnum() else '_' for c in str(key))
+        return f'{safe_key}.pkl'
+
+    def _journal(self, key, item):
+        path = os.path.join(self._journal_dir, self._journal_name(key))
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((key, item), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def _read_journal(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _replay_orphans(self):
+        """Take over the journals of queues whose process has stopped or crashed"""
+        for journal_dir in sorted(glob.glob(os.path.join(self.spool_dir, '*', ''))):
+            journal_dir = os.path.dirname(journal_dir)
+            if journal_dir == self._journal_dir:
+                continue
+            try:
+                lock = open(os.path.join(journal_dir, LOCK_FILE), 'a')
+            except OSError:
+                continue
+            with lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Its queue is still running
+                    continue
+                unreadable = 0
+                for path in sorted(glob.glob(os.path.join(journal_dir, '*.pkl'))):
+                    entry = self._read_journal(path)
+                    if entry is None:
+                        print(f"{self.name}: could not read journaled item {path}")
+                        unreadable += 1
+                        continue
+                    key, item = entry
+                    print(f"{self.name}: replaying journaled item {key}")
+                    self.submit(key, item)
+                    os.remove(path)
+                if not unreadable:
+                    shutil.rmtree(journal_dir, ignore_errors=True)